@@ -1,26 +1,60 @@
 import os
-import yfinance as yf
-from flask import Flask, request, jsonify
+import queue
+import time
+from collections import namedtuple
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 from datetime import datetime,timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
 from flask_cors import CORS
+from sqlalchemy.orm import selectinload
 
 # Analyzer imports (implement in utils/analyzer.py)
 from utils.analyzer import (
     analyze_stock,
+    analyze_stocks,
+    get_gemini_summary,
     get_ai_recommendation,
-    get_batch_ticker_data,
-    get_all_nse_tickers_data
+    readiness,
+    llm
 )
+from utils.quote_hub import quote_hub, format_ticker_item
+from utils.screener import screener
+from utils.jobs import summary_jobs
+from utils.portfolio_risk import compute_portfolio_risk
+from utils.covariance import covariance_service
+from utils.forecasting import forecaster, parse_forecast_request
+from utils.monte_carlo import parse_stress_request, simulate_portfolio
+from utils.query_counter import QueryCounter
+from utils.signal_archive import read_partitions
+from utils.db_config import database_url, engine_options
+from utils.price_history import get_cache
+from utils import encoding, metrics
+from utils.chart_series import CHART_FORMATS, CHART_PERIODS
 
 # -----------------------------
 # App Configuration
 # -----------------------------
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://localhost/riskforecaster_db'
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    jsonify() through the fast compact encoder (orjson when installed), with
+    the encoding time recorded as the "serialize" stage.
+    """
+
+    def dumps(self, obj, **kwargs):
+        with metrics.timed("serialize"):
+            return encoding.dumps(obj)
+
+
+app.json = TimedJSONProvider(app)
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'a-long-random-string-you-should-change'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)  # 30 days validity
@@ -32,7 +66,8 @@ db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
-CORS(app, origins="http://localhost:3000", supports_credentials=True)
+CORS_ORIGINS = "http://localhost:3000"
+CORS(app, origins=CORS_ORIGINS, supports_credentials=True)
 
 # -----------------------------
 # Database Models
@@ -47,6 +82,7 @@ class User(db.Model):
     portfolio = db.relationship('Portfolio', backref='owner', lazy=True, cascade="all, delete-orphan")
     trade_signals = db.relationship('TradeSignal', backref='owner', lazy=True, cascade="all, delete-orphan")
     executions = db.relationship('Execution', backref='owner', lazy=True, cascade="all, delete-orphan")
+    signal_summaries = db.relationship('DailySignalSummary', backref='owner', lazy=True, cascade="all, delete-orphan")
 
 
 class Watchlist(db.Model):
@@ -75,6 +111,11 @@ class TradeSignal(db.Model):
     confidence = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_trade_signal_user_created', 'user_id', 'created_at'),
+        db.Index('ix_trade_signal_ticker', 'ticker'),
+        db.Index('ix_trade_signal_created', 'created_at'),
+    )
 
 
 class Execution(db.Model):
@@ -86,6 +127,91 @@ class Execution(db.Model):
     price = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_execution_user_created', 'user_id', 'created_at'),
+        db.Index('ix_execution_ticker', 'ticker'),
+        db.Index('ix_execution_created', 'created_at'),
+    )
+
+
+class DailySignalSummary(db.Model):
+    """Per-user, per-ticker, per-day rollup of TradeSignal rows that were compacted away."""
+    __tablename__ = "daily_signal_summary"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ticker = db.Column(db.String(20), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    signal_count = db.Column(db.Integer, nullable=False, default=0)
+    buy_count = db.Column(db.Integer, nullable=False, default=0)
+    sell_count = db.Column(db.Integer, nullable=False, default=0)
+    hold_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_confidence = db.Column(db.Float, nullable=False, default=0.0)
+    first_at = db.Column(db.DateTime, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'ticker', 'day', name='_user_ticker_day_uc'),
+        db.Index('ix_daily_signal_summary_user_day', 'user_id', 'day'),
+    )
+
+
+# -----------------------------
+# Query Helpers
+# -----------------------------
+# Single-query access paths, so request and bot query counts stay constant
+# as users and history grow.
+def watchlist_tickers(user_id):
+    """A user's watchlist tickers in one query, without loading the User row."""
+    rows = db.session.query(Watchlist.ticker).filter_by(user_id=user_id).order_by(Watchlist.id)
+    return [ticker for (ticker,) in rows]
+
+
+# Plain copies of what the bot reads, so committing its write batches (which
+# expires every loaded ORM object) can't trigger a lazy load per user
+BotUser = namedtuple("BotUser", ["id", "auto_trade_allowed", "watchlist", "holdings"])
+Holding = namedtuple("Holding", ["id", "quantity", "avg_buy_price"])
+
+
+def users_for_bot(user_ids=None):
+    """
+    Users (all, or just `user_ids`) as BotUser snapshots: watchlist tickers
+    plus holdings by ticker. Three queries regardless of count.
+    """
+    query = User.query.options(selectinload(User.watchlist), selectinload(User.portfolio))
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+    return [
+        BotUser(
+            id=user.id,
+            auto_trade_allowed=bool(user.auto_trade_allowed),
+            watchlist=tuple(item.ticker for item in user.watchlist),
+            holdings={p.ticker: Holding(p.id, p.quantity, p.avg_buy_price) for p in user.portfolio},
+        )
+        for user in query.all()
+    ]
+
+
+def keyset_page(model, user_id, cursor=None, limit=50, ticker=None):
+    """
+    One page of a user's history, newest first, using the (user_id, created_at)
+    index. `cursor` is the `nextCursor` of the previous page; unlike OFFSET,
+    deep pages cost the same as the first one.
+    """
+    query = model.query.filter(model.user_id == user_id)
+    if ticker:
+        query = query.filter(model.ticker == ticker.upper())
+    if cursor:
+        created_at, row_id = cursor.rsplit('|', 1)
+        created_at, row_id = datetime.fromisoformat(created_at), int(row_id)
+        query = query.filter(db.or_(
+            model.created_at < created_at,
+            db.and_(model.created_at == created_at, model.id < row_id),
+        ))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].created_at.isoformat()}|{rows[-1].id}"
+    return rows, next_cursor
 
 
 # -----------------------------
@@ -102,26 +228,239 @@ def create_default_user():
             print("✅ Default user created: anishakumari / anishakumari")
 
 
+# -----------------------------
+# Request Hooks
+# -----------------------------
+# DEBUG_QUERY_COUNT=1 reports the number of SQL statements per request in an
+# X-Query-Count header, to catch N+1 regressions during development.
+if os.getenv("DEBUG_QUERY_COUNT"):
+    @app.before_request
+    def _start_query_count():
+        g.query_counter = QueryCounter(db.engine).__enter__()
+
+    @app.after_request
+    def _report_query_count(response):
+        counter = g.pop('query_counter', None)
+        if counter is not None:
+            counter.__exit__(None, None, None)
+            response.headers['X-Query-Count'] = str(counter.count)
+        return response
+
+
+# Every request is timed into http_request_seconds; a sampled (or, with
+# PROFILE_ALLOW_HEADER=1, `X-Profile: 1`) request is also run under cProfile.
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    if metrics.should_profile(request.headers.get('X-Profile')):
+        g.profiler = metrics.start_profile()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.http_request_seconds.observe(
+            time.perf_counter() - started, endpoint=request.endpoint or "unknown",
+            method=request.method, status=response.status_code
+        )
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response.headers['X-Profile-File'] = os.path.basename(
+            metrics.finish_profile(profiler, request.endpoint or request.path)
+        )
+    return response
+
+
+# JSON responses above GZIP_MIN_BYTES are gzipped for clients that accept it
+@app.after_request
+def _compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or not encoding.accepts_gzip(request.headers.get('Accept-Encoding'))):
+        return response
+    compressed = encoding.compress(response.get_data())
+    if compressed is not None:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+with app.app_context():
+    metrics.instrument_engine(db.engine)
+metrics.register_cache("price_history", get_cache().stats)
+metrics.register_cache("llm", llm.stats)
+metrics.register_cache("forecast", forecaster.stats)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 # -----------------------------
 # Public Endpoints
 # -----------------------------
+TICKER_BAR = ["^NSEI", "^BSESN", "RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS"]
+TICKER_RENAMES = {"^NSEI": "NIFTY 50", "^BSESN": "SENSEX"}
+quote_hub.add_tickers(TICKER_BAR)
+
+
 @app.route('/api/ticker-data', methods=['GET'])
 def ticker_data():
-    ticker_list = ["^NSEI", "^BSESN", "RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "INFY.NS"]
-    rename_map = {"^NSEI": "NIFTY 50", "^BSESN": "SENSEX"}
-    data = get_batch_ticker_data(ticker_list)
-    for item in data:
-        if item["name"] in rename_map:
-            item["name"] = rename_map[item["name"]]
-    return jsonify({"status": "success", "data": data}), 200
+    return jsonify({"status": "success", "data": ticker_bar_items()}), 200
+
+
+def ticker_bar_items():
+    """The ticker bar, served from the quote hub's snapshot; the hub does the upstream polling."""
+    quote_hub.ensure_started()
+    _, quotes = quote_hub.snapshot()
+    return [ticker_bar_item(ticker, quotes[ticker]) for ticker in TICKER_BAR if ticker in quotes]
+
+
+def ticker_bar_item(ticker, quote):
+    """One ticker bar row; the REST snapshot and the quote stream both format prices here."""
+    item = format_ticker_item(ticker, quote)
+    item["symbol"] = ticker
+    item["name"] = TICKER_RENAMES.get(ticker, ticker)
+    return item
+
+
+def quote_stream_message(message):
+    """A quote hub message plus the ticker bar rows for its quotes, ready for the stream."""
+    return {**message, "items": {t: ticker_bar_item(t, q) for t, q in message["quotes"].items()}}
+
+
+@app.route('/api/quotes/stream', methods=['GET'])
+def quote_stream():
+    quote_hub.ensure_started()
+    subscriber = quote_hub.subscribe()
+
+    def events():
+        # Server-sent events: a `snapshot` first, then `quotes` diffs as the hub refreshes;
+        # `items` carries the same preformatted rows as /api/ticker-data
+        try:
+            while True:
+                try:
+                    event, message = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {encoding.dumps(quote_stream_message(message))}\n\n"
+        finally:
+            quote_hub.unsubscribe(subscriber)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    status = readiness()
+    return jsonify(status), 200 if status["model"] else 503
 
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_endpoint():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"message": "Request body must be a JSON object"}), 400
     ticker = data.get('ticker')
-    analysis_result = analyze_stock(ticker)
+    if not isinstance(ticker, str) or not ticker.strip():
+        return jsonify({"message": "ticker is required"}), 400
+    chart_options, error = parse_chart_options(data)
+    if error:
+        return jsonify({"message": error}), 400
+
+    if data.get('includeSummary'):
+        # Legacy blocking mode: wait for the AI summary before responding
+        return jsonify({"status": "success", "data": analyze_stock(ticker, **chart_options)}), 200
+
+    analysis_result = with_summary_job(analyze_stocks([ticker], **chart_options)[ticker])
     return jsonify({"status": "success", "data": analysis_result}), 200
+
+
+@app.route('/api/forecast', methods=['POST'])
+def forecast_endpoint():
+    """
+    Volatility forecasts for several tickers and horizons in one call, e.g.
+    {"tickers": ["TCS.NS", "INFY.NS"], "horizons": [1, 5, 21], "quantiles": [0.05, 0.5, 0.95]}
+    """
+    options, error = parse_forecast_request(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"message": error}), 400
+    tickers, horizons, quantiles = options
+    return jsonify({"status": "success", "data": forecaster.forecast(tickers, horizons, quantiles)}), 200
+
+
+def parse_chart_options(data):
+    """
+    Optional chart shaping for /api/analyze: history period, max points
+    (LTTB-downsampled) and "labels" (date strings + prices) or "columnar"
+    (epoch seconds + prices). Returns (options, error message).
+    """
+    options = {
+        "period": data.get('period', "1y"),
+        "points": data.get('points'),
+        "chart_format": data.get('format', "labels"),
+    }
+    if options["period"] not in CHART_PERIODS:
+        return None, f"period must be one of {', '.join(CHART_PERIODS)}"
+    if options["chart_format"] not in CHART_FORMATS:
+        return None, f"format must be one of {', '.join(CHART_FORMATS)}"
+    if options["points"] is not None and (not isinstance(options["points"], int) or options["points"] < 3):
+        return None, "points must be an integer of at least 3"
+    return options, None
+
+
+def with_summary_job(analysis_result):
+    """Queues the AI summary for a successful analysis and marks it as pending."""
+    if "error" not in analysis_result:
+        summary_input = {k: v for k, v in analysis_result.items() if k != "chartData"}
+        analysis_result["aiSummary"] = None
+        analysis_result["summaryJobId"] = summary_jobs.submit(get_gemini_summary, summary_input)
+    return analysis_result
+
+
+def summary_job_payload(job):
+    return {"jobId": job["jobId"], "status": job["status"], "aiSummary": job["result"], "error": job["error"]}
+
+
+@app.route('/api/analyze/jobs/<job_id>', methods=['GET'])
+def analyze_job_status(job_id):
+    job = summary_jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown or expired job"}), 404
+    return jsonify({"status": "success", "data": summary_job_payload(job)}), 200
+
+
+@app.route('/api/analyze/jobs/<job_id>/stream', methods=['GET'])
+def analyze_job_stream(job_id):
+    if summary_jobs.get(job_id) is None:
+        return jsonify({"message": "Unknown or expired job"}), 404
+
+    def events():
+        # Server-sent events: one `status` event per change, comments as keep-alives
+        last_status = None
+        job = summary_jobs.get(job_id)
+        while True:
+            if job is None:
+                yield "event: error\ndata: {\"message\": \"Unknown or expired job\"}\n\n"
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: status\ndata: {encoding.dumps(summary_job_payload(job))}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if job["status"] in ("done", "failed"):
+                return
+            job = summary_jobs.wait(job_id, timeout=15)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route('/api/recommend', methods=['POST'])
 @jwt_required()
 def recommend():
@@ -133,9 +472,7 @@ def recommend():
         return jsonify({"message": "Query is required"}), 400
 
     try:
-        user = User.query.get(current_user_id)
-        watchlist_tickers = [item.ticker for item in user.watchlist]
-        recommendation = get_ai_recommendation(query, watchlist_tickers)
+        recommendation = get_ai_recommendation(query, watchlist_tickers(current_user_id))
         return jsonify({"recommendation": recommendation}), 200
     except Exception as e:
         print("Error in recommend:", e)
@@ -174,9 +511,7 @@ def login():
 @jwt_required()
 def get_watchlist():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    tickers = [item.ticker for item in user.watchlist]
-    return jsonify(tickers=tickers), 200
+    return jsonify(tickers=watchlist_tickers(current_user_id)), 200
 
 
 @app.route('/api/watchlist', methods=['POST'])
@@ -193,29 +528,207 @@ def add_to_watchlist():
     db.session.commit()
     return jsonify({"message": f"'{ticker.upper()}' added to watchlist"}), 201
 
+def _history_page(model, serialize):
+    current_user_id = get_jwt_identity()
+    limit = min(max(request.args.get('limit', default=50, type=int), 1), 500)
+    try:
+        rows, next_cursor = keyset_page(
+            model, current_user_id, cursor=request.args.get('cursor'),
+            limit=limit, ticker=request.args.get('ticker')
+        )
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    return jsonify({"status": "success", "data": [serialize(r) for r in rows], "nextCursor": next_cursor}), 200
+
+
+@app.route('/api/signals', methods=['GET'])
+@jwt_required()
+def list_signals():
+    return _history_page(TradeSignal, lambda s: {
+        "id": s.id, "ticker": s.ticker, "signal": s.signal,
+        "confidence": s.confidence, "createdAt": s.created_at.isoformat(),
+    })
+
+
+@app.route('/api/executions', methods=['GET'])
+@jwt_required()
+def list_executions():
+    return _history_page(Execution, lambda e: {
+        "id": e.id, "ticker": e.ticker, "action": e.action, "quantity": e.quantity,
+        "price": e.price, "createdAt": e.created_at.isoformat(),
+    })
+
+
+@app.route('/api/signals/history', methods=['GET'])
+@jwt_required()
+def signal_history():
+    """
+    Signals in [start, end] (ISO dates), newest first, from the live table and
+    the on-disk archive of compacted days combined.
+    """
+    current_user_id = int(get_jwt_identity())
+    limit = min(max(request.args.get('limit', default=500, type=int), 1), 5000)
+    ticker = request.args.get('ticker')
+    ticker = ticker.upper() if ticker else None
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({"message": "start and end must be ISO dates"}), 400
+    if end is not None and len(request.args['end']) == 10:
+        end = end + timedelta(days=1) - timedelta(microseconds=1)
+
+    query = TradeSignal.query.filter(TradeSignal.user_id == current_user_id)
+    if ticker:
+        query = query.filter(TradeSignal.ticker == ticker)
+    if start is not None:
+        query = query.filter(TradeSignal.created_at >= start)
+    if end is not None:
+        query = query.filter(TradeSignal.created_at <= end)
+    rows = [{
+        "id": s.id, "ticker": s.ticker, "signal": s.signal,
+        "confidence": s.confidence, "createdAt": s.created_at.isoformat(),
+    } for s in query.order_by(TradeSignal.created_at.desc(), TradeSignal.id.desc()).limit(limit)]
+
+    archived = read_partitions("trade_signal", start, end, limit=limit, user_id=current_user_id, ticker=ticker)
+    for i in range(len(archived.get("id", ()))):
+        rows.append({
+            "id": int(archived["id"][i]), "ticker": str(archived["ticker"][i]),
+            "signal": str(archived["signal"][i]), "confidence": float(archived["confidence"][i]),
+            "createdAt": archived["created_at"][i].item().isoformat(), "archived": True,
+        })
+    rows.sort(key=lambda r: (r["createdAt"], r["id"]), reverse=True)
+    return jsonify({"status": "success", "data": rows[:limit]}), 200
+
+
+@app.route('/api/signals/daily', methods=['GET'])
+@jwt_required()
+def signal_daily_summary():
+    """Daily per-ticker signal counts for days that have been compacted out of the live table."""
+    current_user_id = get_jwt_identity()
+    query = DailySignalSummary.query.filter(DailySignalSummary.user_id == current_user_id)
+    ticker = request.args.get('ticker')
+    if ticker:
+        query = query.filter(DailySignalSummary.ticker == ticker.upper())
+    try:
+        if request.args.get('start'):
+            query = query.filter(DailySignalSummary.day >= datetime.fromisoformat(request.args['start']).date())
+        if request.args.get('end'):
+            query = query.filter(DailySignalSummary.day <= datetime.fromisoformat(request.args['end']).date())
+    except ValueError:
+        return jsonify({"message": "start and end must be ISO dates"}), 400
+    rows = query.order_by(DailySignalSummary.day.desc(), DailySignalSummary.ticker).limit(1000).all()
+    return jsonify({"status": "success", "data": [{
+        "day": r.day.isoformat(), "ticker": r.ticker, "signals": r.signal_count,
+        "buy": r.buy_count, "sell": r.sell_count, "hold": r.hold_count,
+        "avgConfidence": round(r.avg_confidence, 2),
+        "firstAt": r.first_at.isoformat(), "lastAt": r.last_at.isoformat(),
+    } for r in rows]}), 200
+
+
+@app.route('/api/screener', methods=['GET'])
+def screen_universe():
+    """
+    Filter/sort/top-k over the screener's precomputed metrics, e.g.
+    ?where=predicted_vol < 20% and sharpe > 1&sort=-sharpe&limit=25
+    """
+    screener.ensure_started()
+    limit = min(max(request.args.get('limit', default=50, type=int), 1), 500)
+    try:
+        result = screener.query(request.args.get('where'), request.args.get('sort'), limit)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"status": "success", "data": result["rows"], "count": result["total"],
+                    "universe": result["universe"]}), 200
+
+
+@app.route('/api/portfolio/risk', methods=['GET'])
+@jwt_required()
+def portfolio_risk():
+    current_user_id = get_jwt_identity()
+    horizon_days = request.args.get('horizon', default=1, type=int)
+    holdings = [
+        {"ticker": p.ticker, "quantity": p.quantity, "avgBuyPrice": p.avg_buy_price}
+        for p in Portfolio.query.filter_by(user_id=current_user_id).all()
+    ]
+    covariance_service.ensure_started()
+    covariance, _, _ = covariance_service.submatrix([h["ticker"] for h in holdings],
+                                                    shrink=request.args.get('shrink') == 'true')
+    result = compute_portfolio_risk(holdings, horizon_days=max(horizon_days, 1),
+                                    covariance=None if covariance.empty else covariance)
+    if "error" in result:
+        return jsonify({"message": result["error"], "missing": result.get("missing", [])}), 404
+    return jsonify({"status": "success", "data": result}), 200
+
+@app.route('/api/portfolio/correlation', methods=['GET'])
+@jwt_required()
+def portfolio_correlation():
+    """Correlation matrix for the user's holdings and watchlist (or ?tickers=A,B,C) from the shared EWMA matrix."""
+    current_user_id = get_jwt_identity()
+    if request.args.get('tickers'):
+        tickers = [t.strip().upper() for t in request.args['tickers'].split(',') if t.strip()]
+    else:
+        held = [p.ticker for p in Portfolio.query.filter_by(user_id=current_user_id).all()]
+        tickers = list(dict.fromkeys(held + watchlist_tickers(current_user_id)))
+    if not tickers:
+        return jsonify({"message": "No tickers to correlate."}), 404
+    covariance_service.ensure_started()
+    correlation, missing = covariance_service.correlation(tickers, shrink=request.args.get('shrink') == 'true')
+    return jsonify({"status": "success", "data": {
+        "tickers": list(correlation.index),
+        "matrix": correlation.round(4).to_numpy().tolist(),
+        "missing": missing,
+        "asOf": covariance_service.state.last_day if covariance_service.state else None,
+    }}), 200
+
+@app.route('/api/portfolio/stress', methods=['POST'])
+@jwt_required()
+def portfolio_stress():
+    current_user_id = get_jwt_identity()
+    params, error = parse_stress_request(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"message": error}), 400
+    holdings = [
+        {"ticker": p.ticker, "quantity": p.quantity}
+        for p in Portfolio.query.filter_by(user_id=current_user_id).all()
+    ]
+    if not holdings:
+        return jsonify({"message": "Portfolio is empty."}), 404
+
+    try:
+        result = simulate_portfolio(holdings, **params)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if "error" in result:
+        return jsonify({"message": result["error"]}), 404
+    return jsonify({"status": "success", "data": result}), 200
+
 @app.route('/api/stock-data', methods=['GET'])
 def get_nifty50_data():
     try:
-        ticker = "^NSEI"  # Nifty 50
-        stock = yf.Ticker(ticker)
-        data = stock.history(period="1d")  # Get today's data
-
-        if data.empty:
+        latest = nifty_quote()
+        if latest is None:
             return jsonify({"message": "No data available"}), 404
-
-        latest = data.iloc[-1]  # Get the latest row
-        response = {
-            "price": latest['Close'],
-            "open": latest['Open'],
-            "high": latest['High'],
-            "low": latest['Low'],
-            "volume": int(latest['Volume'])
-        }
-        return jsonify(response)
+        return jsonify(latest)
     except Exception as e:
         print(e)
         return jsonify({"message": "Failed to fetch stock data"}), 500
 
+
+def nifty_quote():
+    """Nifty 50 from the quote hub's latest refresh, or None before the first one."""
+    quote_hub.ensure_started()
+    latest = quote_hub.get("^NSEI")
+    if latest is None:
+        return None
+    return {
+        "price": latest['price'],
+        "open": latest['open'],
+        "high": latest['high'],
+        "low": latest['low'],
+        "volume": latest['volume']
+    }
+
 if __name__ == "__main__":
     app.run(port=5000, debug=True)
 
@@ -0,0 +1,356 @@
+# asgi.py
+"""
+Async serving mode. The I/O-bound endpoints (/api/analyze, /api/forecast,
+/api/recommend, /api/ticker-data, /api/stock-data) and the server-sent
+event streams (/api/quotes/stream, /api/analyze/jobs/<id>/stream) are
+native async handlers; every other route is the unchanged Flask app,
+served through a WSGI adapter. Blocking work runs on bounded thread pools,
+so one process can hold hundreds of requests in flight while only
+ASGI_ANALYZE_THREADS analyses run at a time, and an open stream holds no
+thread at all.
+
+Needs starlette and uvicorn (plus a2wsgi, if installed, for the Flask routes).
+Start it with `python serve.py`.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from flask_jwt_extended import decode_token
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+# a2wsgi is the maintained adapter; Starlette's own one is kept as a fallback
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from app import (
+    app as flask_app, CORS_ORIGINS, nifty_quote, parse_chart_options, quote_stream_message, summary_job_payload,
+    ticker_bar_items, watchlist_tickers, with_summary_job,
+)
+from utils import encoding, metrics
+from utils.forecasting import forecaster, parse_forecast_request
+from utils.jobs import summary_jobs
+from utils.quote_hub import AsyncSubscriber, quote_hub
+from utils.analyzer import (
+    ADVISOR_UNAVAILABLE, RECOMMENDATION_FALLBACK, analyze_stock, analyze_stocks, llm, readiness,
+    recommendation_request,
+)
+
+# --- Configuration ---
+ANALYZE_THREADS = int(os.getenv("ASGI_ANALYZE_THREADS", "8"))   # concurrent analyze_stocks calls
+DB_THREADS = int(os.getenv("ASGI_DB_THREADS", "4"))             # concurrent DB and quote-hub lookups
+BATCH_WINDOW = float(os.getenv("ASGI_BATCH_WINDOW_MS", "5")) / 1000
+MAX_BATCH = int(os.getenv("ASGI_MAX_BATCH", "64"))
+KEEP_ALIVE_SECONDS = 15
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+analyze_executor = ThreadPoolExecutor(max_workers=ANALYZE_THREADS, thread_name_prefix="asgi-analyze")
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="asgi-db")
+
+
+def _in_app_context(fn, *args, **kwargs):
+    with flask_app.app_context():
+        return fn(*args, **kwargs)
+
+
+async def _run(executor, fn, *args, **kwargs):
+    """Runs a blocking call on `executor` inside a Flask app context."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(_in_app_context, fn, *args, **kwargs))
+
+
+# --- Analyze Batching ---
+
+class AnalyzeBatcher:
+    """
+    Merges /api/analyze requests that arrive within `window` seconds of each
+    other (with the same chart options) into one analyze_stocks call, so a
+    burst of requests costs one bulk fetch and one model prediction instead
+    of one of each per request. Concurrent requests for the same ticker share
+    the work.
+    """
+
+    def __init__(self, executor, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}   # options key -> {ticker: [futures]}
+
+    async def analyze(self, ticker, options):
+        loop = asyncio.get_running_loop()
+        key = tuple(sorted(options.items()))
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = {}
+            loop.call_later(self.window, self._flush, key, batch)
+        future = loop.create_future()
+        batch.setdefault(ticker, []).append(future)
+        if len(batch) >= self.max_batch:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key, batch):
+        if self._pending.get(key) is not batch:
+            return   # already flushed because it filled up
+        del self._pending[key]
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(
+            self.executor, partial(_in_app_context, analyze_stocks, list(batch), **dict(key))
+        )
+        work.add_done_callback(partial(self._resolve, batch))
+
+    @staticmethod
+    def _resolve(batch, work):
+        for ticker, futures in batch.items():
+            for future in futures:
+                if future.done():
+                    continue   # the client went away
+                if work.exception() is not None:
+                    future.set_exception(work.exception())
+                else:
+                    # Each request gets its own copy: summary job ids are per request
+                    future.set_result(dict(work.result()[ticker]))
+
+
+analyze_batcher = AnalyzeBatcher(analyze_executor)
+
+
+# --- Responses ---
+
+def _json(request, payload, status=200):
+    body = encoding.dumps(payload).encode()
+    headers = {}
+    if encoding.accepts_gzip(request.headers.get("accept-encoding")):
+        compressed = encoding.compress(body)
+        if compressed is not None:
+            body = compressed
+            headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+    return Response(body, status_code=status, media_type="application/json", headers=headers)
+
+
+async def _json_body(request):
+    """The request's JSON object, or None if the body is not valid JSON or not an object."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _instrumented(endpoint):
+    """Records async handlers in http_request_seconds under the same names as their Flask routes."""
+    def decorate(handler):
+        async def wrapper(request):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            finally:
+                metrics.http_request_seconds.observe(
+                    time.perf_counter() - started, endpoint=endpoint, method=request.method, status=status
+                )
+        return wrapper
+    return decorate
+
+
+def _jwt_identity(request):
+    header = request.headers.get("authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+    try:
+        with flask_app.app_context():
+            return decode_token(header[len("Bearer "):])["sub"]
+    except Exception:
+        return None
+
+
+# --- Async Endpoints ---
+
+@_instrumented("analyze_endpoint")
+async def analyze(request):
+    data = await _json_body(request)
+    if data is None:
+        return _json(request, {"message": "Request body must be a JSON object"}, 400)
+    ticker = data.get('ticker')
+    if not isinstance(ticker, str) or not ticker.strip():
+        return _json(request, {"message": "ticker is required"}, 400)
+    chart_options, error = parse_chart_options(data)
+    if error:
+        return _json(request, {"message": error}, 400)
+
+    if data.get('includeSummary'):
+        # Legacy blocking mode: wait for the AI summary before responding
+        result = await _run(analyze_executor, analyze_stock, ticker, **chart_options)
+        return _json(request, {"status": "success", "data": result})
+
+    result = with_summary_job(await analyze_batcher.analyze(ticker, chart_options))
+    return _json(request, {"status": "success", "data": result})
+
+
+@_instrumented("forecast_endpoint")
+async def forecast(request):
+    data = await _json_body(request)
+    if data is None:
+        return _json(request, {"message": "Request body must be a JSON object"}, 400)
+    options, error = parse_forecast_request(data)
+    if error:
+        return _json(request, {"message": error}, 400)
+    return _json(request, {"status": "success", "data": await _run(analyze_executor, forecaster.forecast, *options)})
+
+
+@_instrumented("recommend")
+async def recommend(request):
+    current_user_id = _jwt_identity(request)
+    if current_user_id is None:
+        return _json(request, {"msg": "Missing or invalid Authorization header"}, 401)
+    data = await _json_body(request)
+    if data is None:
+        return _json(request, {"message": "Request body must be a JSON object"}, 400)
+    query = data.get('query')
+    if not query:
+        return _json(request, {"message": "Query is required"}, 400)
+
+    try:
+        tickers = await _run(db_executor, watchlist_tickers, current_user_id)
+        if not llm.available:
+            return _json(request, {"recommendation": ADVISOR_UNAVAILABLE})
+        # Awaits the gateway's future directly: no thread is parked while Gemini answers
+        key, prompt = recommendation_request(query, tickers)
+        with metrics.timed("llm"):
+            # shield: a timed-out request must not cancel the call other callers may be sharing
+            recommendation = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(llm.submit(key, prompt))), llm.timeout
+            )
+    except asyncio.TimeoutError:
+        recommendation = RECOMMENDATION_FALLBACK
+    except Exception as e:
+        print("Error in recommend:", e)
+        return _json(request, {"message": "Failed to generate recommendation"}, 500)
+    return _json(request, {"recommendation": recommendation})
+
+
+@_instrumented("ticker_data")
+async def ticker_data(request):
+    return _json(request, {"status": "success", "data": await _run(db_executor, ticker_bar_items)})
+
+
+@_instrumented("get_nifty50_data")
+async def stock_data(request):
+    try:
+        latest = await _run(db_executor, nifty_quote)
+    except Exception as e:
+        print(e)
+        return _json(request, {"message": "Failed to fetch stock data"}, 500)
+    if latest is None:
+        return _json(request, {"message": "No data available"}, 404)
+    return _json(request, latest)
+
+
+# --- Streams ---
+
+@_instrumented("quote_stream")
+async def quote_stream(request):
+    await _run(db_executor, quote_hub.ensure_started)
+    subscriber = quote_hub.subscribe(AsyncSubscriber())
+
+    async def events():
+        # Server-sent events: a `snapshot` first, then `quotes` diffs as the hub refreshes
+        try:
+            while True:
+                try:
+                    event, message = await subscriber.next(KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {encoding.dumps(quote_stream_message(message))}\n\n"
+        finally:
+            quote_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@_instrumented("analyze_job_stream")
+async def analyze_job_stream(request):
+    job_id = request.path_params['job_id']
+    if summary_jobs.get(job_id) is None:
+        return _json(request, {"message": "Unknown or expired job"}, 404)
+
+    async def events():
+        # Server-sent events: one `status` event per change, comments as keep-alives
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(changed.set)
+
+        summary_jobs.add_listener(job_id, wake)
+        try:
+            last_status = None
+            while True:
+                changed.clear()
+                job = summary_jobs.get(job_id)
+                if job is None:
+                    yield "event: error\ndata: {\"message\": \"Unknown or expired job\"}\n\n"
+                    return
+                if job["status"] != last_status:
+                    last_status = job["status"]
+                    yield f"event: status\ndata: {encoding.dumps(summary_job_payload(job))}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+                if job["status"] in ("done", "failed"):
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            summary_jobs.remove_listener(job_id, wake)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    # Load the model and configure the LLM client before the first request arrives
+    status = await _run(analyze_executor, readiness)
+    print(f"✅ ASGI worker ready: {status}")
+    yield
+    analyze_executor.shutdown(wait=False)
+    db_executor.shutdown(wait=False)
+
+
+async_app = Starlette(
+    routes=[
+        Route('/api/analyze', analyze, methods=['POST']),
+        Route('/api/forecast', forecast, methods=['POST']),
+        Route('/api/recommend', recommend, methods=['POST']),
+        Route('/api/ticker-data', ticker_data, methods=['GET']),
+        Route('/api/stock-data', stock_data, methods=['GET']),
+        Route('/api/quotes/stream', quote_stream, methods=['GET']),
+        Route('/api/analyze/jobs/{job_id}/stream', analyze_job_stream, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=[CORS_ORIGINS], allow_credentials=True,
+                           allow_methods=["*"], allow_headers=["*"])],
+    lifespan=_lifespan,
+)
+ASYNC_PATHS = [route.path_regex for route in async_app.routes]
+wsgi_app = WSGIMiddleware(flask_app)
+
+
+async def application(scope, receive, send):
+    """Async endpoints go to Starlette; everything else to the Flask app (which handles its own CORS)."""
+    if scope["type"] == "http" and not any(path.match(scope["path"]) for path in ASYNC_PATHS):
+        await wsgi_app(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Synthetic OHLCV Fixtures ---
+# Seeded geometric Brownian motion, one CSV per ticker in the layout
+# `ReplayFetcher` reads (`<ticker>.csv`), so the whole app can be pointed at
+# them with PRICE_HISTORY_REPLAY_DIR and no network access.
+
+
+def synthetic_tickers(n):
+    return [f"SYN{i:03d}.NS" for i in range(n)]
+
+
+def gbm_frame(seed, bars=1260, start_price=1000.0, mu=0.08, sigma=0.25, end="2026-01-02"):
+    """Daily OHLCV bars for one ticker, ending at `end`."""
+    rng = np.random.default_rng(seed)
+    dt = 1 / 252
+    # Volatility regime shifts so the volatility model has something to learn
+    regime = np.repeat(rng.uniform(0.5, 1.5, bars // 63 + 1), 63)[:bars]
+    returns = (mu - 0.5 * sigma ** 2) * dt + sigma * regime * np.sqrt(dt) * rng.standard_normal(bars)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[start_price], close[:-1]]) * (1 + 0.002 * rng.standard_normal(bars))
+    spread = np.abs(rng.standard_normal(bars)) * 0.01 * close
+    index = pd.bdate_range(end=end, periods=bars, name="Date")
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(100_000, 5_000_000, bars),
+    }, index=index)
+
+
+def write_fixtures(directory, tickers, bars=1260):
+    """Writes one GBM CSV per ticker (seeded by position) and returns `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    for i, ticker in enumerate(tickers):
+        gbm_frame(seed=i, bars=bars).to_csv(os.path.join(directory, f"{ticker}.csv"))
+    return directory
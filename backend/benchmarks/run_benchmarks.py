@@ -0,0 +1,290 @@
+"""
+Offline benchmark suite: model training, single and batch analysis, bot runs
+at several user/ticker counts, API throughput and backtesting. Everything
+runs against synthetic OHLCV fixtures, the fake LLM backend, SQLite and a
+simulated quote feed, so results only depend on the code and the machine.
+
+Run from backend/:
+    python -m benchmarks.run_benchmarks --save-baseline     # record a baseline
+    python -m benchmarks.run_benchmarks                     # compare; exits 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import synthetic_tickers, write_fixtures
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'baseline.json')
+DEFAULT_THRESHOLD = 0.25     # fail when a result is >25% worse than its baseline
+FULL_SIZES = {"tickers": 60, "train_tickers": 8, "bot": [(10, 10), (100, 30), (500, 60)], "requests": 400}
+QUICK_SIZES = {"tickers": 12, "train_tickers": 3, "bot": [(10, 5), (50, 12)], "requests": 100}
+# Seeded users never log in, so they skip bcrypt and share a placeholder hash
+UNUSABLE_PASSWORD_HASH = "!benchmark"
+
+
+def _configure_environment(workdir, fixtures_dir, llm_delay):
+    """Points every external dependency at local stand-ins. Must run before the app is imported."""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_DELAY": str(llm_delay),
+        "PRICE_HISTORY_REPLAY_DIR": fixtures_dir,
+        "PRICE_STORE_DIR": os.path.join(workdir, 'store'),
+        "QUOTE_FEED": "simulated",
+        "MODEL_PATH": os.path.join(workdir, 'models', 'volatility_model_pipeline.pkl'),
+    })
+
+
+def _median_time(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def _seconds(value):
+    return {"value": round(value, 4), "unit": "s"}
+
+
+# --- Benchmarks ---
+# The app modules are imported inside the benchmarks because they read their
+# configuration from the environment at import time.
+
+def bench_training(results, tickers, fixtures_dir, workdir, n_jobs):
+    from train_model_pipeline import train_pipeline
+    from utils.price_history import ReplayFetcher
+
+    started = time.perf_counter()
+    metrics = train_pipeline(tickers=tickers, period="5y", n_jobs=n_jobs, fetcher=ReplayFetcher(fixtures_dir),
+                             model_dir=os.path.join(workdir, 'models'))
+    if not metrics:
+        raise RuntimeError("Training failed; see the output above.")
+    results["train.total"] = _seconds(time.perf_counter() - started)
+    results["train.cv"] = _seconds(metrics["cvSeconds"])
+
+
+def _reset_caches():
+    from utils.analyzer import llm
+    from utils.price_history import get_cache
+
+    get_cache().invalidate()
+    llm.invalidate()
+
+
+def bench_analysis(results, tickers, repeats):
+    from utils.analyzer import analyze_stock, analyze_stocks
+
+    def cold_single():
+        _reset_caches()
+        analyze_stock(tickers[0])
+
+    results["analyze.single_cold"] = _seconds(_median_time(cold_single, repeats))
+    results["analyze.single_warm"] = _seconds(_median_time(lambda: analyze_stock(tickers[0]), repeats))
+
+    def cold_batch():
+        _reset_caches()
+        analyze_stocks(tickers, include_summary=True)
+
+    results[f"analyze.batch{len(tickers)}_cold"] = _seconds(_median_time(cold_batch, repeats))
+
+
+def _seed_users(n_users, tickers, per_user):
+    from app import app, db, User, Watchlist, Portfolio
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f"bench{i}", password_hash=UNUSABLE_PASSWORD_HASH, auto_trade_allowed=(i % 5 == 0))
+                 for i in range(n_users)]
+        db.session.add_all(users)
+        db.session.flush()
+        rows = []
+        for i, user in enumerate(users):
+            watched = [tickers[(i + k) % len(tickers)] for k in range(min(per_user, len(tickers)))]
+            rows += [Watchlist(ticker=t, user_id=user.id) for t in watched]
+            if user.auto_trade_allowed:
+                rows.append(Portfolio(ticker=watched[0], quantity=10, avg_buy_price=1000.0, user_id=user.id))
+        db.session.add_all(rows)
+        db.session.commit()
+
+
+def bench_bot(results, tickers, sizes):
+    from bot import ai_trading_bot
+
+    for n_users, n_tickers in sizes:
+        _seed_users(n_users, tickers[:n_tickers], per_user=5)
+        _reset_caches()
+        report = ai_trading_bot()
+        results[f"bot.u{n_users}_t{n_tickers}"] = _seconds(report["timings"]["total"])
+        results[f"bot.u{n_users}_t{n_tickers}.write"] = _seconds(report["timings"]["write"])
+
+
+def bench_backtest(results, tickers, fixtures_dir):
+    import pandas as pd
+    from utils.analyzer import get_pipeline
+    from utils.backtest import BacktestPanel, sweep
+    from utils.price_history import ReplayFetcher
+
+    frames = ReplayFetcher(fixtures_dir)(tickers, None, "1d")
+    closes = pd.concat({t: f['Close'] for t, f in frames.items()}, axis=1).sort_index()
+    started = time.perf_counter()
+    panel = BacktestPanel(closes, get_pipeline())
+    results[f"backtest.t{len(tickers)}_predict"] = _seconds(time.perf_counter() - started)
+    started = time.perf_counter()
+    sweep(panel, {"sell_above": [0.3, 0.35, 0.4], "buy_below": [0.2, 0.25, 0.3], "cost_bps": [10.0]})
+    results[f"backtest.t{len(tickers)}_sweep9"] = _seconds(time.perf_counter() - started)
+
+
+def _serve(app):
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _throughput(make_request, n_requests, concurrency):
+    def call(i):
+        with urllib.request.urlopen(make_request(i), timeout=60) as response:
+            response.read()
+            return response.status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(min(concurrency, n_requests))))   # warm-up
+        started = time.perf_counter()
+        statuses = list(pool.map(call, range(n_requests)))
+        elapsed = time.perf_counter() - started
+    failed = sum(1 for s in statuses if s != 200)
+    if failed:
+        print(f"⚠️ {failed}/{n_requests} requests failed")
+    return {"value": round(n_requests / elapsed, 2), "unit": "req/s"}
+
+
+def bench_api(results, tickers, n_requests, concurrency):
+    from app import app
+
+    server, base = _serve(app)
+    try:
+        def analyze_request(i):
+            body = json.dumps({"ticker": tickers[i % len(tickers)]}).encode()
+            return urllib.request.Request(f"{base}/api/analyze", data=body,
+                                          headers={"Content-Type": "application/json"})
+
+        results["api.analyze"] = _throughput(analyze_request, n_requests, concurrency)
+        results["api.ticker_data"] = _throughput(lambda i: f"{base}/api/ticker-data", n_requests, concurrency)
+    finally:
+        server.shutdown()
+
+
+# --- Baselines ---
+
+def compare(results, baseline, threshold):
+    """Prints a comparison table and returns the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<28}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            print(f"{name:<28}{'-':>14}{current['value']:>12}{current['unit'][0]:>2}{'new':>10}")
+            continue
+        change = current["value"] / base["value"] - 1
+        worse = change > threshold if current["unit"] == "s" else change < -threshold
+        flag = "  ❌" if worse else ""
+        print(f"{name:<28}{base['value']:>12}{base['unit'][0]:>2}{current['value']:>12}{current['unit'][0]:>2}"
+              f"{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes for a fast smoke run.")
+    parser.add_argument('--only', nargs='+', choices=["train", "analyze", "bot", "api", "backtest"],
+                        help="Run only these groups (training always runs: it builds the model).")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed repetitions per latency benchmark.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent API clients.")
+    parser.add_argument('--llm-delay', type=float, default=0.05, help="Fake LLM response time in seconds.")
+    parser.add_argument('--n-jobs', type=int, default=1, help="Training search workers (1 keeps runs comparable).")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON to compare with or save to.")
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown before a result counts as a regression.")
+    parser.add_argument('--output', help="Also write the results JSON here.")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    groups = set(args.only or ["train", "analyze", "bot", "api", "backtest"])
+    workdir = tempfile.mkdtemp(prefix="riskforecaster-bench-")
+    tickers = synthetic_tickers(sizes["tickers"])
+    fixtures_dir = write_fixtures(os.path.join(workdir, 'fixtures'), tickers)
+    _configure_environment(workdir, fixtures_dir, args.llm_delay)
+    print(f"🧪 Benchmarking with {len(tickers)} synthetic tickers in {workdir}")
+
+    results = {}
+    try:
+        bench_training(results, tickers[:sizes["train_tickers"]], fixtures_dir, workdir, args.n_jobs)
+        if "analyze" in groups:
+            bench_analysis(results, tickers[:10], args.repeats)
+        if "bot" in groups:
+            bench_bot(results, tickers, sizes["bot"])
+        if "api" in groups:
+            bench_api(results, tickers, sizes["requests"], args.concurrency)
+        if "backtest" in groups:
+            bench_backtest(results, tickers, fixtures_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if "train" not in groups:
+        results = {k: v for k, v in results.items() if not k.startswith("train.")}
+    report = {
+        "config": {"quick": args.quick, "llmDelay": args.llm_delay, "concurrency": args.concurrency,
+                   "repeats": args.repeats, "nJobs": args.n_jobs},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(json.dumps(results, indent=2))
+        print(f"ℹ️ No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != report["config"]:
+        print(f"⚠️ Baseline was recorded with a different configuration: {baseline.get('config')}")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,69 +1,301 @@
 # bot.py
+import os
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from app import db, User, Portfolio, Execution, TradeSignal
-from utils.analyzer import analyze_stock, get_ai_recommendation
+# The bot gets its own small connection pool (see utils/db_config.py); must be set before app is imported
+os.environ.setdefault("DB_POOL_ROLE", "BOT")
+# The bot is the single writer of the shared covariance files; web workers only map them
+os.environ.setdefault("COVARIANCE_REFRESH", "on")
+
+from app import app, db, users_for_bot, Execution, Portfolio, TradeSignal
+from utils.analyzer import analyze_stocks, get_ai_recommendation
+from retention import run_retention
+from utils.unit_of_work import BulkWriter
+from utils.bar_feed import QuoteBarFeed, ReplayBarFeed
+from utils.covariance import covariance_service
+from utils.quote_hub import quote_hub
+from utils.signal_engine import FeatureBook, SignalGate, WatcherIndex
+from utils import metrics
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+# BOT_MODE=events reacts to new bars instead of sweeping every watchlist every 5 minutes
+BOT_MODE = os.getenv("BOT_MODE", "sweep")
+EVENT_POLL_SECONDS = float(os.getenv("BOT_EVENT_POLL_SECONDS", "5"))
+EVENT_INDEX_REFRESH_SECONDS = float(os.getenv("BOT_EVENT_INDEX_REFRESH_SECONDS", "60"))
+# Replay recorded `<ticker>.csv` histories instead of live quotes, from BOT_REPLAY_START onwards
+BOT_REPLAY_DIR = os.getenv("BOT_REPLAY_DIR")
+BOT_REPLAY_START = os.getenv("BOT_REPLAY_START")
+# Set to expose this process's metrics (bot stage timings, DB time, cache hits) for scraping
+BOT_METRICS_PORT = os.getenv("BOT_METRICS_PORT")
+
+bot_runs = metrics.counter("bot_runs_total", "Trading bot runs by outcome.", ["outcome"])
+bot_event_work = metrics.counter(
+    "bot_event_work_total", "Event-driven bot work: bars, changed/evaluated/suppressed tickers, signals.", ["kind"]
+)
+
+# Held for the whole run so an overrunning cycle makes the next one skip instead of piling up
+_run_lock = threading.Lock()
+
+
+def _parse_signal(recommendation):
+    """Reduces a free-text recommendation to the BUY / SELL / HOLD label stored on TradeSignal."""
+    text = recommendation.lower()
+    if "sell" in text:
+        return "SELL"
+    if "buy" in text:
+        return "BUY"
+    return "HOLD"
+
+
+def _act_on_signal(writer, user, ticker, signal, price, confidence, now):
+    """
+    Queues what one signal means for one user: an auto-trade sell of their
+    holding, or a logged TradeSignal. Returns "execution", "signal" or None.
+    """
+    if user.auto_trade_allowed:
+        # Auto trading: sell if recommended
+        holding = user.holdings.get(ticker)
+        if signal == "SELL" and holding is not None:
+            # The execution and the holding it closes commit together
+            writer.add_unit(
+                inserts=[(Execution, {
+                    "ticker": ticker,
+                    "action": "SELL",
+                    "quantity": holding.quantity,
+                    "price": price if price is not None else holding.avg_buy_price,
+                    "user_id": user.id,
+                    "created_at": now,
+                })],
+                deletes=[(Portfolio, holding.id)],
+            )
+            return "execution"
+        return None
+    # Just log trade signals
+    writer.add(TradeSignal, {
+        "ticker": ticker,
+        "signal": signal,
+        "confidence": confidence,
+        "user_id": user.id,
+        "created_at": now,
+    })
+    return "signal"
+
 
 def ai_trading_bot():
+    if not _run_lock.acquire(blocking=False):
+        print(f"⏭️ Previous bot run still active, skipping run at {datetime.utcnow()}")
+        bot_runs.inc(outcome="skipped")
+        return None
+    try:
+        with app.app_context():
+            report = _run_bot()
+        bot_runs.inc(outcome="ok")
+        return report
+    except Exception:
+        bot_runs.inc(outcome="error")
+        raise
+    finally:
+        _run_lock.release()
+
+
+def _run_bot():
     print(f"🤖 Bot running at {datetime.utcnow()}")
-    users = User.query.all()
+    timings = {}
+    started = last = time.perf_counter()
 
+    def lap(stage):
+        nonlocal last
+        now = time.perf_counter()
+        timings[stage] = round(now - last, 3)
+        metrics.stage_seconds.observe(now - last, stage=f"bot_{stage}")
+        last = now
+
+    # Invert the per-user watchlists into ticker -> watchers, so each ticker is analyzed once
+    users = users_for_bot()
+    watchers = defaultdict(list)
     for user in users:
-        tickers = [item.ticker for item in user.watchlist]
-        portfolio_tickers = {p.ticker: p for p in user.portfolio}
+        for ticker in user.watchlist:
+            watchers[ticker].append(user)
+    tickers = sorted(watchers)
+    lap("load")
 
-        for ticker in tickers:
-            try:
-                # Get analysis
-                analysis = analyze_stock(ticker)
-                recommendation = get_ai_recommendation("maximize profit", [ticker])
-                confidence = analysis.get("risk_score", 50)
-
-                if user.auto_trade_allowed:
-                    # Auto trading: sell if recommended
-                    if "sell" in recommendation.lower() and ticker in portfolio_tickers:
-                        stock = portfolio_tickers[ticker]
-                        execution = Execution(
-                            ticker=ticker,
-                            action="SELL",
-                            quantity=stock.quantity,
-                            price=analysis.get("current_price", stock.avg_buy_price),
-                            user_id=user.id
-                        )
-                        db.session.add(execution)
-                        db.session.delete(stock)
-                        db.session.commit()
-                        print(f"✅ Sold {ticker} for user {user.username}")
-                else:
-                    # Just log trade signals
-                    signal = TradeSignal(
-                        ticker=ticker,
-                        signal=recommendation.upper(),
-                        confidence=confidence,
-                        user_id=user.id
-                    )
-                    db.session.add(signal)
-                    db.session.commit()
-                    print(f"📊 Logged trade signal for {ticker} ({user.username})")
+    analyses = analyze_stocks(tickers)
+    lap("analyze")
+
+    with ThreadPoolExecutor(max_workers=BOT_WORKERS) as pool:
+        recommendations = dict(zip(
+            tickers, pool.map(lambda t: get_ai_recommendation("maximize profit", [t]), tickers)
+        ))
+    lap("recommend")
+
+    writer = BulkWriter(db.session)
+    signals = executions = 0
+    for ticker in tickers:
+        analysis = analyses[ticker]
+        if "error" in analysis:
+            print(f"❌ Error processing {ticker}: {analysis['error']}")
+            continue
+        recommendation = recommendations[ticker]
+        signal = _parse_signal(recommendation)
+        confidence = analysis.get("risk_score", 50)
+        now = datetime.utcnow()
 
+        for user in watchers[ticker]:
+            outcome = _act_on_signal(writer, user, ticker, signal, analysis.get("lastClosePrice"), confidence, now)
+            signals += outcome == "signal"
+            executions += outcome == "execution"
+
+    # Bulk inserts, one transaction per batch instead of a commit per row
+    writer.flush()
+    lap("write")
+
+    timings["total"] = round(time.perf_counter() - started, 3)
+    metrics.stage_seconds.observe(timings["total"], stage="bot_total")
+    report = {
+        "users": len(users), "tickers": len(tickers),
+        "signals": signals, "executions": executions, "writes": writer.report(), "timings": timings,
+    }
+    print(f"📊 Bot run finished: {report}")
+    return report
+
+# ----------------------------
+# Event-Driven Mode
+# ----------------------------
+class EventDrivenBot:
+    """
+    Reacts to new bars from `feed` (see utils/bar_feed.py) instead of
+    sweeping every watchlist. Each cycle advances feature state for the
+    tickers that got bars, predicts just those, re-evaluates the ones that
+    moved past the SignalGate thresholds, and acts only for the users who
+    watch or hold them, so the work per cycle follows market activity rather
+    than users x tickers.
+    """
+
+    def __init__(self, feed, gate=None, index_refresh_seconds=EVENT_INDEX_REFRESH_SECONDS):
+        self.feed = feed
+        self.gate = gate or SignalGate()
+        self.index_refresh_seconds = index_refresh_seconds
+        self.book = FeatureBook()
+        self.index = WatcherIndex()
+        self._indexed_at = None
+
+    def _refresh_index(self, now):
+        """Rebuilds the reverse index (watchlists change) and seeds newly watched tickers."""
+        if self._indexed_at is not None and now - self._indexed_at < self.index_refresh_seconds:
+            return
+        self.index.build(users_for_bot())
+        tickers = self.index.tickers()
+        self.book.retain(tickers)
+        self.book.seed(tickers, self.feed.history)
+        self._indexed_at = now
+
+    def cycle(self, now=None):
+        """Processes the bars that arrived since the last cycle and returns a report."""
+        now = time.monotonic() if now is None else now
+        started = time.perf_counter()
+        with app.app_context():
+            self._refresh_index(now)
+
+            bars = self.feed.poll()
+            changed = self.book.apply(bars)
+            predictions = self.book.predict(changed)
+            due = sorted(
+                t for t, predicted in predictions.items()
+                if self.gate.due(t, self.book.price(t), predicted, now)
+            )
+            bot_event_work.inc(len(bars), kind="bars")
+            bot_event_work.inc(len(changed), kind="changed")
+            bot_event_work.inc(len(changed) - len(due), kind="suppressed")
+            report = {"bars": len(bars), "changed": len(changed), "evaluated": len(due), "signals": 0, "executions": 0}
+            if not due:
+                return report
+
+            with ThreadPoolExecutor(max_workers=BOT_WORKERS) as pool:
+                recommendations = dict(zip(
+                    due, pool.map(lambda t: get_ai_recommendation("maximize profit", [t]), due)
+                ))
+            for ticker in due:
+                self.gate.evaluated(ticker, self.book.price(ticker), predictions[ticker], now)
+            bot_event_work.inc(len(due), kind="evaluated")
+
+            # Only the users affected by the evaluated tickers are loaded
+            users = users_for_bot(self.index.users_for(due))
+            tickers_by_user = {u.id: set(u.watchlist) | set(u.holdings) for u in users}
+            writer = BulkWriter(db.session)
+            stamp = datetime.utcnow()
+            for ticker in due:
+                signal = _parse_signal(recommendations[ticker])
+                for user in users:
+                    if ticker not in tickers_by_user[user.id]:
+                        continue
+                    # Unchanged signals are not logged again; auto-trade sells always act on the current holding
+                    if not user.auto_trade_allowed and not self.gate.changed(user.id, ticker, signal):
+                        continue
+                    # 50 is the sweep's default confidence too (analyses carry no risk score)
+                    outcome = _act_on_signal(writer, user, ticker, signal, self.book.price(ticker), 50, stamp)
+                    report["signals"] += outcome == "signal"
+                    report["executions"] += outcome == "execution"
+            writer.flush()
+
+        bot_event_work.inc(report["signals"], kind="signals")
+        metrics.stage_seconds.observe(time.perf_counter() - started, stage="bot_event_cycle")
+        print(f"⚡ Event cycle: {report}")
+        return report
+
+    def run(self, poll_seconds=EVENT_POLL_SECONDS, max_cycles=None):
+        """Polls the feed until stopped, `max_cycles` runs, or a replay feed runs out."""
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            started = time.monotonic()
+            try:
+                self.cycle()
             except Exception as e:
-                print(f"❌ Error processing {ticker}: {e}")
+                print(f"❌ Event cycle failed: {e}")
+            cycles += 1
+            if getattr(self.feed, "exhausted", False):
+                break
+            time.sleep(max(0.0, poll_seconds - (time.monotonic() - started)))
+        return cycles
+
+
+def event_feed():
+    """The bar feed for BOT_MODE=events: a replay of BOT_REPLAY_DIR if set, otherwise live quotes."""
+    if BOT_REPLAY_DIR:
+        if not BOT_REPLAY_START:
+            raise ValueError("BOT_REPLAY_START (first replayed date) is required with BOT_REPLAY_DIR")
+        with app.app_context():
+            tickers = WatcherIndex()
+            tickers.build(users_for_bot())
+        return ReplayBarFeed.from_directory(BOT_REPLAY_DIR, tickers.tickers(), BOT_REPLAY_START)
+    return QuoteBarFeed(quote_hub)
 
 # ----------------------------
 # Scheduler
 # ----------------------------
 if __name__ == "__main__":
+    if BOT_METRICS_PORT:
+        metrics.serve_metrics(int(BOT_METRICS_PORT))
     scheduler = BackgroundScheduler()
-    # Run every 5 minutes; change minutes=1 for testing
-    scheduler.add_job(func=ai_trading_bot, trigger="interval", minutes=5)
+    if BOT_MODE != "events":
+        # Run every 5 minutes; change minutes=1 for testing. A run that overruns is skipped, not queued.
+        scheduler.add_job(func=ai_trading_bot, trigger="interval", minutes=5, max_instances=1, coalesce=True)
+    # Nightly rollup/archive of old signal history
+    scheduler.add_job(func=run_retention, trigger="cron", hour=2, max_instances=1, coalesce=True)
     scheduler.start()
+    covariance_service.ensure_started()
 
-    print("🤖 AI Trading Bot started...")
+    print(f"🤖 AI Trading Bot started ({BOT_MODE} mode)...")
 
     # Keep script running
     try:
+        if BOT_MODE == "events":
+            # A replay runs faster than wall-clock time, so it isn't debounced
+            EventDrivenBot(event_feed(), gate=SignalGate(debounce=0) if BOT_REPLAY_DIR else None).run()
         while True:
             time.sleep(60)
     except (KeyboardInterrupt, SystemExit):
@@ -0,0 +1,74 @@
+"""initial schema: user, watchlist, portfolio, trade_signal, execution
+
+Revision ID: 1a0e5c7b9d42
+Revises: 
+Create Date: 2026-10-18 16:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a0e5c7b9d42'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('password_hash', sa.String(length=128), nullable=False),
+    sa.Column('auto_trade_allowed', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('watchlist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'ticker', name='_user_ticker_uc')
+    )
+    op.create_table('portfolio',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('avg_buy_price', sa.Float(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'ticker', name='_user_portfolio_ticker_uc')
+    )
+    op.create_table('trade_signal',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('signal', sa.String(length=10), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('execution',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('execution')
+    op.drop_table('trade_signal')
+    op.drop_table('portfolio')
+    op.drop_table('watchlist')
+    op.drop_table('user')
@@ -0,0 +1,35 @@
+"""add history indexes on trade_signal and execution
+
+Revision ID: 3f1c9a7d2b10
+Revises: 1a0e5c7b9d42
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b10'
+down_revision = '1a0e5c7b9d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trade_signal', schema=None) as batch_op:
+        batch_op.create_index('ix_trade_signal_user_created', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_trade_signal_ticker', ['ticker'], unique=False)
+
+    with op.batch_alter_table('execution', schema=None) as batch_op:
+        batch_op.create_index('ix_execution_user_created', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_execution_ticker', ['ticker'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('execution', schema=None) as batch_op:
+        batch_op.drop_index('ix_execution_ticker')
+        batch_op.drop_index('ix_execution_user_created')
+
+    with op.batch_alter_table('trade_signal', schema=None) as batch_op:
+        batch_op.drop_index('ix_trade_signal_ticker')
+        batch_op.drop_index('ix_trade_signal_user_created')
@@ -0,0 +1,56 @@
+"""add daily_signal_summary rollup table and created_at indexes
+
+Revision ID: 8b2e4d6a9c31
+Revises: 3f1c9a7d2b10
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6a9c31'
+down_revision = '3f1c9a7d2b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_signal_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('signal_count', sa.Integer(), nullable=False),
+    sa.Column('buy_count', sa.Integer(), nullable=False),
+    sa.Column('sell_count', sa.Integer(), nullable=False),
+    sa.Column('hold_count', sa.Integer(), nullable=False),
+    sa.Column('avg_confidence', sa.Float(), nullable=False),
+    sa.Column('first_at', sa.DateTime(), nullable=False),
+    sa.Column('last_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'ticker', 'day', name='_user_ticker_day_uc')
+    )
+    with op.batch_alter_table('daily_signal_summary', schema=None) as batch_op:
+        batch_op.create_index('ix_daily_signal_summary_user_day', ['user_id', 'day'], unique=False)
+
+    with op.batch_alter_table('trade_signal', schema=None) as batch_op:
+        batch_op.create_index('ix_trade_signal_created', ['created_at'], unique=False)
+
+    with op.batch_alter_table('execution', schema=None) as batch_op:
+        batch_op.create_index('ix_execution_created', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('execution', schema=None) as batch_op:
+        batch_op.drop_index('ix_execution_created')
+
+    with op.batch_alter_table('trade_signal', schema=None) as batch_op:
+        batch_op.drop_index('ix_trade_signal_created')
+
+    with op.batch_alter_table('daily_signal_summary', schema=None) as batch_op:
+        batch_op.drop_index('ix_daily_signal_summary_user_day')
+
+    op.drop_table('daily_signal_summary')
@@ -0,0 +1,145 @@
+# retention.py
+import os
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app import app, db, TradeSignal, Execution, DailySignalSummary
+from utils.signal_archive import write_partition
+
+# Raw TradeSignal rows older than this are rolled up into DailySignalSummary,
+# archived to compressed columnar files and deleted from the database.
+SIGNAL_RETENTION_DAYS = int(os.getenv("SIGNAL_RETENTION_DAYS", "30"))
+# Executions are audit records: they are only archived and pruned if an age is configured.
+EXECUTION_RETENTION_DAYS = os.getenv("EXECUTION_RETENTION_DAYS")
+
+SIGNAL_COLUMNS = ("id", "user_id", "ticker", "signal", "confidence", "created_at")
+EXECUTION_COLUMNS = ("id", "user_id", "ticker", "action", "quantity", "price", "created_at")
+
+
+def _cutoff(max_age_days, now=None):
+    return datetime.combine((now or datetime.utcnow()).date() - timedelta(days=max_age_days), time.min)
+
+
+def _next_day(model, after, cutoff):
+    """The next calendar day with rows in [after, cutoff), or None. Skips empty stretches in one query."""
+    oldest = db.session.query(db.func.min(model.created_at)).filter(
+        model.created_at >= after, model.created_at < cutoff
+    ).scalar()
+    return None if oldest is None else datetime.combine(oldest.date(), time.min)
+
+
+def _load_day(model, columns, day_start):
+    rows = db.session.query(*[getattr(model, c) for c in columns]).filter(
+        model.created_at >= day_start, model.created_at < day_start + timedelta(days=1)
+    ).order_by(model.id).all()
+    if not rows:
+        return {}
+    values = list(zip(*rows))
+    data = {name: np.asarray(values[i]) for i, name in enumerate(columns)}
+    data["ticker"] = data["ticker"].astype(str)
+    data["created_at"] = np.asarray(values[columns.index("created_at")], dtype="datetime64[us]")
+    return data
+
+
+def _rollup(day, data):
+    """Upserts one day's DailySignalSummary rows, merging with any earlier rollup of the same day."""
+    frame = pd.DataFrame({name: data[name] for name in SIGNAL_COLUMNS})
+    frame["signal"] = frame["signal"].str.upper()
+    grouped = frame.groupby(["user_id", "ticker"])
+    summary = pd.DataFrame({
+        "signal_count": grouped.size(),
+        "buy_count": grouped["signal"].apply(lambda s: int((s == "BUY").sum())),
+        "sell_count": grouped["signal"].apply(lambda s: int((s == "SELL").sum())),
+        "avg_confidence": grouped["confidence"].mean(),
+        "first_at": grouped["created_at"].min(),
+        "last_at": grouped["created_at"].max(),
+    })
+    summary["hold_count"] = summary["signal_count"] - summary["buy_count"] - summary["sell_count"]
+
+    existing = {
+        (s.user_id, s.ticker): s
+        for s in DailySignalSummary.query.filter_by(day=day.date()).all()
+    }
+    for (user_id, ticker), row in summary.iterrows():
+        current = existing.get((int(user_id), ticker))
+        first_at, last_at = row["first_at"].to_pydatetime(), row["last_at"].to_pydatetime()
+        if current is None:
+            db.session.add(DailySignalSummary(
+                user_id=int(user_id), ticker=ticker, day=day.date(),
+                signal_count=int(row["signal_count"]), buy_count=int(row["buy_count"]),
+                sell_count=int(row["sell_count"]), hold_count=int(row["hold_count"]),
+                avg_confidence=float(row["avg_confidence"]), first_at=first_at, last_at=last_at,
+            ))
+            continue
+        total = current.signal_count + int(row["signal_count"])
+        current.avg_confidence = (
+            current.avg_confidence * current.signal_count + float(row["avg_confidence"]) * int(row["signal_count"])
+        ) / total
+        current.signal_count = total
+        current.buy_count += int(row["buy_count"])
+        current.sell_count += int(row["sell_count"])
+        current.hold_count += int(row["hold_count"])
+        current.first_at = min(current.first_at, first_at)
+        current.last_at = max(current.last_at, last_at)
+    return len(summary)
+
+
+def _compact(model, table, columns, max_age_days, rollup=None, archive=True, now=None):
+    """
+    Walks day partitions older than the cutoff, oldest first. Each day is
+    archived to disk before its rows are deleted, and the rollup, delete and
+    commit happen in one transaction per day, so an interrupted run loses
+    nothing and simply resumes at the first day still in the database.
+    """
+    cutoff = _cutoff(max_age_days, now)
+    report = {"days": 0, "rows": 0, "summaries": 0, "files": []}
+    day = _next_day(model, datetime.min, cutoff)
+    while day is not None:
+        data = _load_day(model, columns, day)
+        if data:
+            if archive:
+                path = write_partition(table, day.date(), data)
+                if path:
+                    report["files"].append(path)
+            if rollup:
+                report["summaries"] += rollup(day, data)
+            model.query.filter(
+                model.created_at >= day, model.created_at < day + timedelta(days=1)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            report["days"] += 1
+            report["rows"] += len(data["id"])
+        day = _next_day(model, day + timedelta(days=1), cutoff)
+    return report
+
+
+def compact_signals(max_age_days=SIGNAL_RETENTION_DAYS, archive=True, now=None):
+    return _compact(TradeSignal, "trade_signal", SIGNAL_COLUMNS, max_age_days,
+                    rollup=_rollup, archive=archive, now=now)
+
+
+def compact_executions(max_age_days=EXECUTION_RETENTION_DAYS, now=None):
+    if max_age_days is None:
+        return {"days": 0, "rows": 0, "summaries": 0, "files": [], "skipped": "EXECUTION_RETENTION_DAYS not set"}
+    return _compact(Execution, "execution", EXECUTION_COLUMNS, int(max_age_days), now=now)
+
+
+def run_retention():
+    """Entry point for the scheduler: compacts signals and (if configured) executions."""
+    with app.app_context():
+        try:
+            signals = compact_signals()
+            executions = compact_executions()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Retention run failed: {e}")
+            raise
+    print(f"🧹 Retention: signals {signals['rows']} rows over {signals['days']} day(s) "
+          f"-> {signals['summaries']} summaries; executions {executions['rows']} rows archived.")
+    return {"signals": signals, "executions": executions}
+
+
+if __name__ == "__main__":
+    run_retention()
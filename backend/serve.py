@@ -0,0 +1,33 @@
+# serve.py
+"""
+Production entry point: runs the ASGI app (asgi.py) under uvicorn.
+
+    WEB_HOST / WEB_PORT        bind address (default 0.0.0.0:5000)
+    WEB_WORKERS                worker processes (default 1; each has its own model, caches and quote hub)
+    WEB_MAX_CONNECTIONS        concurrent connections per worker before new ones get 503 (default 1000)
+    WEB_BACKLOG                pending TCP connections (default 2048)
+    WEB_KEEPALIVE              keep-alive timeout in seconds (default 5)
+
+Per-worker thread pools are sized with ASGI_ANALYZE_THREADS and ASGI_DB_THREADS (see asgi.py).
+"""
+import os
+
+import uvicorn
+
+
+def main():
+    uvicorn.run(
+        "asgi:application",
+        host=os.getenv("WEB_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEB_PORT", "5000")),
+        workers=int(os.getenv("WEB_WORKERS", "1")),
+        limit_concurrency=int(os.getenv("WEB_MAX_CONNECTIONS", "1000")),
+        backlog=int(os.getenv("WEB_BACKLOG", "2048")),
+        timeout_keep_alive=int(os.getenv("WEB_KEEPALIVE", "5")),
+        proxy_headers=True,
+        log_level=os.getenv("WEB_LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
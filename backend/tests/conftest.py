@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.fixtures import synthetic_tickers, write_fixtures
+
+# --- Offline Environment ---
+# The app modules read their configuration at import time, so every external
+# dependency is pointed at a local stand-in before any test imports them:
+# synthetic replayed histories, the fake LLM, simulated quotes and a scratch
+# SQLite database.
+WORKDIR = tempfile.mkdtemp(prefix="riskforecaster-tests-")
+TICKERS = synthetic_tickers(6)
+FIXTURES_DIR = write_fixtures(os.path.join(WORKDIR, 'fixtures'), TICKERS, bars=400)
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORKDIR, 'test.db')}",
+    "LLM_BACKEND": "fake",
+    "LLM_FAKE_DELAY": "0",
+    "PRICE_HISTORY_REPLAY_DIR": FIXTURES_DIR,
+    "PRICE_STORE_DIR": os.path.join(WORKDIR, 'store'),
+    "COVARIANCE_DIR": os.path.join(WORKDIR, 'covariance'),
+    "COVARIANCE_REFRESH": "off",
+    "QUOTE_FEED": "simulated",
+    "MC_WORKERS": "1",
+})
+
+UNUSABLE_PASSWORD_HASH = "!"
+
+
+@pytest.fixture
+def seed_users():
+    """Returns `seed(n_users, per_user=3)`: a fresh schema with users watching (and some holding) TICKERS."""
+    from app import app, db, User, Watchlist, Portfolio
+
+    def seed(n_users, per_user=3):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            users = [User(username=f"user{i}", password_hash=UNUSABLE_PASSWORD_HASH, auto_trade_allowed=(i % 2 == 0))
+                     for i in range(n_users)]
+            db.session.add_all(users)
+            db.session.flush()
+            rows = []
+            for i, user in enumerate(users):
+                watched = [TICKERS[(i + k) % len(TICKERS)] for k in range(per_user)]
+                rows += [Watchlist(ticker=t, user_id=user.id) for t in watched]
+                rows += [Portfolio(ticker=t, quantity=10, avg_buy_price=1000.0, user_id=user.id) for t in watched]
+            db.session.add_all(rows)
+            db.session.commit()
+            return [u.id for u in users]
+
+    return seed
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+starlette = pytest.importorskip("starlette")
+from starlette.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def client():
+    from asgi import application
+    with TestClient(application) as client:
+        yield client
+
+
+@pytest.mark.parametrize("body", [{}, {"ticker": ""}, {"ticker": 42}, {"ticker": ["TCS.NS"]}])
+def test_analyze_requires_a_ticker_string(client, body):
+    response = client.post('/api/analyze', json=body)
+    assert response.status_code == 400
+    assert response.json()["message"] == "ticker is required"
+
+
+@pytest.mark.parametrize("path", ['/api/analyze', '/api/forecast'])
+def test_invalid_json_is_a_bad_request(client, path):
+    response = client.post(path, content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+def _events(response, n):
+    events, event = [], {}
+    for line in response.iter_lines():
+        if line.startswith("event: "):
+            event["event"] = line[len("event: "):]
+        elif line.startswith("data: "):
+            event["data"] = json.loads(line[len("data: "):])
+        elif not line and event:
+            events.append(event)
+            event = {}
+            if len(events) == n:
+                break
+    return events
+
+
+def test_quote_stream_starts_with_a_formatted_snapshot(client):
+    # The stream never ends on its own (and TestClient buffers whole bodies), so read it directly
+    from starlette.requests import Request
+    from asgi import quote_stream
+
+    async def first_event():
+        request = Request({"type": "http", "method": "GET", "path": "/api/quotes/stream", "headers": []})
+        response = await quote_stream(request)
+        assert response.media_type == "text/event-stream"
+        chunk = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        return chunk
+
+    event, data = asyncio.run(first_event()).strip().split("\n")
+    assert event == "event: snapshot"
+    snapshot = json.loads(data[len("data: "):])
+    item = snapshot["items"]["^NSEI"]
+    assert item["name"] == "NIFTY 50" and item["value"] == f"{snapshot['quotes']['^NSEI']['price']:,.2f}"
+
+
+def test_job_stream_reports_until_done(client):
+    from utils.jobs import summary_jobs
+
+    job_id = summary_jobs.submit(lambda: "summary")
+    with client.stream("GET", f'/api/analyze/jobs/{job_id}/stream') as response:
+        statuses = [e["data"]["status"] for e in _events(response, 3) if e.get("event") == "status"]
+    assert statuses[-1] == "done"
+    assert client.get('/api/analyze/jobs/unknown/stream').status_code == 404
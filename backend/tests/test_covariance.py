@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from utils.covariance import CovarianceService
+
+HALFLIFE = 21
+TICKERS = ["AAA.NS", "BBB.NS", "CCC.NS", "DDD.NS"]
+
+
+def _returns(seed=11, sessions=300):
+    rng = np.random.default_rng(seed)
+    mix = rng.normal(size=(len(TICKERS), len(TICKERS)))
+    values = 0.01 * rng.standard_normal((sessions, len(TICKERS))) @ mix + 0.0005
+    return pd.DataFrame(values, index=pd.bdate_range("2023-01-02", periods=sessions), columns=TICKERS)
+
+
+def _service(tmp_path, returns, monkeypatch):
+    available = {"rows": len(returns)}
+
+    def fake_returns(self, tickers, period):
+        frame = returns[tickers].iloc[:available["rows"]]
+        return frame.iloc[-20:] if period == "1mo" else frame
+
+    monkeypatch.setattr(CovarianceService, "_returns", fake_returns)
+    service = CovarianceService(directory=str(tmp_path), halflife=HALFLIFE, refresh_enabled=True,
+                                universe=TICKERS)
+    return service, available
+
+
+def _expected(returns):
+    return returns.ewm(halflife=HALFLIFE, adjust=True).cov().loc[returns.index[-1]]
+
+
+def test_submatrix_matches_pandas_ewm_cov(tmp_path, monkeypatch):
+    returns = _returns()
+    service, _ = _service(tmp_path, returns, monkeypatch)
+    service.refresh()
+
+    cov, missing, _ = service.submatrix(TICKERS)
+    assert missing == []
+    np.testing.assert_allclose(cov.to_numpy(), _expected(returns).loc[TICKERS, TICKERS].to_numpy(), rtol=1e-10)
+
+
+def test_incremental_sessions_match_a_full_replay(tmp_path, monkeypatch):
+    returns = _returns(seed=5)
+    service, available = _service(tmp_path, returns, monkeypatch)
+    available["rows"] = len(returns) - 6
+    service.refresh()
+    for rows in range(len(returns) - 4, len(returns) + 1, 2):
+        available["rows"] = rows
+        assert service.refresh() == 2
+
+    subset = ["DDD.NS", "AAA.NS"]
+    cov, _, _ = service.submatrix(subset)
+    np.testing.assert_allclose(cov.to_numpy(), _expected(returns).loc[subset, subset].to_numpy(), rtol=1e-10)
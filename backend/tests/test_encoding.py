@@ -0,0 +1,20 @@
+import json
+from datetime import date
+
+import numpy as np
+
+from utils import encoding
+
+
+def test_stdlib_fallback_writes_the_same_valid_json_as_orjson(monkeypatch):
+    payload = {
+        "price": float("nan"), "change": np.float64("inf"), "count": np.int64(3),
+        "series": np.array([1.5, np.nan, -np.inf]), "rows": [{"v": float("-inf")}, (1.0, None)],
+        "asOf": date(2024, 3, 8), "byDay": {date(2024, 3, 8): np.nan},
+    }
+    fast = encoding.dumps(payload)
+    monkeypatch.setattr(encoding, "orjson", None)
+    fallback = encoding.dumps(payload)
+
+    assert json.loads(fallback) == json.loads(fast)
+    assert "NaN" not in fallback and "Infinity" not in fallback
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from utils.features import FEATURE_COLUMNS, LONG_WINDOW, RollingFeatureState, build_features, latest_features
+
+
+def _closes(seed, bars):
+    rng = np.random.default_rng(seed)
+    # Large price level with tiny moves: the case where running sums lose precision
+    return pd.Series(50_000 * np.exp(np.cumsum(0.01 * rng.standard_normal(bars))))
+
+
+def test_incremental_state_matches_build_features_over_long_series():
+    close = _closes(seed=7, bars=5000)
+    expected = build_features(close)[FEATURE_COLUMNS].to_numpy()
+
+    state = RollingFeatureState()
+    for i, value in enumerate(close):
+        row = state.update(value)
+        if row is None:
+            assert np.isnan(expected[i]).any()
+            continue
+        # Same update scheme as pandas' rolling var, so the values agree bit for bit
+        np.testing.assert_array_equal([row[c] for c in FEATURE_COLUMNS], expected[i])
+
+
+def test_seeded_state_matches_latest_features():
+    frames = {f"T{seed}": _closes(seed, 3000) for seed in range(5)}
+    closes = pd.DataFrame(frames)
+    expected = latest_features(closes)
+
+    for ticker, close in frames.items():
+        state = RollingFeatureState.from_closes(close.iloc[:-250])
+        for value in close.iloc[-250:]:
+            state.update(value)
+        np.testing.assert_allclose(state.as_row(), expected.loc[ticker].to_numpy(), rtol=1e-9)
+
+
+def test_revise_is_the_same_as_pushing_the_revised_close():
+    close = _closes(seed=3, bars=LONG_WINDOW * 4)
+    revised = RollingFeatureState.from_closes(close.iloc[:-1])
+    revised.update(close.iloc[-1] * 1.05)
+    revised.revise(close.iloc[-1])
+    direct = RollingFeatureState.from_closes(close.iloc[:-1])
+    direct.update(close.iloc[-1])
+    assert revised.as_row() == direct.as_row()
+
+
+def test_flat_window_has_zero_volatility():
+    state = RollingFeatureState.from_closes(np.full(LONG_WINDOW + 1, 123.45))
+    assert state.features()['vol_21d'] == 0.0
+    assert state.features()['vol_63d'] == 0.0
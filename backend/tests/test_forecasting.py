@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from tests.conftest import TICKERS
+from utils import forecasting
+from utils.compact_model import CompactForest, export_compact
+from utils.features import FEATURE_COLUMNS
+from utils.quantile_forest import forest_leaves, leaf_targets
+
+
+@pytest.fixture(scope="module")
+def trained():
+    """A small forest on a heteroscedastic target, so the quantiles depend on the inputs."""
+    rng = np.random.default_rng(3)
+    X = pd.DataFrame(rng.uniform(0.05, 0.6, size=(3000, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    y = X['vol_21d'] + X['vol_21d'] * rng.standard_normal(len(X)) * 0.5
+    pipeline = Pipeline([('scaler', StandardScaler()),
+                         ('regressor', RandomForestRegressor(n_estimators=20, max_depth=5, random_state=0))])
+    pipeline.fit(X, y)
+    scaled = pipeline.named_steps['scaler'].transform(X)
+    return pipeline, X, y.to_numpy(), leaf_targets(pipeline.named_steps['regressor'], scaled, y)
+
+
+def _exact_cdf(pipeline, X, y, row, value):
+    """Meinshausen's weighted empirical CDF at `value` for one feature row."""
+    forest = pipeline.named_steps['regressor']
+    scaler = pipeline.named_steps['scaler']
+    train = forest_leaves(forest, scaler.transform(X))
+    query = forest_leaves(forest, scaler.transform(row))[0]
+    same = train == query
+    weights = (same / same.sum(axis=0)).mean(axis=1)
+    return weights[y <= value].sum()
+
+
+def test_compact_export_walks_to_the_same_leaves(trained, tmp_path):
+    pipeline, X, _, targets = trained
+    export_compact(pipeline, str(tmp_path), targets)
+    compact = CompactForest(str(tmp_path))
+
+    predictions, leaves = forecasting.tree_leaves(pipeline, X.iloc[:200])
+    compact_predictions, compact_leaves = forecasting.tree_leaves(compact, X.iloc[:200])
+    np.testing.assert_array_equal(leaves, compact_leaves)
+    np.testing.assert_allclose(predictions.mean(axis=1), pipeline.predict(X.iloc[:200]), rtol=1e-12)
+    np.testing.assert_array_equal(compact.leaf_targets, targets)
+
+
+def test_forecast_quantiles_follow_the_leaf_weighted_distribution(trained, monkeypatch):
+    pipeline, X, y, targets = trained
+    monkeypatch.setattr(forecasting, "_load_horizon_model",
+                        lambda horizon: forecasting.HorizonModel(pipeline, targets) if horizon == 5 else None)
+    monkeypatch.setattr(forecasting, "latest_features",
+                        lambda closes: X.iloc[[0, 1, 2]].set_axis(closes.columns[:3]))
+    levels = [0.05, 0.25, 0.5, 0.75, 0.95]
+    result = forecasting.Forecaster().forecast(TICKERS[:3], quantiles=levels)
+
+    for i, ticker in enumerate(TICKERS[:3]):
+        served = result[ticker]["horizons"]["5"]["quantiles"]
+        values = [served[str(q)] for q in levels]
+        assert values == sorted(values)
+        for q, value in zip(levels, values):
+            assert abs(_exact_cdf(pipeline, X, y, X.iloc[[i]], value) - q) < 0.03
+
+
+def test_models_without_leaf_targets_serve_no_quantiles(trained, monkeypatch):
+    pipeline = trained[0]
+    monkeypatch.setattr(forecasting, "_load_horizon_model",
+                        lambda horizon: forecasting.HorizonModel(pipeline, None) if horizon == 5 else None)
+    result = forecasting.Forecaster().forecast(TICKERS[:1])
+
+    assert list(result[TICKERS[0]]["horizons"]) == ["5"]
+    assert result[TICKERS[0]]["horizons"]["5"]["quantiles"] is None
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pool_workers_do_not_import_the_main_script(tmp_path):
+    log = tmp_path / "imports.log"
+    script = tmp_path / "server.py"
+    # Stands in for `python app.py`: a script with import-time side effects that uses the pool
+    script.write_text(textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {BACKEND_DIR!r})
+        with open({str(log)!r}, "a") as f:
+            f.write(__name__ + "\\n")
+        import numpy as np
+        from utils import monte_carlo
+
+        if __name__ == "__main__":
+            args = (np.array([1e5, 2e5]), np.zeros(2), np.array([[1e-4, 2e-5], [2e-5, 2e-4]]))
+            pooled = monte_carlo.simulate_var(*args, n_paths=40_000, workers=2, seed=1, tol=0)
+            inline = monte_carlo.simulate_var(*args, n_paths=40_000, workers=1, seed=1, tol=0)
+            assert pooled["var"] == inline["var"], (pooled, inline)
+    """))
+    env = {**os.environ, "MC_WORKERS": "2", "MC_CHUNK_ELEMENTS": "20000"}
+    subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env, check=True, timeout=120)
+
+    assert log.read_text().split() == ["__main__"]
@@ -0,0 +1,55 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from utils.price_history import store_is_current
+from utils.price_store import PriceStore, StoreFetcher
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+def _bars(days, closes):
+    index = pd.DatetimeIndex(pd.to_datetime(days)).tz_localize(IST)
+    closes = np.asarray(closes, dtype=float)
+    return pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes,
+                         "Volume": np.full(len(closes), 1000.0)}, index=index)
+
+
+def test_overlapping_write_with_a_gap_keeps_the_stored_bars(tmp_path):
+    store = PriceStore(str(tmp_path))
+    days = pd.bdate_range("2024-03-01", periods=6)
+    store.write("AAA.NS", "1d", _bars(days, [10, 11, 12, 13, 14, 15]))
+
+    # Upstream skips the 3rd session and revises the last one
+    assert store.write("AAA.NS", "1d", _bars(days[[1, 3, 4, 5]].append(pd.DatetimeIndex(["2024-03-11"])),
+                                             [11, 13, 14, 15.5, 16]))
+
+    frame = store.read("AAA.NS", "1d")
+    assert list(frame.index.date) == list(days.date) + [datetime(2024, 3, 11).date()]
+    assert frame["Close"].tolist() == [10, 11, 12, 13, 14, 15.5, 16]
+
+
+def test_fetcher_skips_upstream_once_the_latest_session_is_stored(tmp_path):
+    store = PriceStore(str(tmp_path))
+    days = pd.bdate_range("2024-03-04", periods=5)   # Mon-Fri
+    store.write("AAA.NS", "1d", _bars(days, [10, 11, 12, 13, 14]))
+    calls = []
+
+    def upstream(tickers, period, interval, start=None):
+        calls.append(list(tickers))
+        return {}
+
+    saturday = datetime(2024, 3, 9, 12, 0, tzinfo=IST)
+    friday_open = datetime(2024, 3, 8, 11, 0, tzinfo=IST)
+    fetcher = StoreFetcher(store, upstream, is_current=lambda t, i, ts: store_is_current(t, i, ts, now=now))
+
+    now = saturday
+    assert len(fetcher(["AAA.NS"], "max", "1d")["AAA.NS"]) == 5
+    assert calls == []
+
+    now = friday_open
+    fetcher(["AAA.NS", "BBB.NS"], "max", "1d")
+    # The open session needs an incremental pull; the unknown ticker a backfill
+    assert calls == [["AAA.NS"], ["BBB.NS"]]
@@ -0,0 +1,77 @@
+import functools
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from utils.query_counter import QueryCounter, assert_max_queries
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+def _queries(fn):
+    from app import app, db
+    with app.app_context():
+        with QueryCounter(db.engine) as counter:
+            fn()
+    return counter.count
+
+
+def _get(client, path, user_id):
+    from app import app
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+    response = client.get(path, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.get_json()
+    return response
+
+
+@pytest.mark.parametrize("per_user", [1, 6])
+def test_watchlist_is_one_query(client, seed_users, per_user):
+    from app import app, db
+    user_id = seed_users(3, per_user=per_user)[0]
+    with app.app_context(), assert_max_queries(db.engine, 1):
+        response = _get(client, '/api/watchlist', user_id)
+    assert len(response.get_json()["tickers"]) == per_user
+
+
+def test_portfolio_queries_do_not_grow_with_holdings(client, seed_users):
+    counts = []
+    for per_user in (1, 6):
+        user_id = seed_users(3, per_user=per_user)[0]
+        counts.append(_queries(lambda: _get(client, '/api/portfolio/correlation', user_id)))
+    assert counts[0] == counts[1] <= 2
+
+
+def test_bot_queries_do_not_grow_with_users(seed_users, monkeypatch):
+    import bot
+
+    # Every ticker gets a SELL, so auto-trade users execute and the rest log signals
+    monkeypatch.setattr(bot, "get_ai_recommendation", lambda goal, tickers: "Sell")
+    counts, reports = [], []
+    for n_users in (2, 8):
+        seed_users(n_users)
+        counts.append(_queries(lambda: reports.append(bot._run_bot())))
+    assert all(r["signals"] and r["executions"] for r in reports)
+    # Users, watchlists and portfolios load in three queries; writes are one batch here
+    assert counts[0] == counts[1]
+
+
+def test_bot_write_batches_do_not_reload_users(seed_users, monkeypatch):
+    import bot
+    from utils.unit_of_work import BulkWriter
+
+    # Commits between batches expire ORM objects; the bot must not touch them afterwards
+    monkeypatch.setattr(bot, "get_ai_recommendation", lambda goal, tickers: "Sell")
+    monkeypatch.setattr(bot, "BulkWriter", functools.partial(BulkWriter, batch_size=2))
+    seed_users(8)
+    from app import app, db
+    with app.app_context(), QueryCounter(db.engine) as counter:
+        report = bot._run_bot()
+    assert report["writes"]["batches"] > 1
+    selects = [s for s in counter.statements if s.lstrip().upper().startswith("SELECT")]
+    # Users, watchlists and portfolios; nothing is lazily re-loaded between batches
+    assert len(selects) == 3, selects
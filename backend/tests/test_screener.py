@@ -0,0 +1,17 @@
+from tests.conftest import TICKERS
+from utils.price_history import get_cache, get_histories
+from utils.screener import Screener
+
+
+def test_refresh_leaves_the_shared_price_cache_alone(tmp_path):
+    cache = get_cache()
+    get_histories(TICKERS[:2])
+    before = cache.stats()
+
+    universe = TICKERS[1:]
+    screener = Screener(universe, benchmark=TICKERS[0], path=str(tmp_path / "metrics.npz"), chunk_size=3)
+    report = screener.refresh()
+
+    assert report["refreshed"] == len(universe)
+    assert cache.stats() == before
+    assert sorted(screener.table.tickers) == sorted(universe)
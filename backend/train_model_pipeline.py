@@ -1,67 +1,203 @@
-import yfinance as yf
-import pandas as pd
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
 import numpy as np
+import pandas as pd
 import joblib
-import os
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import TimeSeriesSplit, GridSearchCV
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 
+from utils.compact_model import export_compact
+from utils.quantile_forest import leaf_targets, leaf_targets_path
+from utils.features import FEATURE_COLUMNS, build_features
+from utils.price_history import YFinanceFetcher
+from utils.price_store import get_store
+
 # --- Configuration ---
-TICKER = "SPY"
+TICKERS = ["SPY"]
 TRAINING_PERIOD = "15y"
+TARGET_HORIZON = 5
+# Horizons served by /api/forecast; TARGET_HORIZON's model is the main one, the
+# others are saved as volatility_model_h<N>.pkl (see utils/forecasting.py)
+FORECAST_HORIZONS = [1, 5, 21]
 N_SPLITS = 5
 # This relative path saves the model in the 'models' subfolder, relative to this script's location.
-MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'volatility_model_pipeline.pkl')
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
+MODEL_PATH = os.path.join(MODEL_DIR, 'volatility_model_pipeline.pkl')
+COMPACT_MODEL_DIR = os.path.join(MODEL_DIR, 'volatility_model_compact')
+PARAM_GRID = {'regressor__n_estimators': [50, 100], 'regressor__max_depth': [5, 10]}
+
+
+def load_histories(tickers, period=TRAINING_PERIOD, refresh=False, fetcher=None):
+    """
+    Reads each ticker's daily history from the local price store, first
+    pulling only the bars newer than what is stored (one bulk request).
+    `refresh` drops the stored bars and backfills from scratch. `fetcher`
+    replaces Yahoo Finance as the upstream (e.g. a ReplayFetcher).
+    """
+    store = get_store()
+    if refresh:
+        for ticker in tickers:
+            store.delete(ticker, "1d")
+    started = time.perf_counter()
+    try:
+        store.update_many(tickers, "1d", fetcher or YFinanceFetcher())
+    except Exception as e:
+        print(f"⚠️ Could not update the price store, training on stored bars: {e}")
+    print(f"✅ Price store up to date in {time.perf_counter() - started:.1f}s.")
+
+    histories = {}
+    for ticker in tickers:
+        frame = store.read(ticker, "1d", period=period)
+        if frame.empty:
+            print(f"⚠️ No data for {ticker}, skipping.")
+            continue
+        histories[ticker] = frame
+    print(f"✅ Loaded {len(histories)} histories from the price store.")
+    return histories
+
+
+def build_panel(histories, horizon=TARGET_HORIZON):
+    """Stacks per-ticker features and targets into one panel ordered by date, so time-series CV stays causal."""
+    frames = []
+    for ticker, hist in histories.items():
+        data = build_features(hist['Close'])
+        data['target_volatility'] = data['vol_21d'].shift(-horizon)
+        data['ticker'] = ticker
+        data = data.dropna(subset=FEATURE_COLUMNS + ['target_volatility'])
+        if getattr(data.index, 'tz', None) is not None:
+            data.index = data.index.tz_localize(None)
+        frames.append(data)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames).sort_index(kind='stable')
+
+
+def date_splits(dates, n_splits=N_SPLITS):
+    """
+    Time-series CV folds over a panel's unique dates rather than its rows, so
+    every ticker's bar for one session lands on the same side of a split.
+    Returns (train, test) row-position arrays for GridSearchCV's `cv`.
+    """
+    codes, unique_dates = pd.factorize(dates, sort=True)
+    # Both sides are contiguous runs of sorted dates, so a range check on the codes selects them
+    return [
+        ((codes <= train[-1]).nonzero()[0], ((codes >= test[0]) & (codes <= test[-1])).nonzero()[0])
+        for train, test in TimeSeriesSplit(n_splits=n_splits).split(unique_dates)
+    ]
 
-def train_pipeline():
+
+def model_basename(horizon):
+    """File stem for a horizon's model: the main pipeline for TARGET_HORIZON, volatility_model_h<N> otherwise."""
+    if horizon == TARGET_HORIZON:
+        return os.path.splitext(os.path.basename(MODEL_PATH))[0]
+    return f"volatility_model_h{horizon}"
+
+
+def train_pipeline(tickers=None, period=TRAINING_PERIOD, refresh=False, n_jobs=-1, compact=False,
+                   fetcher=None, model_dir=MODEL_DIR, horizon=TARGET_HORIZON):
     """A complete pipeline to create and save the AI model."""
-    print("🚀 Starting model training pipeline...")
+    print(f"🚀 Starting model training pipeline ({horizon}-day horizon)...")
+    tickers = tickers or TICKERS
     try:
-        data = yf.Ticker(TICKER).history(period=TRAINING_PERIOD)
+        started = time.perf_counter()
+        histories = load_histories(tickers, period=period, refresh=refresh, fetcher=fetcher)
+        data = build_panel(histories, horizon)
+        load_seconds = time.perf_counter() - started
+
         if data.empty:
-            print(f"❌ Error: No data for {TICKER}."); return
-        print(f"✅ Downloaded {len(data)} data points.")
-        
-        data['returns'] = data['Close'].pct_change()
-        data['vol_21d'] = data['returns'].rolling(window=21).std() * np.sqrt(252)
-        data['vol_63d'] = data['returns'].rolling(window=63).std() * np.sqrt(252)
-        data['momentum_1m'] = data['Close'].pct_change(periods=21)
-        data['momentum_3m'] = data['Close'].pct_change(periods=63)
-        data['target_volatility'] = data['vol_21d'].shift(-5)
-        data.dropna(inplace=True)
-        
-        features_list = ['vol_21d', 'vol_63d', 'momentum_1m', 'momentum_3m']
-        X = data[features_list]
-        y = data['target_volatility']
-        
-        if X.empty:
             print("❌ Error: Not enough data for training."); return
-        print("✅ Feature engineering complete.")
+        X = data[FEATURE_COLUMNS]
+        y = data['target_volatility']
+        print(f"✅ Feature engineering complete: {len(X)} rows across {data['ticker'].nunique()} ticker(s).")
 
-        tscv = TimeSeriesSplit(n_splits=N_SPLITS)
+        folds = date_splits(data.index)
         pipeline = Pipeline([
             ('scaler', StandardScaler()),
-            ('regressor', RandomForestRegressor(random_state=42)) 
+            ('regressor', RandomForestRegressor(random_state=42))
         ])
-        param_grid = {'regressor__n_estimators': [50, 100], 'regressor__max_depth': [5, 10]}
-        
+
+        # Parallelism lives in the search (one candidate/fold per core); refit=True
+        # already fits best_estimator_ on the full data, so no second fit is needed.
         print("⏳ Performing GridSearchCV...")
-        grid_search = GridSearchCV(pipeline, param_grid, cv=tscv, scoring='r2') 
+        grid_search = GridSearchCV(pipeline, PARAM_GRID, cv=folds, scoring='r2', n_jobs=n_jobs, refit=True)
+        fit_started = time.perf_counter()
         grid_search.fit(X, y)
-        
+        fit_seconds = time.perf_counter() - fit_started
         final_model_pipeline = grid_search.best_estimator_
-        final_model_pipeline.fit(X, y)
         print("✅ Final model trained.")
-        
-        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        joblib.dump(final_model_pipeline, MODEL_PATH)
-        print(f"✅ Model saved successfully to '{MODEL_PATH}'")
+        # Each leaf's training targets turn the forest into a quantile regression forest
+        targets = leaf_targets(final_model_pipeline.named_steps['regressor'],
+                               final_model_pipeline.named_steps['scaler'].transform(X), y)
+
+        version = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        name = model_basename(horizon)
+        model_path = os.path.join(model_dir, f'{name}.pkl')
+        compact_dir = os.path.join(
+            model_dir, os.path.basename(COMPACT_MODEL_DIR) if horizon == TARGET_HORIZON else f'{name}_compact'
+        )
+        versioned_path = os.path.join(model_dir, f'{name}_{version}.pkl')
+        os.makedirs(model_dir, exist_ok=True)
+        joblib.dump(final_model_pipeline, versioned_path)
+        np.save(leaf_targets_path(versioned_path), targets)
+        shutil.copyfile(versioned_path, model_path)
+        shutil.copyfile(leaf_targets_path(versioned_path), leaf_targets_path(model_path))
+        if compact:
+            export_compact(final_model_pipeline, compact_dir, targets)
+            print(f"✅ Compact inference arrays exported to '{compact_dir}'")
+
+        metrics = {
+            "version": version,
+            "tickers": sorted(data['ticker'].unique().tolist()),
+            "period": period,
+            "rows": int(len(X)),
+            "features": FEATURE_COLUMNS,
+            "targetHorizonDays": horizon,
+            "bestParams": grid_search.best_params_,
+            "cvR2": round(float(grid_search.best_score_), 4),
+            "cvR2Std": round(float(grid_search.cv_results_['std_test_score'][grid_search.best_index_]), 4),
+            "dataLoadSeconds": round(load_seconds, 2),
+            "cvSeconds": round(fit_seconds - grid_search.refit_time_, 2),
+            "trainSeconds": round(grid_search.refit_time_, 2),
+        }
+        metrics_path = os.path.join(model_dir, f'{name}_{version}.metrics.json')
+        with open(metrics_path, 'w') as f:
+            json.dump(metrics, f, indent=2)
+
+        print(f"✅ Model saved successfully to '{versioned_path}' (active copy: '{model_path}')")
+        print(f"📊 Metrics: {metrics}")
+        return metrics
 
     except Exception as e:
         print(f"An error occurred: {e}")
 
-if __name__ == '__main__':
-    train_pipeline()
 
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Train the volatility model on a multi-ticker panel.")
+    parser.add_argument('--tickers', nargs='+', help="Tickers to train on (default: SPY).")
+    parser.add_argument('--tickers-file', help="File with one ticker per line, e.g. the NSE universe.")
+    parser.add_argument('--period', default=TRAINING_PERIOD, help="History period per ticker (default: 15y).")
+    parser.add_argument('--refresh', action='store_true', help="Drop stored bars and re-download full history.")
+    parser.add_argument('--compact', action='store_true', help="Also export the memory-mapped inference arrays.")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Parallel search workers (default: all cores).")
+    parser.add_argument('--horizons', type=int, nargs='+', default=[TARGET_HORIZON],
+                        help=f"Forecast horizons in days, one model each (e.g. {' '.join(map(str, FORECAST_HORIZONS))}).")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    tickers = list(args.tickers or [])
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    for i, horizon in enumerate(args.horizons):
+        # Only the first run refreshes the store; the others read the same bars
+        train_pipeline(tickers=tickers or None, period=args.period, refresh=args.refresh and i == 0,
+                       n_jobs=args.n_jobs, compact=args.compact, horizon=horizon)
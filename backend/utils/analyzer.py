@@ -1,45 +1,87 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import joblib
 import os
-import google.generativeai as genai
-from datetime import datetime
-
-# --- Load Models and Configure API ---
+import threading
+
+from utils.chart_series import chart_series, longer_period, period_slice
+from utils.compact_model import CompactForest
+from utils.features import latest_features
+from utils.metrics import timed, upstream_errors
+from utils.llm_gateway import FakeBackend, GeminiBackend, LLMGateway, recommendation_key, summary_key
+from utils.price_history import get_histories
+
+# --- Models and API Clients (loaded lazily) ---
+# Nothing heavy happens at import time: the model is loaded, and the Gemini
+# client configured, the first time something actually needs them.
 # This robust, relative path finds the model file by going up one directory from `utils`
 # and then into the `models` folder. This is the most reliable way to do it.
-MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'volatility_model_pipeline.pkl')
-
-pipeline = None
-gemini_model = None
-
-# Try to load the AI volatility model
-try:
-    pipeline = joblib.load(MODEL_PATH)
-    print("✅ AI volatility model loaded successfully.")
-except FileNotFoundError:
-    print(f"❌ FATAL ERROR: Model file not found at {MODEL_PATH}. Please run 'python train_model_pipeline.py' to create it.")
-except Exception as e:
-    print(f"❌ FATAL ERROR: Could not load model file. It might be corrupted. Error: {e}")
-
-# Try to initialize the Gemini API
-try:
-    # This automatically finds the GOOGLE_API_KEY you set in your terminal
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    # Use the current, valid model name
-    gemini_model = genai.GenerativeModel('models/gemini-2.0-flash')
-    print("✅ Gemini model initialized successfully.")
-except Exception as e:
-    print(f"⚠️ Gemini API could not be configured. Check if your GOOGLE_API_KEY is set correctly. Error: {e}")
+MODEL_PATH = os.getenv(
+    "MODEL_PATH", os.path.join(os.path.dirname(__file__), '..', 'models', 'volatility_model_pipeline.pkl')
+)
+# MODEL_FORMAT=compact serves the memory-mapped export from `python -m utils.compact_model`,
+# so every worker process shares one copy of the forest.
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "pickle")
+COMPACT_MODEL_DIR = os.getenv(
+    "COMPACT_MODEL_DIR", os.path.join(os.path.dirname(__file__), '..', 'models', 'volatility_model_compact')
+)
+
+_pipeline = None
+_pipeline_loaded = False
+_pipeline_lock = threading.Lock()
+
+
+def _load_pipeline():
+    path = COMPACT_MODEL_DIR if MODEL_FORMAT == "compact" else MODEL_PATH
+    try:
+        model = CompactForest(path) if MODEL_FORMAT == "compact" else joblib.load(path)
+        print(f"✅ AI volatility model loaded successfully ({MODEL_FORMAT}).")
+        return model
+    except FileNotFoundError:
+        print(f"❌ FATAL ERROR: Model file not found at {path}. Please run 'python train_model_pipeline.py' to create it.")
+    except Exception as e:
+        print(f"❌ FATAL ERROR: Could not load model file. It might be corrupted. Error: {e}")
+    return None
+
+
+def get_pipeline():
+    """The volatility model, loaded once on first use (thread-safe). None if it failed to load."""
+    global _pipeline, _pipeline_loaded
+    if not _pipeline_loaded:
+        with _pipeline_lock:
+            if not _pipeline_loaded:
+                _pipeline = _load_pipeline()
+                _pipeline_loaded = True
+    return _pipeline
+
+
+# All LLM traffic goes through one gateway (concurrency limit, de-duplication, caching).
+# Set LLM_BACKEND=fake to run without Gemini, e.g. in tests or offline; LLM_FAKE_DELAY
+# (seconds) gives the fake backend a realistic response time for benchmarks.
+llm = LLMGateway(
+    FakeBackend(delay=float(os.getenv("LLM_FAKE_DELAY", "0"))) if os.getenv("LLM_BACKEND") == "fake"
+    else GeminiBackend('models/gemini-2.0-flash')
+)
+
+
+def readiness():
+    """Loads the model if needed and reports what this process can serve."""
+    return {"model": get_pipeline() is not None, "modelFormat": MODEL_FORMAT, "llm": llm.available}
+
+SUMMARY_FALLBACK = "AI summary could not be generated."
 
 
 def get_gemini_summary(data):
     """
     Generates a qualitative risk summary for a single stock (used in the watchlist).
     """
-    if not gemini_model:
+    if not llm.available:
         return "AI summary is currently unavailable."
+    return llm.generate(*_summary_request(data), fallback=SUMMARY_FALLBACK)
+
+
+def _summary_request(data):
+    """(cache key, prompt) for a stock's risk summary."""
     prompt = f"""
     You are a professional financial risk analyst. Based on the following data for {data['ticker']}, 
     provide a brief, 2-sentence summary of the stock's near-term risk profile.
@@ -47,146 +89,144 @@ def get_gemini_summary(data):
     - AI-Predicted Volatility (next 5 days): {data['predictedVolatility']:.1%}
     Do not give financial advice.
     """
-    try:
-        response = gemini_model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"❌ Error in get_gemini_summary: {e}")
-        return "AI summary could not be generated."
+    return summary_key(data['ticker'], data['lastClosePrice'], data['predictedVolatility']), prompt
 
-def analyze_stock(ticker_symbol):
+
+def aligned_closes(histories, tickers):
     """
-    Performs a full analysis on a single stock, including a Gemini summary.
+    Stacks each ticker's closes into one (bars x tickers) frame aligned on the
+    latest bar. Aligning by position rather than by date keeps every rolling
+    window identical to the single-ticker calculation even when tickers trade
+    on different exchange calendars.
     """
+    columns = [histories[t]['Close'].to_numpy(dtype=float) for t in tickers]
+    length = max(len(c) for c in columns)
+    matrix = np.full((length, len(columns)), np.nan)
+    for j, values in enumerate(columns):
+        matrix[length - len(values):, j] = values
+    return pd.DataFrame(matrix, columns=tickers)
+
+
+def analyze_stocks(tickers, include_summary=False, period="1y", points=None, chart_format="labels"):
+    """
+    Analyzes many stocks at once: one bulk history fetch, wide feature
+    computation across all tickers and a single model prediction.
+    Risk numbers always use the last year; `period`, `points` and
+    `chart_format` only shape `chartData` (see utils/chart_series.py).
+    Returns {ticker: analysis}; failed tickers map to an {"error": ...} dict.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    pipeline = get_pipeline()
     if not pipeline:
-        return {"error": "The AI volatility model is not loaded. Cannot perform analysis."}
-        
+        return {t: {"error": "The AI volatility model is not loaded. Cannot perform analysis."} for t in tickers}
+    if not tickers:
+        return {}
+
     try:
-        stock = yf.Ticker(ticker_symbol)
-        hist_data = stock.history(period="1y")
-        if hist_data.empty:
-            return {"error": "Invalid ticker or no data available."}
-
-        daily_returns = hist_data['Close'].pct_change()
-        historical_volatility = daily_returns.std() * np.sqrt(252)
-        sharpe_ratio = (daily_returns.mean() * 252) / historical_volatility
-
-        # Re-create the exact same features the model was trained on
-        features = pd.DataFrame(index=hist_data.index)
-        features['returns'] = daily_returns
-        features['vol_21d'] = features['returns'].rolling(window=21).std() * np.sqrt(252)
-        features['vol_63d'] = features['returns'].rolling(window=63).std() * np.sqrt(252)
-        features['momentum_1m'] = hist_data['Close'].pct_change(periods=21)
-        features['momentum_3m'] = hist_data['Close'].pct_change(periods=63)
-        
-        latest_features = features.iloc[-1:][['vol_21d', 'vol_63d', 'momentum_1m', 'momentum_3m']]
-        
-        if latest_features.isnull().values.any():
-            return {"error": "Not enough historical data to generate features for prediction."}
-
-        predicted_volatility = pipeline.predict(latest_features)[0]
+        # One fetch covers both the chart period and the year the risk numbers use
+        fetch_period = longer_period(period, "1y")
+        with timed("fetch"):
+            chart_histories = get_histories(tickers, period=fetch_period)
+    except Exception as e:
+        upstream_errors.inc(source="prices")
+        return {t: {"error": f"An unexpected error occurred during analysis: {str(e)}"} for t in tickers}
+
+    histories = chart_histories if fetch_period == "1y" else {
+        t: period_slice(h, "1y") for t, h in chart_histories.items() if h is not None
+    }
+    results = {}
+    valid = []
+    for t in tickers:
+        hist = histories.get(t)
+        if hist is None or hist.empty:
+            results[t] = {"error": "Invalid ticker or no data available."}
+        else:
+            valid.append(t)
+    if not valid:
+        return results
+
+    try:
+        with timed("features"):
+            closes = aligned_closes(histories, valid)
+            daily_returns = closes.pct_change(fill_method=None)
+            historical_volatility = daily_returns.std() * np.sqrt(252)
+            sharpe_ratio = (daily_returns.mean() * 252) / historical_volatility
+
+            # Re-create the exact same features the model was trained on, one row per ticker
+            features = latest_features(closes)
+
+        ready = features.notnull().all(axis=1)
+        for t in features.index[~ready]:
+            results[t] = {"error": "Not enough historical data to generate features for prediction."}
+
+        ready_features = features[ready]
+        with timed("predict"):
+            predictions = pipeline.predict(ready_features) if len(ready_features) else []
+    except Exception as e:
+        for t in valid:
+            results[t] = {"error": f"An unexpected error occurred during analysis: {str(e)}"}
+        return results
 
+    analyses = []
+    for t, predicted_volatility in zip(ready_features.index, predictions):
+        hist_data = histories[t]
         analysis_data = {
-            "ticker": ticker_symbol, "lastClosePrice": round(hist_data['Close'][-1], 2),
-            "historicalVolatility": historical_volatility, "sharpeRatio": sharpe_ratio,
-            "predictedVolatility": predicted_volatility,
-            "chartData": {
-                "labels": [d.strftime('%Y-%m-%d') for d in hist_data.index],
-                "prices": [round(p, 2) for p in hist_data['Close'].tolist()]
-            }
+            "ticker": t, "lastClosePrice": round(float(hist_data['Close'].iloc[-1]), 2),
+            "historicalVolatility": float(historical_volatility[t]), "sharpeRatio": float(sharpe_ratio[t]),
+            "predictedVolatility": float(predicted_volatility),
+            "chartData": chart_series(
+                (chart_histories[t] if period == fetch_period else period_slice(chart_histories[t], period))['Close'],
+                points=points, fmt=chart_format
+            ),
         }
-        
-        ai_summary = get_gemini_summary(analysis_data)
-        analysis_data['aiSummary'] = ai_summary
-        
+        analyses.append(analysis_data)
+
+    if include_summary:
+        # All summaries run concurrently through the gateway instead of one blocking call per ticker
+        if llm.available:
+            with timed("llm"):
+                summaries = llm.generate_many([_summary_request(a) for a in analyses], fallback=SUMMARY_FALLBACK)
+        else:
+            summaries = ["AI summary is currently unavailable."] * len(analyses)
+        for analysis_data, summary in zip(analyses, summaries):
+            analysis_data['aiSummary'] = summary
+
+    for analysis_data in analyses:
         analysis_data['historicalVolatility'] = round(analysis_data['historicalVolatility'], 3)
         analysis_data['sharpeRatio'] = round(analysis_data['sharpeRatio'], 2)
         analysis_data['predictedVolatility'] = round(analysis_data['predictedVolatility'], 3)
+        results[analysis_data['ticker']] = analysis_data
 
-        return analysis_data
-    except Exception as e:
-        return {"error": f"An unexpected error occurred during analysis: {str(e)}"}
+    return {t: results[t] for t in tickers}
 
-def get_ai_recommendation(user_query, watchlist_tickers):
+
+def analyze_stock(ticker_symbol, **chart_options):
     """
-    Generates a detailed financial recommendation for the AI Advisor.
+    Performs a full analysis on a single stock, including a Gemini summary.
     """
-    if not gemini_model:
-        return "The AI Advisor is currently unavailable."
+    return analyze_stocks([ticker_symbol], include_summary=True, **chart_options)[ticker_symbol]
+
+ADVISOR_UNAVAILABLE = "The AI Advisor is currently unavailable."
+RECOMMENDATION_FALLBACK = "AI model unavailable: the recommendation could not be generated in time."
+
+
+def recommendation_request(user_query, watchlist_tickers):
+    """(cache key, prompt) for an AI Advisor recommendation."""
     prompt = f"""
     You are tradeAI, a sophisticated and cautious financial AI advisor based in Bengaluru, India.
     A user's watchlist includes: {', '.join(watchlist_tickers) if watchlist_tickers else 'None'}.
     Their question is: "{user_query}".
     Provide a comprehensive, markdown-formatted recommendation with analysis, market context, 2-3 actionable suggestions (buy/sell/hold), and a disclaimer.
     """
-    try:
-        response = gemini_model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"❌ Error calling Gemini API for recommendation: {e}")
-    return f"AI model unavailable: {str(e)}"
-
-
-def get_all_nse_tickers_data():
-    # You can load from yfinance ticker list or maintain your own CSV if you prefer.
-    # For demonstration, let's use a sample of top NSE tickers.
-    nse_tickers = [
-        "RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS", "ICICIBANK.NS", "SBIN.NS",
-        "BHARTIARTL.NS", "HINDUNILVR.NS", "ITC.NS", "LT.NS", "ASIANPAINT.NS", "BAJFINANCE.NS",
-        "AXISBANK.NS", "HCLTECH.NS", "WIPRO.NS", "KOTAKBANK.NS", "MARUTI.NS", "SUNPHARMA.NS",
-        "TITAN.NS", "ULTRACEMCO.NS", "TECHM.NS", "ONGC.NS", "POWERGRID.NS", "TATASTEEL.NS",
-        "JSWSTEEL.NS", "ADANIENT.NS", "ADANIPORTS.NS", "COALINDIA.NS", "BPCL.NS", "NTPC.NS"
-    ]
-
-    data = []
-    tickers = yf.download(nse_tickers, period="1d", group_by="ticker", threads=True)
-
-    for symbol in sorted(nse_tickers):
-        try:
-            hist = tickers[symbol]
-            if not hist.empty:
-                last_price = round(hist["Close"].iloc[-1], 2)
-                prev_price = round(hist["Open"].iloc[0], 2)
-                change = last_price - prev_price
-                percent_change = round((change / prev_price) * 100, 2)
-                data.append({
-                    "name": symbol.replace(".NS", ""),
-                    "value": f"{last_price:,}",
-                    "change": f"{percent_change:+.2f}%",
-                    "isNegative": percent_change < 0
-                })
-        except Exception:
-            continue
-
-    return sorted(data, key=lambda x: x["name"])
-# utils/analyzer.py
-
-import yfinance as yf
-
-def get_batch_ticker_data(ticker_list):
-    results = []
-
-    for ticker in ticker_list:
-        try:
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period="2d")
-            if hist.empty or len(hist) < 2:
-                print(f"No data for {ticker}")
-                continue
-
-            latest_price = round(hist['Close'].iloc[-1], 2)
-            previous_price = round(hist['Close'].iloc[-2], 2)
-            change = latest_price - previous_price
-            change_percent = round((change / previous_price) * 100, 2)
-
-            results.append({
-                "name": ticker,
-                "value": f"{latest_price:,.2f}",
-                "change": f"{change_percent:+.2f}%",
-                "isNegative": bool(change < 0)  # ✅ convert to Python bool
-            })
-
-        except Exception as e:
-            print(f"Error fetching {ticker}: {e}")
-
-    return results
+    return recommendation_key(user_query, watchlist_tickers), prompt
+
+
+def get_ai_recommendation(user_query, watchlist_tickers):
+    """
+    Generates a detailed financial recommendation for the AI Advisor.
+    """
+    if not llm.available:
+        return ADVISOR_UNAVAILABLE
+    with timed("llm"):
+        return llm.generate(*recommendation_request(user_query, watchlist_tickers), fallback=RECOMMENDATION_FALLBACK)
+
@@ -0,0 +1,251 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.features import FEATURE_COLUMNS, panel_features
+from utils.price_store import get_store
+
+# --- Configuration ---
+# Vectorized backtests of the volatility model and the bot's signal rule over
+# (dates x tickers) arrays from the price store. Run from backend/:
+#   python -m utils.backtest --tickers-file universe.txt --period 10y --sell-above 0.3 0.35 0.4
+# The model forecasts 21-day volatility this many sessions ahead (TARGET_HORIZON in train_model_pipeline.py)
+FORECAST_HORIZON = 5
+PREDICT_CHUNK_ROWS = int(os.getenv("BACKTEST_PREDICT_CHUNK_ROWS", "100000"))
+WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+TRADING_DAYS = 252
+
+# Signal rule defaults: SELL above `sell_above` predicted volatility, BUY below
+# `buy_below`, HOLD in between (so a position doesn't flip on every wiggle).
+DEFAULT_RULE = {"sell_above": 0.35, "buy_below": 0.25, "reenter": True, "cost_bps": 10.0}
+
+
+# --- Data ---
+
+def load_closes(tickers, period="10y", store=None):
+    """
+    Daily closes for `tickers` from the local price store, as one wide
+    (dates x tickers) frame aligned on calendar date. Tickers with no stored
+    bars are dropped. Backtest one exchange at a time: a missing session in a
+    column leaves NaN features for the following rolling window.
+    """
+    store = store or get_store()
+    columns = {}
+    for ticker in tickers:
+        frame = store.read(ticker, "1d", period=period, copy=False)
+        if frame.empty:
+            print(f"⚠️ No stored bars for {ticker}, skipping.")
+            continue
+        close = frame['Close']
+        close.index = close.index.tz_localize(None).normalize()
+        columns[ticker] = close[~close.index.duplicated(keep='last')]
+    if not columns:
+        return pd.DataFrame()
+    return pd.concat(columns, axis=1).sort_index()
+
+
+class BacktestPanel:
+    """
+    Everything a simulation needs as (dates x tickers) float arrays, computed
+    once and shared by every parameter set of a sweep:
+      returns    close-to-close return of each session
+      predicted  model forecast made at each close (NaN during warm-up)
+      realized   the 21-day volatility the forecast was aiming at
+    """
+
+    def __init__(self, closes, model, chunk_rows=PREDICT_CHUNK_ROWS, workers=WORKERS):
+        self.dates = closes.index
+        self.tickers = list(closes.columns)
+        self.returns = closes.pct_change(fill_method=None).to_numpy()
+        features = panel_features(closes)
+        self.realized = features['vol_21d'].shift(-FORECAST_HORIZON).to_numpy()
+        self.predicted = predict_panel(
+            np.stack([features[c].to_numpy() for c in FEATURE_COLUMNS], axis=-1), model, chunk_rows, workers
+        )
+
+    @property
+    def years(self):
+        return len(self.dates) / TRADING_DAYS
+
+
+def predict_panel(X, model, chunk_rows=PREDICT_CHUNK_ROWS, workers=WORKERS):
+    """
+    Model predictions for a (dates x tickers x features) array: every complete
+    row is predicted in fixed-size chunks on a thread pool (tree traversal
+    releases the GIL); incomplete rows come back NaN.
+    """
+    dates, tickers, n_features = X.shape
+    flat = X.reshape(-1, n_features)
+    valid = np.flatnonzero(~np.isnan(flat).any(axis=1))
+    predicted = np.full(len(flat), np.nan)
+    chunks = [valid[i:i + chunk_rows] for i in range(0, len(valid), chunk_rows)]
+
+    def run(rows):
+        return model.predict(pd.DataFrame(flat[rows], columns=FEATURE_COLUMNS))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for rows, values in zip(chunks, pool.map(run, chunks)):
+            predicted[rows] = values
+    return predicted.reshape(dates, tickers)
+
+
+# --- Evaluation ---
+
+def forecast_error(panel):
+    """How far the forecasts were from the volatility that materialized."""
+    mask = ~np.isnan(panel.predicted) & ~np.isnan(panel.realized)
+    if not mask.any():
+        return {"n": 0}
+    error = panel.predicted[mask] - panel.realized[mask]
+    return {
+        "n": int(mask.sum()),
+        "mae": round(float(np.abs(error).mean()), 5),
+        "rmse": round(float(np.sqrt((error ** 2).mean())), 5),
+        "bias": round(float(error.mean()), 5),
+        "correlation": round(float(np.corrcoef(panel.predicted[mask], panel.realized[mask])[0, 1]), 4),
+    }
+
+
+def _performance(daily, years):
+    equity = np.cumprod(1 + daily)
+    volatility = daily.std() * np.sqrt(TRADING_DAYS)
+    return {
+        "totalReturn": round(float(equity[-1] - 1), 4) if len(equity) else 0.0,
+        "annualReturn": round(float(equity[-1] ** (1 / years) - 1), 4) if len(equity) and years > 0 else 0.0,
+        "annualVolatility": round(float(volatility), 4),
+        "sharpeRatio": round(float(daily.mean() * TRADING_DAYS / volatility), 3) if volatility > 0 else 0.0,
+        "maxDrawdown": round(float((equity / np.maximum.accumulate(equity) - 1).min()), 4) if len(equity) else 0.0,
+    }
+
+
+def positions(predicted, sell_above, buy_below, reenter=True):
+    """
+    Position (1 = holding, 0 = flat) at each close under the bot's rule. A
+    SELL closes the whole holding like the bot's auto-trade Execution; with
+    `reenter` a later BUY signal re-opens it, otherwise a sold ticker stays
+    sold (the live bot never buys). Everything starts invested.
+    """
+    target = np.where(predicted > sell_above, 0.0, np.where(predicted < buy_below, 1.0, np.nan))
+    # Forward-fill the last SELL/BUY down each column; HOLD keeps the previous position
+    last = np.where(~np.isnan(target), np.arange(len(target))[:, None], 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    held = np.take_along_axis(target, last, axis=0)
+    held[np.isnan(held)] = 1.0
+    if not reenter:
+        held = np.minimum.accumulate(held, axis=0)
+    return held
+
+
+def simulate(panel, sell_above=DEFAULT_RULE["sell_above"], buy_below=DEFAULT_RULE["buy_below"],
+             reenter=DEFAULT_RULE["reenter"], cost_bps=DEFAULT_RULE["cost_bps"]):
+    """
+    Replays the signal rule over the panel: an equal-weight book across the
+    tickers trading each day, each position taken at the signal's close and
+    held over the next session, paying `cost_bps` per unit traded.
+    """
+    held = positions(panel.predicted, sell_above, buy_below, reenter)
+    traded = np.abs(np.diff(held, axis=0, prepend=1.0))
+    active = ~np.isnan(panel.returns)
+    returns = np.where(active, panel.returns, 0.0)
+    n_active = np.maximum(active.sum(axis=1), 1)
+
+    # Session t's P&L comes from the position chosen at close t-1, so signals never see their own return
+    previous = np.vstack([np.ones((1, held.shape[1])), held[:-1]])
+    costs = np.vstack([np.zeros((1, held.shape[1])), traded[:-1]]) * cost_bps / 10_000
+    daily = ((previous * returns - costs) * active).sum(axis=1) / n_active
+    benchmark = returns.sum(axis=1) / n_active
+
+    valid = ~np.isnan(panel.predicted)
+    changes = np.diff(held, axis=0, prepend=1.0)
+    return {
+        "params": {"sell_above": sell_above, "buy_below": buy_below, "reenter": reenter, "cost_bps": cost_bps},
+        **_performance(daily[1:], panel.years),
+        "signals": {
+            "SELL": int((panel.predicted > sell_above).sum()),
+            "BUY": int((panel.predicted < buy_below).sum()),
+            "HOLD": int((valid & (panel.predicted <= sell_above) & (panel.predicted >= buy_below)).sum()),
+        },
+        "executions": {"SELL": int((changes < 0).sum()), "BUY": int((changes > 0).sum())},
+        "annualTurnover": round(float(traded.sum() / max(len(panel.tickers), 1) / max(panel.years, 1e-9)), 3),
+        "timeInvested": round(float(held[active].mean()), 4) if active.any() else 0.0,
+        "benchmark": _performance(benchmark[1:], panel.years),
+    }
+
+
+def sweep(panel, grid, workers=WORKERS):
+    """
+    Simulates every combination in `grid` ({param: [values]}) in parallel and
+    returns the results best Sharpe first. The panel (and its predictions) is
+    shared, so each combination costs a few array passes.
+    """
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda params: simulate(panel, **params), combos))
+    return sorted(results, key=lambda r: r["sharpeRatio"], reverse=True)
+
+
+def run_backtest(tickers, period="10y", model=None, grid=None, store=None, workers=WORKERS):
+    """Loads, predicts and simulates; the report covers forecast error plus one result per rule."""
+    if model is None:
+        from utils.analyzer import get_pipeline
+        model = get_pipeline()
+        if model is None:
+            raise RuntimeError("No volatility model available; train one with train_model_pipeline.py")
+
+    timings = {}
+    started = time.perf_counter()
+    closes = load_closes(tickers, period, store)
+    if closes.empty:
+        raise ValueError("None of the tickers have stored bars; run train_model_pipeline.py to backfill")
+    timings["load"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    panel = BacktestPanel(closes, model, workers=workers)
+    timings["predict"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    results = sweep(panel, grid or {k: [v] for k, v in DEFAULT_RULE.items()}, workers)
+    timings["simulate"] = round(time.perf_counter() - started, 3)
+
+    return {
+        "tickers": len(panel.tickers), "sessions": len(panel.dates),
+        "start": panel.dates[0].date().isoformat(), "end": panel.dates[-1].date().isoformat(),
+        "forecastError": forecast_error(panel), "results": results, "timings": timings,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backtest the volatility model and the bot's signal rule.")
+    parser.add_argument('--tickers', nargs='+', default=[])
+    parser.add_argument('--tickers-file', help="File with one ticker per line.")
+    parser.add_argument('--period', default="10y")
+    parser.add_argument('--sell-above', type=float, nargs='+', default=[DEFAULT_RULE["sell_above"]])
+    parser.add_argument('--buy-below', type=float, nargs='+', default=[DEFAULT_RULE["buy_below"]])
+    parser.add_argument('--cost-bps', type=float, nargs='+', default=[DEFAULT_RULE["cost_bps"]])
+    parser.add_argument('--no-reenter', action='store_true', help="Sold tickers stay sold, like the live bot.")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--out', help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    report = run_backtest(tickers, args.period, workers=args.workers, grid={
+        "sell_above": args.sell_above, "buy_below": args.buy_below,
+        "reenter": [not args.no_reenter], "cost_bps": args.cost_bps,
+    })
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print(f"✅ Backtest report written to '{args.out}' ({report['timings']})")
+    else:
+        print(text)
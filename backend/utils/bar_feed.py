@@ -0,0 +1,120 @@
+import queue
+from collections import namedtuple
+from datetime import date
+
+import pandas as pd
+
+from utils.price_history import ReplayFetcher, get_histories
+
+# --- Bar Feeds ---
+# A bar feed drives the event-driven bot. It exposes
+#   history(tickers) -> {ticker: frame}   daily history to seed feature state from
+#   poll()           -> [Bar]             bars that arrived since the last poll
+# A bar dated on the ticker's latest session revises that session; a later
+# date starts a new one.
+
+Bar = namedtuple("Bar", ["ticker", "day", "close"])
+
+
+class QuoteBarFeed:
+    """
+    Live bars from a QuoteHub: every changed quote revises the bar of the
+    session it belongs to (the quote's `day`). A quote whose session and
+    price both match the last bar sent for its ticker is not a new bar, so
+    the snapshot a new subscription starts with, or a weekend re-quote of
+    Friday's close, never fakes a flat session.
+    """
+
+    def __init__(self, hub, period="1y"):
+        self.hub = hub
+        self.period = period
+        self._subscriber = None
+        self._last = {}   # ticker -> (day, close) of the last bar returned
+
+    def history(self, tickers):
+        self.hub.add_tickers(tickers)
+        histories = get_histories(tickers, period=self.period)
+        for ticker, frame in histories.items():
+            if frame is not None and not frame.empty:
+                self._last[ticker] = (pd.Timestamp(frame.index[-1]).date(), float(frame['Close'].iloc[-1]))
+        return histories
+
+    def poll(self):
+        if self._subscriber is None:
+            self.hub.ensure_started()
+            self._subscriber = self.hub.subscribe()
+        bars = {}
+        while True:
+            try:
+                _, message = self._subscriber.get_nowait()
+            except queue.Empty:
+                break
+            # Snapshots and diffs both carry {ticker: quote}; only the latest price per ticker matters
+            for ticker, quote in message["quotes"].items():
+                day = date.fromisoformat(quote["day"]) if quote.get("day") else date.today()
+                bars[ticker] = Bar(ticker, day, quote["price"])
+        fresh = []
+        for bar in bars.values():
+            last = self._last.get(bar.ticker)
+            # Quotes are rounded to cents, so an unchanged close compares within half a cent
+            if last is not None and last[0] == bar.day and abs(last[1] - bar.close) < 0.005:
+                continue
+            self._last[bar.ticker] = (bar.day, bar.close)
+            fresh.append(bar)
+        return fresh
+
+    def close(self):
+        if self._subscriber is not None:
+            self.hub.unsubscribe(self._subscriber)
+            self._subscriber = None
+
+
+class ReplayBarFeed:
+    """
+    Replays recorded daily histories one session per poll(), for tests and
+    offline runs. Bars before `start` are the seeding history; the rest are
+    replayed in date order, so a run is fully deterministic.
+    """
+
+    def __init__(self, frames, start):
+        closes = {}
+        for ticker, frame in frames.items():
+            if frame is None or frame.empty:
+                continue
+            close = frame['Close']
+            if getattr(close.index, 'tz', None) is not None:
+                close = close.tz_localize(None)
+            closes[ticker] = close
+        self._frames = frames
+        self._start = pd.Timestamp(start)
+        wide = pd.concat(closes, axis=1).sort_index() if closes else pd.DataFrame()
+        self._closes = wide[wide.index >= self._start]
+        self._pos = 0
+
+    @classmethod
+    def from_directory(cls, directory, tickers, start):
+        """Reads `<ticker>.csv` files in the ReplayFetcher layout."""
+        return cls(ReplayFetcher(directory)(list(tickers), None, "1d"), start)
+
+    @property
+    def exhausted(self):
+        return self._pos >= len(self._closes)
+
+    def history(self, tickers):
+        history = {}
+        for ticker in tickers:
+            frame = self._frames.get(ticker)
+            if frame is None or frame.empty:
+                history[ticker] = pd.DataFrame()
+                continue
+            index = frame.index.tz_localize(None) if getattr(frame.index, 'tz', None) is not None else frame.index
+            history[ticker] = frame[index < self._start]
+        return history
+
+    def poll(self):
+        if self.exhausted:
+            return []
+        row = self._closes.iloc[self._pos]
+        self._pos += 1
+        day = row.name.date()
+        return [Bar(ticker, day, float(close)) for ticker, close in row.items() if pd.notna(close)]
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Chart Series ---
+# Price series for charts are built with array operations end to end and
+# capped at MAX_CHART_POINTS (LTTB downsampling), so payload size and
+# encoding time stay bounded however long the requested history is.
+MAX_CHART_POINTS = int(os.getenv("MAX_CHART_POINTS", "1000"))
+CHART_PERIODS = ["1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "max"]
+CHART_FORMATS = ("labels", "columnar")
+_PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1), "3mo": pd.DateOffset(months=3), "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1), "2y": pd.DateOffset(years=2), "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def longer_period(a, b):
+    """The longer of two CHART_PERIODS values."""
+    return a if CHART_PERIODS.index(a) >= CHART_PERIODS.index(b) else b
+
+
+def period_slice(frame, period):
+    """The last `period` of `frame`, measured back from its latest bar (not from today)."""
+    if period == "max" or frame.empty:
+        return frame
+    start = frame.index[-1] - _PERIOD_OFFSETS[period]
+    return frame.iloc[frame.index.searchsorted(start, side="right"):]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `threshold`
+    points that preserve the visual shape of (x, y). The first and last
+    points are always kept. O(n), with the work inside each bucket vectorized.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_start = end if i + 2 < len(edges) else n - 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def chart_series(close, points=None, fmt="labels"):
+    """
+    Chart payload for a close-price series, downsampled to at most `points`
+    (and never more than MAX_CHART_POINTS).
+      labels:   {"labels": ["YYYY-MM-DD", ...], "prices": [...]}  (what the dashboard renders)
+      columnar: {"t": [epoch seconds, ...], "p": [...]}            (compact, for numeric clients)
+    """
+    limit = min(points or MAX_CHART_POINTS, MAX_CHART_POINTS)
+    index = close.index.tz_localize(None) if getattr(close.index, "tz", None) is not None else close.index
+    epoch = index.values.astype("datetime64[s]").astype(np.int64)
+    prices = np.round(close.to_numpy(dtype=float), 2)
+    keep = lttb(epoch, prices, limit)
+    if fmt == "columnar":
+        return {"t": epoch[keep].tolist(), "p": prices[keep].tolist()}
+    return {
+        "labels": np.datetime_as_string(index.values[keep], unit="D").tolist(),
+        "prices": prices[keep].tolist(),
+    }
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# --- Compact Inference Artifact ---
+# The sklearn Pipeline (StandardScaler + RandomForestRegressor) flattened into
+# a handful of plain .npy arrays. Loading them with mmap_mode='r' lets every
+# gunicorn worker share one page-cache copy of the forest instead of each
+# unpickling its own, and prediction walks all trees at once with NumPy.
+# An optional leaf_targets.npy (see utils/quantile_forest.py) adds quantiles.
+FORMAT_VERSION = 1
+ARRAYS = ("left", "right", "feature", "threshold", "value", "roots")
+
+
+def export_compact(pipeline, directory, leaf_targets=None):
+    """Writes a fitted StandardScaler + RandomForestRegressor pipeline (and its leaf targets) as flat tree arrays."""
+    scaler = pipeline.named_steps['scaler']
+    forest = pipeline.named_steps['regressor']
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+
+    counts = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    left, right, feature, threshold, value = [], [], [], [], []
+    for tree, offset in zip(trees, roots):
+        nodes = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+        # Leaves point at themselves so a fixed number of steps leaves them in place
+        left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+        right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        value.append(tree.value[:, 0, 0])
+
+    os.makedirs(directory, exist_ok=True)
+    arrays = {
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int64),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": roots,
+    }
+    if leaf_targets is not None:
+        arrays["leaf_targets"] = np.asarray(leaf_targets, dtype=np.float64)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    meta = {
+        "formatVersion": FORMAT_VERSION,
+        "nTrees": len(trees),
+        "maxDepth": int(max(tree.max_depth for tree in trees)),
+        "featureNames": [str(c) for c in getattr(scaler, 'feature_names_in_', [])],
+        "scalerMean": scaler.mean_.tolist(),
+        "scalerScale": scaler.scale_.tolist(),
+        "leafTargets": leaf_targets is not None,
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+class CompactForest:
+    """Drop-in `predict` for the exported pipeline, backed by memory-mapped arrays."""
+
+    def __init__(self, directory, mmap=True):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["formatVersion"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model format {meta['formatVersion']}")
+        mode = 'r' if mmap else None
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode))
+        self.leaf_targets = (np.load(os.path.join(directory, "leaf_targets.npy"), mmap_mode=mode)
+                             if meta.get("leafTargets") else None)
+        self.max_depth = meta["maxDepth"]
+        self.feature_names = meta["featureNames"]
+        self.mean = np.array(meta["scalerMean"])
+        self.scale = np.array(meta["scalerScale"])
+
+    def _prepare(self, X):
+        if hasattr(X, "columns") and self.feature_names:
+            X = X[self.feature_names]
+        X = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        # sklearn trees compare float32 inputs against float64 thresholds; match that exactly
+        return X.astype(np.float32).astype(np.float64)
+
+    def predict_leaves(self, X):
+        """Global leaf id of every sample in every tree, shape (n_samples, n_trees)."""
+        X = self._prepare(X)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_trees(self, X):
+        """Per-tree predictions, shape (n_samples, n_trees)."""
+        return self.value[self.predict_leaves(X)]
+
+    def predict(self, X):
+        return self.predict_trees(X).mean(axis=1)
+
+
+if __name__ == '__main__':
+    import joblib
+
+    from utils.quantile_forest import leaf_targets_path, load_leaf_targets
+
+    models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
+    parser = argparse.ArgumentParser(description="Export the volatility pipeline as memory-mappable tree arrays.")
+    parser.add_argument('--model', default=os.path.join(models_dir, 'volatility_model_pipeline.pkl'))
+    parser.add_argument('--out', default=os.path.join(models_dir, 'volatility_model_compact'))
+    args = parser.parse_args()
+    meta = export_compact(joblib.load(args.model), args.out, load_leaf_targets(leaf_targets_path(args.model)))
+    print(f"✅ Exported {meta['nTrees']} trees (max depth {meta['maxDepth']}) to '{args.out}'")
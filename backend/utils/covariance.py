@@ -0,0 +1,385 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.portfolio_risk import daily_closes
+from utils.price_history import MARKET_HOURS, get_histories
+
+# --- Configuration ---
+# One exponentially weighted covariance matrix of daily returns for the whole
+# tracked universe, advanced by one O(n^2) update per completed session and
+# saved as memory-mappable .npy files. Every worker maps the same files, so
+# the matrix exists once in the page cache however many processes serve it.
+COVARIANCE_DIR = os.getenv(
+    "COVARIANCE_DIR", os.path.join(os.path.dirname(__file__), '..', 'data', 'covariance')
+)
+HALFLIFE_DAYS = float(os.getenv("COVARIANCE_HALFLIFE_DAYS", "63"))
+HISTORY_PERIOD = os.getenv("COVARIANCE_HISTORY_PERIOD", "2y")          # replayed on a rebuild
+WINDOW = int(os.getenv("COVARIANCE_WINDOW", "252"))                     # recent returns kept for shrinkage
+MIN_OBSERVATIONS = int(os.getenv("COVARIANCE_MIN_OBSERVATIONS", "21"))
+REFRESH_SECONDS = int(os.getenv("COVARIANCE_REFRESH_SECONDS", "900"))
+# One process writes the files and every other process only maps them. The
+# web workers are readers by default; bot.py runs the writer
+# (COVARIANCE_REFRESH=on). Readers leave tickers they need in requested.txt
+# for the writer to pick up on its next refresh.
+REFRESH_ENABLED = os.getenv("COVARIANCE_REFRESH", "off") == "on"
+UNIVERSE_FILE = os.getenv("COVARIANCE_UNIVERSE_FILE")
+ARRAYS = ("cov", "mean", "count", "weight", "weight2", "window")
+TRADING_DAYS = 252
+
+
+def session_complete(day, now=None):
+    """True once every tracked exchange has closed its `day` session."""
+    for tz, _, close_at in MARKET_HOURS.values():
+        local_now = (now or datetime.now(tz)).astimezone(tz)
+        if datetime.combine(day, close_at, tzinfo=tz) > local_now:
+            return False
+    return True
+
+
+def ledoit_wolf_intensity(X):
+    """
+    Ledoit-Wolf (2004) shrinkage intensity towards a scaled identity for a
+    (observations x assets) return sample, in [0, 1].
+    """
+    T, n = X.shape
+    if T < 2 or n < 2:
+        return 0.0
+    X = X - X.mean(axis=0)
+    sample = X.T @ X / T
+    mu = np.trace(sample) / n
+    d2 = np.sum((sample - mu * np.eye(n)) ** 2) / n
+    if d2 <= 0:
+        return 0.0
+    # sum_t ||x_t x_t' - S||^2 expands to sum_t ||x_t||^4 - T ||S||^2
+    b2_bar = (np.sum(np.sum(X ** 2, axis=1) ** 2) - T * np.sum(sample ** 2)) / (T ** 2 * n)
+    return float(min(max(b2_bar, 0.0), d2) / d2)
+
+
+class CovarianceState:
+    """One immutable version of the matrix; readers hold it while the writer builds the next."""
+
+    def __init__(self, tickers, cov, mean, count, weight, weight2, window, window_days, last_day):
+        self.tickers = list(tickers)
+        self.index = {t: i for i, t in enumerate(self.tickers)}
+        self.cov = cov            # (n, n) EWMA covariance of daily returns, not yet bias-corrected
+        self.mean = mean          # (n,) EWMA mean return
+        self.count = count        # (n,) returns observed per ticker
+        self.weight = weight      # (n,) sum of the decayed observation weights per ticker
+        self.weight2 = weight2    # (n,) sum of their squares, for the bias correction
+        self.window = window      # (WINDOW, n) most recent returns, oldest first
+        self.window_days = list(window_days)
+        self.last_day = last_day
+
+
+class CovarianceService:
+    """
+    Keeps the EWMA covariance of the tracked universe current. The writer
+    (`refresh`) replays history once when the universe changes and otherwise
+    applies only sessions completed since the last update. Readers extract
+    any ticker set's submatrix with one fancy-indexing gather, optionally
+    shrunk towards a scaled identity (Ledoit-Wolf).
+    """
+
+    def __init__(self, directory=COVARIANCE_DIR, halflife=HALFLIFE_DAYS, history_period=HISTORY_PERIOD,
+                 window=WINDOW, refresh_seconds=REFRESH_SECONDS, refresh_enabled=REFRESH_ENABLED, universe=()):
+        self.directory = directory
+        self.decay = 0.5 ** (1 / halflife)
+        self.history_period = history_period
+        self.window_size = window
+        self.refresh_seconds = refresh_seconds
+        self.refresh_enabled = refresh_enabled
+        self._state = None
+        self._version = None
+        self._loaded_mtime = None
+        self._wanted = set(universe)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self.load()
+
+    @property
+    def state(self):
+        return self._state
+
+    # --- Persistence ---
+
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    def _requests_path(self):
+        return os.path.join(self.directory, "requested.txt")
+
+    def _array_path(self, name, version=None):
+        return os.path.join(self.directory, version or self._version, f"{name}.npy")
+
+    def load(self):
+        """Maps the latest saved version if it changed since the last load."""
+        try:
+            mtime = os.path.getmtime(self._meta_path())
+        except OSError:
+            return False
+        if mtime == self._loaded_mtime:
+            return False
+        with open(self._meta_path()) as f:
+            meta = json.load(f)
+        try:
+            arrays = {name: np.load(self._array_path(name, meta["version"]), mmap_mode='r') for name in ARRAYS}
+        except FileNotFoundError:
+            # Saved before the weight sums were kept: the writer rebuilds it
+            print("⚠️ Covariance files are from an older format; waiting for a rebuild.")
+            self._loaded_mtime = mtime
+            return False
+        self._state = CovarianceState(meta["tickers"], *(arrays[name] for name in ARRAYS),
+                                      meta["windowDays"], meta["lastDay"])
+        self._version = meta["version"]
+        self._loaded_mtime = mtime
+        return True
+
+    def save(self):
+        """
+        Writes the current state as a new version directory, switches
+        meta.json to it and maps it back, so the writer shares the page cache
+        with the readers instead of holding a private copy.
+        """
+        state = self._state
+        previous = self._version
+        version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')
+        version_dir = os.path.join(self.directory, version)
+        os.makedirs(version_dir, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(version_dir, f"{name}.npy"), np.asarray(getattr(state, name)))
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": version, "tickers": state.tickers, "windowDays": state.window_days,
+                       "lastDay": state.last_day, "halflifeDecay": self.decay}, f)
+        os.replace(tmp, self._meta_path())
+        self._loaded_mtime = None
+        self.load()
+        # Keep the version readers may still be switching from; anything older is unreferenced.
+        # Versions sort by timestamp, so a newer one saved meanwhile by another writer is never touched.
+        # Workers that still map a pruned version keep their mapping after the files are unlinked.
+        if previous is None:
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name < previous and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _take_requests(self):
+        """Tickers readers asked for since the last refresh (writer only)."""
+        path = self._requests_path()
+        taken = path + ".taken"
+        try:
+            os.replace(path, taken)
+        except OSError:
+            return set()
+        with open(taken) as f:
+            tickers = {line.strip() for line in f if line.strip()}
+        os.remove(taken)
+        return tickers
+
+    # --- Updates ---
+
+    def _returns(self, tickers, period):
+        """Date-aligned daily returns (NaN where a ticker didn't trade), complete sessions only."""
+        histories = get_histories(tickers, period=period)
+        columns = {t: daily_closes(h) for t, h in histories.items() if h is not None and not h.empty}
+        closes = pd.DataFrame(columns, columns=tickers).sort_index()
+        returns = closes.pct_change(fill_method=None).iloc[1:]
+        complete = [session_complete(day.date()) for day in returns.index]
+        return returns[np.asarray(complete, dtype=bool)]
+
+    def _step(self, state, day, r):
+        """
+        Advances the (writable) state by one session's return vector, in
+        O(n^2). This is the recursion pandas' `ewm(adjust=True).cov()` runs:
+        with W the decayed weight of the earlier observations and d the
+        return's deviation from the previous mean,
+            mean' = mean + d / (W + 1)
+            cov'  = W / (W + 1) * (cov + d d' / (W + 1))
+        A pair's weight is that of its later-starting ticker. Weights keep
+        decaying over sessions a ticker didn't trade, as with ignore_na=False.
+        """
+        lam = self.decay
+        observed = ~np.isnan(r)
+        started = state.count > 0
+        first = observed & ~started
+        seen = observed & started
+        weight = np.where(started, lam * state.weight, 0.0)
+        d = np.where(seen, r - state.mean, 0.0)
+        if seen.all():
+            pair = np.minimum.outer(weight, weight)
+            state.cov += np.outer(d, d) / (pair + 1)
+            state.cov *= pair / (pair + 1)
+        elif seen.any():
+            idx = np.flatnonzero(seen)
+            block = np.ix_(idx, idx)
+            pair = np.minimum.outer(weight[idx], weight[idx])
+            state.cov[block] = pair / (pair + 1) * (state.cov[block] + np.outer(d[idx], d[idx]) / (pair + 1))
+        state.mean = np.where(seen, state.mean + d / (weight + 1), np.where(first, r, state.mean))
+        state.weight = weight + observed
+        state.weight2 = np.where(started, lam * lam * state.weight2, 0.0) + observed
+        state.count = state.count + observed
+        state.last_day = day
+
+    def _append_window(self, state, days, rows):
+        """Keeps the last `window_size` sessions of returns (shrinkage needs raw observations)."""
+        state.window = np.vstack([state.window, rows])[-self.window_size:]
+        state.window_days = (state.window_days + list(days))[-self.window_size:]
+
+    def rebuild(self, tickers):
+        """Replays `history_period` of returns for `tickers` from scratch."""
+        started = time.perf_counter()
+        tickers = sorted(set(tickers))
+        n = len(tickers)
+        state = CovarianceState(tickers, np.zeros((n, n)), np.zeros(n), np.zeros(n, dtype=np.int64),
+                                np.zeros(n), np.zeros(n), np.full((self.window_size, n), np.nan), [None] * self.window_size, None)
+        returns = self._returns(tickers, self.history_period)
+        values = returns.to_numpy(dtype=float)
+        days = [day.date().isoformat() for day in returns.index]
+        for day, r in zip(days, values):
+            self._step(state, day, r)
+        self._append_window(state, days, values)
+        self._state = state
+        print(f"🧮 Covariance rebuilt: {n} tickers, {len(values)} sessions in {time.perf_counter() - started:.1f}s")
+
+    def _writable(self):
+        """
+        The next state to update, so readers never see a half-applied one.
+        Only `cov` is modified in place (the other arrays are replaced); it is
+        mapped copy-on-write, so just the pages an update touches get copied.
+        """
+        s = self._state
+        if isinstance(s.cov, np.memmap):
+            cov = np.load(self._array_path("cov"), mmap_mode='c')
+        else:
+            cov = np.array(s.cov)
+        return CovarianceState(s.tickers, cov, s.mean, s.count, s.weight, s.weight2, s.window,
+                               s.window_days, s.last_day)
+
+    def refresh(self):
+        """Rebuilds if tracked tickers were added, otherwise applies new sessions. Returns sessions applied."""
+        with self._refresh_lock:
+            with self._lock:
+                self._wanted.update(self._take_requests())
+                wanted = set(self._wanted)
+            state = self._state
+            if state is None and not wanted:
+                return 0
+            if state is None or wanted - set(state.tickers):
+                self.rebuild(wanted | set(state.tickers if state else ()))
+                self.save()
+                return len(self._state.window_days)
+
+            returns = self._returns(state.tickers, "1mo")
+            if state.last_day is not None:
+                if len(returns) and returns.index[0].date().isoformat() > state.last_day:
+                    # Gap longer than the incremental fetch: start over
+                    self.rebuild(state.tickers)
+                    self.save()
+                    return len(self._state.window_days)
+                returns = returns[[d.date().isoformat() > state.last_day for d in returns.index]]
+            if returns.empty:
+                return 0
+            next_state = self._writable()
+            days = [day.date().isoformat() for day in returns.index]
+            values = returns.to_numpy(dtype=float)
+            for day, r in zip(days, values):
+                self._step(next_state, day, r)
+            self._append_window(next_state, days, values)
+            self._state = next_state
+            self.save()
+            print(f"🧮 Covariance advanced by {len(returns)} session(s) to {next_state.last_day}")
+            return len(returns)
+
+    def track(self, tickers):
+        """Adds tickers to the universe; the writer's next refresh rebuilds to include them."""
+        tickers = set(tickers)
+        with self._lock:
+            new = tickers - self._wanted
+            self._wanted.update(tickers)
+        if new and not self.refresh_enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._requests_path(), "a") as f:
+                f.write("".join(f"{t}\n" for t in sorted(new)))
+
+    def _run(self):
+        while True:
+            try:
+                if self.refresh_enabled:
+                    self.refresh()
+                else:
+                    self.load()
+            except Exception as e:
+                print(f"❌ Covariance refresh failed: {e}")
+            time.sleep(self.refresh_seconds if self.refresh_enabled else min(self.refresh_seconds, 60))
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="covariance", daemon=True)
+                self._thread.start()
+
+    # --- Queries ---
+
+    def submatrix(self, tickers, shrink=False, annualize=False):
+        """
+        Covariance of daily returns for `tickers` as a DataFrame, plus the
+        tickers it can't cover yet (untracked or fewer than MIN_OBSERVATIONS
+        returns). Those are queued for tracking. Returns (frame, missing, intensity).
+        """
+        state = self._state
+        if state is None:
+            self.track(tickers)
+            return pd.DataFrame(), list(tickers), 0.0
+        covered = [t for t in tickers if t in state.index and state.count[state.index[t]] >= MIN_OBSERVATIONS]
+        missing = [t for t in tickers if t not in covered]
+        self.track([t for t in missing if t not in state.index])
+        if not covered:
+            return pd.DataFrame(), missing, 0.0
+
+        idx = np.array([state.index[t] for t in covered])
+        cov = np.array(state.cov[np.ix_(idx, idx)])
+        # Unbiased like pandas' ewm cov: scale by W^2 / (W^2 - sum of squared weights)
+        weight = np.minimum.outer(state.weight[idx], state.weight[idx])
+        weight2 = np.minimum.outer(state.weight2[idx], state.weight2[idx])
+        cov *= weight ** 2 / (weight ** 2 - weight2)
+
+        intensity = 0.0
+        if shrink and len(idx) > 1:
+            sample = np.asarray(state.window[:, idx])
+            sample = sample[~np.isnan(sample).any(axis=1)]
+            intensity = ledoit_wolf_intensity(sample)
+            target = np.trace(cov) / len(idx) * np.eye(len(idx))
+            cov = intensity * target + (1 - intensity) * cov
+        if annualize:
+            cov *= TRADING_DAYS
+        return pd.DataFrame(cov, index=covered, columns=covered), missing, intensity
+
+    def correlation(self, tickers, shrink=False):
+        """Correlation matrix for `tickers`; returns (frame, missing)."""
+        cov, missing, _ = self.submatrix(tickers, shrink=shrink)
+        if cov.empty:
+            return cov, missing
+        vol = np.sqrt(np.diag(cov.to_numpy()))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.nan_to_num(cov.to_numpy() / np.outer(vol, vol))
+        np.fill_diagonal(corr, 1.0)
+        return pd.DataFrame(corr, index=cov.index, columns=cov.columns), missing
+
+
+def _initial_universe():
+    if not UNIVERSE_FILE:
+        return ()
+    with open(UNIVERSE_FILE) as f:
+        return [line.split('#')[0].strip() for line in f if line.split('#')[0].strip()]
+
+
+covariance_service = CovarianceService(universe=_initial_universe())
@@ -0,0 +1,43 @@
+import os
+
+# --- Database Configuration ---
+# The API and the trading bot run as separate processes with different
+# connection needs: the API serves many short concurrent requests, the bot
+# does one batched write pass every few minutes. Each process picks its role
+# with DB_POOL_ROLE (API or BOT); any setting can be given per role
+# (DB_BOT_POOL_SIZE) or for both (DB_POOL_SIZE).
+DEFAULT_DATABASE_URL = 'postgresql://localhost/riskforecaster_db'
+
+ROLE_DEFAULTS = {
+    "API": {"POOL_SIZE": 10, "MAX_OVERFLOW": 20},
+    "BOT": {"POOL_SIZE": 2, "MAX_OVERFLOW": 0},
+}
+
+
+def pool_role():
+    return os.getenv("DB_POOL_ROLE", "API").upper()
+
+
+def _setting(role, name, default):
+    return os.getenv(f"DB_{role}_{name}", os.getenv(f"DB_{name}", default))
+
+
+def database_url():
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+
+def engine_options(url=None, role=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for this process's role."""
+    url = url or database_url()
+    role = (role or pool_role()).upper()
+    defaults = ROLE_DEFAULTS.get(role, ROLE_DEFAULTS["API"])
+    options = {
+        "pool_pre_ping": _setting(role, "POOL_PRE_PING", "1").lower() not in ("0", "false", "no"),
+        "pool_recycle": int(_setting(role, "POOL_RECYCLE", 1800)),
+    }
+    # SQLite (tests, local runs) uses file or singleton pools that don't take size limits
+    if not url.startswith("sqlite"):
+        options["pool_size"] = int(_setting(role, "POOL_SIZE", defaults["POOL_SIZE"]))
+        options["max_overflow"] = int(_setting(role, "MAX_OVERFLOW", defaults["MAX_OVERFLOW"]))
+        options["pool_timeout"] = int(_setting(role, "POOL_TIMEOUT", 30))
+    return options
@@ -0,0 +1,62 @@
+import gzip
+import json
+import math
+import os
+
+import numpy as np
+
+# orjson is optional: it encodes API payloads several times faster than the
+# standard library, which is used when it is not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj):
+    """
+    `obj` with NaN/inf replaced by None (and date keys as ISO strings), so the
+    standard library writes the same valid JSON orjson does.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {(k.isoformat() if hasattr(k, "isoformat") else k): _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, (np.ndarray, np.floating)):
+        return _finite(obj.tolist())
+    return obj
+
+
+def dumps(obj):
+    """Compact JSON text for `obj`; understands numpy values and datetimes, and writes NaN/inf as null."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(_finite(obj), default=_default, separators=(",", ":"), allow_nan=False)
+
+
+def accepts_gzip(accept_encoding):
+    return "gzip" in (accept_encoding or "").lower()
+
+
+def compress(body):
+    """gzip-compressed `body`, or None when it is too small to bother."""
+    if len(body) < GZIP_MIN_BYTES:
+        return None
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
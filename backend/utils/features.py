@@ -0,0 +1,217 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# --- Feature Definitions ---
+# The single source of truth for the volatility model's inputs. Training
+# (`train_model_pipeline.py`) and inference (`utils/analyzer.py`) both build
+# features through this module so the two can never drift apart.
+FEATURE_COLUMNS = ['vol_21d', 'vol_63d', 'momentum_1m', 'momentum_3m']
+SHORT_WINDOW = 21
+LONG_WINDOW = 63
+ANNUALIZATION = np.sqrt(252)
+
+
+def build_features(close):
+    """
+    Full-history feature frame for one ticker's close series (the pandas
+    rolling path). Returns a DataFrame with `returns` plus FEATURE_COLUMNS.
+    """
+    features = pd.DataFrame(index=close.index)
+    features['returns'] = close.pct_change(fill_method=None)
+    features['vol_21d'] = features['returns'].rolling(window=SHORT_WINDOW).std() * ANNUALIZATION
+    features['vol_63d'] = features['returns'].rolling(window=LONG_WINDOW).std() * ANNUALIZATION
+    features['momentum_1m'] = close.pct_change(periods=SHORT_WINDOW, fill_method=None)
+    features['momentum_3m'] = close.pct_change(periods=LONG_WINDOW, fill_method=None)
+    return features
+
+
+def panel_features(closes):
+    """
+    Every bar's features for a wide (dates x tickers) close frame at once:
+    {feature: DataFrame shaped like `closes`}. Same values as
+    `build_features` per column, provided each column has no gaps.
+    """
+    returns = closes.pct_change(fill_method=None)
+    return {
+        'vol_21d': returns.rolling(window=SHORT_WINDOW).std() * ANNUALIZATION,
+        'vol_63d': returns.rolling(window=LONG_WINDOW).std() * ANNUALIZATION,
+        'momentum_1m': closes.pct_change(periods=SHORT_WINDOW, fill_method=None),
+        'momentum_3m': closes.pct_change(periods=LONG_WINDOW, fill_method=None),
+    }
+
+
+def latest_features(closes):
+    """
+    Latest feature row for every column of a wide (bars x tickers) close
+    frame, computed as one vectorized operation. Returns a DataFrame indexed
+    by ticker with FEATURE_COLUMNS; tickers without enough history get NaNs.
+    """
+    # Only the trailing LONG_WINDOW + 1 closes influence the last row
+    tail = closes.iloc[-(LONG_WINDOW + 1):]
+    returns = tail.pct_change(fill_method=None)
+    return pd.DataFrame({
+        'vol_21d': returns.rolling(window=SHORT_WINDOW).std().iloc[-1] * ANNUALIZATION,
+        'vol_63d': returns.rolling(window=LONG_WINDOW).std().iloc[-1] * ANNUALIZATION,
+        'momentum_1m': tail.pct_change(periods=SHORT_WINDOW, fill_method=None).iloc[-1],
+        'momentum_3m': tail.pct_change(periods=LONG_WINDOW, fill_method=None).iloc[-1],
+    }, index=closes.columns)[FEATURE_COLUMNS]
+
+
+# --- Incremental State ---
+
+class RollingWindow:
+    """
+    Fixed-size window of returns backed by a ring buffer, keeping a running
+    mean and sum of squared deviations so the sample standard deviation is
+    O(1) per bar. Values enter and leave through Welford's update with Kahan
+    compensation, the same scheme pandas' rolling var uses, so the results
+    track `build_features` to the last bits instead of drifting over long
+    sessions the way running sums do.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.buffer = np.zeros(size)
+        self.count = 0
+        self.pos = 0
+        self.mean = 0.0
+        self.ssqdm = 0.0
+        self._add_comp = 0.0
+        self._remove_comp = 0.0
+        self._same_run = 0
+        self._previous = np.nan
+        self._before_push = None
+
+    def _add(self, value):
+        n = self.count + 1
+        self._same_run = self._same_run + 1 if value == self._previous else 1
+        self._previous = value
+        prev_mean = self.mean - self._add_comp
+        y = value - self._add_comp
+        t = y - self.mean
+        self._add_comp = t + self.mean - y
+        self.mean = self.mean + t / n
+        self.ssqdm = self.ssqdm + (value - prev_mean) * (value - self.mean)
+        self.count = n
+
+    def _remove(self, value):
+        n = self.count - 1
+        if n:
+            prev_mean = self.mean - self._remove_comp
+            y = value - self._remove_comp
+            t = y - self.mean
+            self._remove_comp = t + self.mean - y
+            self.mean = self.mean - t / n
+            self.ssqdm = self.ssqdm - (value - prev_mean) * (value - self.mean)
+        else:
+            self.mean = self.ssqdm = 0.0
+        self.count = n
+
+    def _state(self):
+        return (self.count, self.pos, self.mean, self.ssqdm, self._add_comp, self._remove_comp,
+                self._same_run, self._previous, self.buffer[self.pos])
+
+    def push(self, value):
+        value = float(value)
+        self._before_push = self._state()
+        if self.count == self.size:
+            self._remove(self.buffer[self.pos])
+        self._add(value)
+        self.buffer[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+
+    def replace_last(self, value):
+        """
+        Replaces the most recently pushed value (a revised intraday bar) in
+        O(1) by rewinding to the state before that push and pushing again,
+        so a revision leaves no trace in the running statistics.
+        """
+        if self._before_push is None:
+            return self.push(value)
+        (self.count, self.pos, self.mean, self.ssqdm, self._add_comp, self._remove_comp,
+         self._same_run, self._previous, evicted) = self._before_push
+        self.buffer[self.pos] = evicted
+        self.push(value)
+
+    def std(self):
+        """Sample (ddof=1) standard deviation, NaN until the window is full, like pandas rolling."""
+        if self.count < self.size:
+            return np.nan
+        # A window of one repeated value is exactly flat, as in pandas
+        if self._same_run >= self.count:
+            return 0.0
+        return float(np.sqrt(max(self.ssqdm / (self.size - 1), 0.0)))
+
+
+class RollingFeatureState:
+    """
+    Per-ticker feature state that is seeded once from history and then
+    updated bar by bar in O(1), producing the same values as `build_features`
+    on the full series.
+    """
+
+    def __init__(self):
+        self.short = RollingWindow(SHORT_WINDOW)
+        self.long = RollingWindow(LONG_WINDOW)
+        self.closes = deque(maxlen=LONG_WINDOW + 1)
+
+    @classmethod
+    def from_closes(cls, closes):
+        """Seeds the state from a close history; only the trailing LONG_WINDOW + 1 bars are needed."""
+        state = cls()
+        for close in np.asarray(closes, dtype=float)[-(LONG_WINDOW + 1):]:
+            state.update(close)
+        return state
+
+    @property
+    def ready(self):
+        return len(self.closes) == self.closes.maxlen
+
+    @property
+    def last_close(self):
+        return self.closes[-1] if self.closes else None
+
+    def update(self, close):
+        """Adds one new bar's close and returns the refreshed features (or None if not ready)."""
+        close = float(close)
+        if np.isnan(close):
+            return self.features()
+        if self.closes:
+            ret = close / self.closes[-1] - 1
+            self.short.push(ret)
+            self.long.push(ret)
+        self.closes.append(close)
+        return self.features()
+
+    def revise(self, close):
+        """
+        Replaces the latest bar's close (the same session quoted again) and
+        returns the refreshed features, without advancing the windows.
+        """
+        close = float(close)
+        if np.isnan(close) or not self.closes:
+            return self.features()
+        if len(self.closes) > 1:
+            ret = close / self.closes[-2] - 1
+            self.short.replace_last(ret)
+            self.long.replace_last(ret)
+        self.closes[-1] = close
+        return self.features()
+
+    def features(self):
+        if not self.ready:
+            return None
+        last = self.closes[-1]
+        return {
+            'vol_21d': self.short.std() * ANNUALIZATION,
+            'vol_63d': self.long.std() * ANNUALIZATION,
+            'momentum_1m': last / self.closes[-(SHORT_WINDOW + 1)] - 1,
+            'momentum_3m': last / self.closes[0] - 1,
+        }
+
+    def as_row(self):
+        """Features as a list in FEATURE_COLUMNS order, ready to stack into a predict matrix."""
+        features = self.features()
+        return None if features is None else [features[c] for c in FEATURE_COLUMNS]
@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils.analyzer import MODEL_FORMAT, MODEL_PATH, aligned_closes, get_pipeline
+from utils.compact_model import CompactForest
+from utils.features import FEATURE_COLUMNS, latest_features
+from utils.metrics import timed
+from utils.price_history import get_histories
+from utils.quantile_forest import forest_leaves, leaf_targets_path, load_leaf_targets, predictive_quantiles
+
+# --- Configuration ---
+# One model per horizon: the main pipeline forecasts MAIN_HORIZON days ahead,
+# the others are volatility_model_h<N>.pkl next to it, written by
+# `python train_model_pipeline.py --horizons 1 5 21`. Only the main model
+# ships with the repo, so requests default to the horizons that have a model.
+HORIZONS = (1, 5, 21)
+MAIN_HORIZON = 5
+# Quantiles come from the forest's leaves (utils/quantile_forest.py). Each
+# forecast caches its predictive distribution on QUANTILE_GRID; other levels
+# are interpolated between grid points.
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+QUANTILE_GRID = np.linspace(0, 1, 201)
+MAX_TICKERS = int(os.getenv("FORECAST_MAX_TICKERS", "100"))
+CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "20000"))
+# A horizon whose model is missing is looked for again after this long, so a model trained later is picked up
+MODEL_RETRY_SECONDS = float(os.getenv("FORECAST_MODEL_RETRY_SECONDS", "60"))
+MODEL_DIR = os.path.dirname(MODEL_PATH)
+
+# leaf_targets is None for a model trained before they were saved: it serves no quantiles
+HorizonModel = namedtuple("HorizonModel", "model leaf_targets")
+
+
+class ModelUnavailable(Exception):
+    """The model for a horizon has not been trained (or failed to load)."""
+
+
+def _with_leaf_targets(model, path):
+    if model is None:
+        return None
+    if MODEL_FORMAT == "compact":
+        targets = model.leaf_targets
+    else:
+        targets = load_leaf_targets(leaf_targets_path(path))
+    if targets is None:
+        print(f"⚠️ {os.path.basename(path)} has no leaf targets; retrain it to serve quantiles.")
+    return HorizonModel(model, targets)
+
+
+def _load_horizon_model(horizon):
+    if horizon == MAIN_HORIZON:
+        return _with_leaf_targets(get_pipeline(), MODEL_PATH)
+    path = os.path.join(MODEL_DIR, f"volatility_model_h{horizon}.pkl")
+    try:
+        if MODEL_FORMAT == "compact":
+            return _with_leaf_targets(CompactForest(os.path.join(MODEL_DIR, f"volatility_model_h{horizon}_compact")),
+                                      path)
+        return _with_leaf_targets(joblib.load(path), path)
+    except FileNotFoundError:
+        print(f"⚠️ No {horizon}-day volatility model; train it with --horizons {horizon}.")
+    except Exception as e:
+        print(f"❌ Could not load the {horizon}-day volatility model: {e}")
+    return None
+
+
+def tree_leaves(model, features):
+    """
+    Every tree's prediction and the global leaf id it came from, both shaped
+    (n_samples, n_trees), for a compact forest or a StandardScaler +
+    RandomForestRegressor pipeline. The predictions' mean is the model's
+    point forecast; the leaves index its leaf targets for the quantiles.
+    """
+    if hasattr(model, "predict_leaves"):
+        leaves = model.predict_leaves(features)
+        return np.asarray(model.value[leaves]), leaves
+    forest = model.named_steps['regressor']
+    scaled = model.named_steps['scaler'].transform(features[FEATURE_COLUMNS])
+    leaves = forest_leaves(forest, scaled)
+    values = np.concatenate([estimator.tree_.value[:, 0, 0] for estimator in forest.estimators_])
+    return values[leaves], leaves
+
+
+class Forecaster:
+    """
+    Multi-horizon volatility forecasts with predictive quantiles. Per
+    request, features are built once per ticker and each horizon's model
+    runs one tree pass over all the tickers that need it. The point forecast
+    and its predictive distribution are cached per (ticker, horizon) until a
+    new bar arrives, so any set of quantiles is served from the cache
+    without touching the model.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, retry_seconds=MODEL_RETRY_SECONDS):
+        self.cache_size = cache_size
+        self.retry_seconds = retry_seconds
+        self._models = {}
+        self._failed = {}   # horizon -> monotonic time of the last failed load
+        self._model_lock = threading.Lock()
+        self._cache = OrderedDict()   # (ticker, horizon) -> (bar key, (point forecast, distribution))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def model(self, horizon):
+        """The horizon's model, or None if it isn't available (looked for again after `retry_seconds`)."""
+        with self._model_lock:
+            if horizon in self._models:
+                return self._models[horizon]
+            failed_at = self._failed.get(horizon)
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_seconds:
+                return None
+            model = _load_horizon_model(horizon)
+            if model is None:
+                self._failed[horizon] = time.monotonic()
+            else:
+                self._models[horizon] = model
+                self._failed.pop(horizon, None)
+            return model
+
+    def available_horizons(self):
+        """The horizons that have a trained model, the default set for a request."""
+        return [h for h in HORIZONS if self.model(h) is not None]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
+
+    def invalidate(self):
+        """Drops cached forecasts and loaded models (e.g. after retraining)."""
+        with self._lock:
+            self._cache.clear()
+        with self._model_lock:
+            self._models.clear()
+            self._failed.clear()
+
+    def _cached(self, key, bar):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == bar:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _store(self, key, bar, forecast):
+        with self._lock:
+            self._cache[key] = (bar, forecast)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def forecast(self, tickers, horizons=None, quantiles=DEFAULT_QUANTILES):
+        """
+        {ticker: {"lastClose", "asOf", "horizons": {h: {"volatility", "quantiles"}}}}
+        with annualized volatilities. "quantiles" are levels of the quantile
+        forest's predictive distribution, or None for a model trained
+        without leaf targets. Tickers or horizons that can't be served carry
+        an "error" instead. `horizons` defaults to the ones with a trained
+        model (all of HORIZONS if none has one, so each reports why).
+        """
+        horizons = horizons or self.available_horizons() or HORIZONS
+        results = {}
+        with timed("fetch"):
+            histories = get_histories(tickers, period="1y")
+        bars = {}
+        for ticker in tickers:
+            hist = histories.get(ticker)
+            if hist is None or hist.empty:
+                results[ticker] = {"error": f"No data found for ticker '{ticker}'."}
+                continue
+            # A forecast stays valid until the latest bar changes (a new session or a revised close)
+            bars[ticker] = (hist.index[-1], float(hist['Close'].iloc[-1]))
+
+        forecasts = {}  # (ticker, horizon) -> (point forecast, distribution on QUANTILE_GRID or None)
+        pending = {}    # horizon -> tickers to predict
+        for ticker in bars:
+            for horizon in horizons:
+                cached = self._cached((ticker, horizon), bars[ticker])
+                if cached is None:
+                    pending.setdefault(horizon, []).append(ticker)
+                else:
+                    forecasts[(ticker, horizon)] = cached
+
+        unavailable = set()
+        if pending:
+            needed = sorted({t for group in pending.values() for t in group})
+            with timed("features"):
+                features = latest_features(aligned_closes(histories, needed))
+            ready = features.notnull().all(axis=1)
+            for horizon, group in pending.items():
+                group = [t for t in group if ready[t]]
+                loaded = self.model(horizon)
+                if loaded is None:
+                    unavailable.add(horizon)
+                    continue
+                if not group:
+                    continue
+                with timed("predict"):
+                    predictions, leaves = tree_leaves(loaded.model, features.loc[group])
+                    distributions = (predictive_quantiles(loaded.leaf_targets, leaves, QUANTILE_GRID)
+                                     if loaded.leaf_targets is not None else [None] * len(group))
+                for ticker, point, distribution in zip(group, predictions.mean(axis=1), distributions):
+                    forecasts[(ticker, horizon)] = (float(point), distribution)
+                    self._store((ticker, horizon), bars[ticker], forecasts[(ticker, horizon)])
+
+        for ticker, (as_of, close) in bars.items():
+            per_horizon = {}
+            for horizon in horizons:
+                forecast = forecasts.get((ticker, horizon))
+                if forecast is None:
+                    per_horizon[str(horizon)] = {"error": (
+                        f"No {horizon}-day model available." if horizon in unavailable
+                        else "Not enough historical data to generate features for prediction."
+                    )}
+                    continue
+                point, distribution = forecast
+                per_horizon[str(horizon)] = {
+                    "volatility": round(point, 4),
+                    "quantiles": None if distribution is None else {
+                        str(q): round(float(v), 4)
+                        for q, v in zip(quantiles, np.interp(quantiles, QUANTILE_GRID, distribution))
+                    },
+                }
+            results[ticker] = {"lastClose": round(close, 2), "asOf": pd.Timestamp(as_of).isoformat(),
+                               "horizons": per_horizon}
+        return {t: results[t] for t in tickers}
+
+
+forecaster = Forecaster()
+
+
+def parse_forecast_request(data):
+    """
+    Validates a /api/forecast body. Returns ((tickers, horizons, quantiles), error
+    message); horizons is empty when the body doesn't name any, meaning every
+    horizon with a trained model.
+    """
+    tickers = data.get('tickers') or ([data['ticker']] if data.get('ticker') else [])
+    tickers = list(dict.fromkeys(str(t).strip().upper() for t in tickers if str(t).strip()))
+    if not tickers:
+        return None, "tickers is required"
+    if len(tickers) > MAX_TICKERS:
+        return None, f"At most {MAX_TICKERS} tickers per request"
+    try:
+        horizons = sorted({int(h) for h in data.get('horizons') or ()})
+        quantiles = sorted({float(q) for q in data.get('quantiles', DEFAULT_QUANTILES)})
+    except (TypeError, ValueError):
+        return None, "horizons must be integers and quantiles numbers"
+    if any(h not in HORIZONS for h in horizons):
+        return None, f"horizons must be among {', '.join(map(str, HORIZONS))}"
+    if any(not 0 < q < 1 for q in quantiles):
+        return None, "quantiles must be between 0 and 1"
+    return (tickers, horizons, quantiles), None
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# --- Configuration ---
+MAX_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+RETENTION = int(os.getenv("JOB_RETENTION", "600"))   # seconds a finished job stays queryable
+
+
+class InlineExecutor:
+    """Runs work synchronously on submit. Stand-in for the thread pool in tests (JOB_QUEUE=inline)."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class JobQueue:
+    """
+    In-process background jobs with pollable status. Each job moves through
+    pending -> running -> done | failed; finished jobs are kept for
+    `retention` seconds so clients can still poll or stream them.
+    """
+
+    def __init__(self, executor=None, retention=RETENTION):
+        self.executor = executor or ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+        self.retention = retention
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._listeners = {}   # job id -> callbacks run on every change, e.g. to wake an event loop
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues `fn(*args, **kwargs)` and returns its job id."""
+        job_id = uuid.uuid4().hex
+        with self._changed:
+            self._prune()
+            self._jobs[job_id] = {"jobId": job_id, "status": "pending", "result": None,
+                                  "error": None, "finishedAt": None}
+        self.executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finishedAt=time.monotonic())
+        else:
+            self._update(job_id, status="done", result=result, finishedAt=time.monotonic())
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            self._jobs[job_id].update(fields)
+            self._changed.notify_all()
+            listeners = list(self._listeners.get(job_id, ()))
+        for listener in listeners:
+            listener()
+
+    def add_listener(self, job_id, listener):
+        """Calls `listener()` (from the worker thread) whenever the job changes; cheap, non-blocking callbacks only."""
+        with self._changed:
+            self._listeners.setdefault(job_id, []).append(listener)
+
+    def remove_listener(self, job_id, listener):
+        with self._changed:
+            listeners = self._listeners.get(job_id, [])
+            if listener in listeners:
+                listeners.remove(listener)
+            if not listeners:
+                self._listeners.pop(job_id, None)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention
+        for job_id in [j for j, job in self._jobs.items() if job["finishedAt"] and job["finishedAt"] < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if it is unknown or expired."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return None if job is None else {k: v for k, v in job.items() if k != "finishedAt"}
+
+    def wait(self, job_id, timeout):
+        """Blocks until the job finishes or `timeout` seconds pass, then returns its snapshot."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in ("done", "failed") or remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+        return self.get(job_id)
+
+
+summary_jobs = JobQueue(executor=InlineExecutor() if os.getenv("JOB_QUEUE") == "inline" else None)
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.metrics import upstream_errors
+
+# --- Configuration ---
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "900"))         # seconds a generated answer is reused
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "10"))            # seconds a caller waits before falling back
+
+
+# --- Backends ---
+# A backend only needs `available` and `generate(prompt) -> str`.
+
+class GeminiBackend:
+    """Calls Gemini. The client is configured on first use rather than at import time."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._model = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    try:
+                        import google.generativeai as genai
+                        # This automatically finds the GOOGLE_API_KEY you set in your terminal
+                        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                        self._model = genai.GenerativeModel(self.model_name)
+                        print("✅ Gemini model initialized successfully.")
+                    except Exception as e:
+                        print(f"⚠️ Gemini API could not be configured. Check if your GOOGLE_API_KEY is set correctly. Error: {e}")
+                    self._initialized = True
+        return self._model
+
+    @property
+    def available(self):
+        return self._get_model() is not None
+
+    def generate(self, prompt):
+        return self._get_model().generate_content(prompt).text
+
+
+class FakeBackend:
+    """Deterministic local stand-in for tests and offline runs. Records every prompt it receives."""
+
+    available = True
+
+    def __init__(self, delay=0.0, responder=None):
+        self.delay = delay
+        self.responder = responder or (lambda prompt: f"[offline summary] {' '.join(prompt.split())[:120]}")
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        if self.delay:
+            time.sleep(self.delay)
+        return self.responder(prompt)
+
+
+# --- Cache Keys ---
+
+def _round_sig(value, digits=3):
+    if not value:
+        return 0.0
+    return float(f"{value:.{digits}g}")
+
+
+def summary_key(ticker, price, volatility):
+    """
+    Risk-summary prompts only differ in price and predicted volatility, so
+    nearby inputs (price to 3 significant figures, volatility to 0.5 points)
+    share one generated answer.
+    """
+    return ("summary", ticker.upper(), _round_sig(price), round(round(volatility / 0.005) * 0.005, 3))
+
+
+def recommendation_key(query, tickers):
+    return ("recommend", " ".join(query.lower().split()), tuple(sorted(t.upper() for t in tickers)))
+
+
+# --- Gateway ---
+
+class LLMGateway:
+    """
+    Bounded-concurrency front door for LLM calls. Identical keys that are in
+    flight share one backend call, finished answers are cached for
+    `cache_ttl` seconds, and callers that wait longer than `timeout` get a
+    fallback string while the call finishes (and fills the cache) in the
+    background.
+    """
+
+    def __init__(self, backend, max_concurrency=MAX_CONCURRENCY, cache_ttl=CACHE_TTL,
+                 timeout=TIMEOUT, max_entries=CACHE_MAX_ENTRIES):
+        self.backend = backend
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._cache = OrderedDict()   # key -> (expires_at, text)
+        self._inflight = {}           # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @property
+    def available(self):
+        return self.backend.available
+
+    def submit(self, key, prompt):
+        """Returns a Future for the answer to `prompt`, reusing cached or in-flight work for `key`."""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                done = Future()
+                done.set_result(entry[1])
+                return done
+            if key in self._inflight:
+                self.coalesced += 1
+                return self._inflight[key]
+            self.misses += 1
+            future = self._executor.submit(self.backend.generate, prompt)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.exception() is not None:
+                self.failures += 1
+                upstream_errors.inc(source="llm")
+                print(f"❌ LLM call failed for {key}: {future.exception()}")
+                return
+            self._cache[key] = (time.monotonic() + self.cache_ttl, future.result())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def generate(self, key, prompt, fallback, timeout=None):
+        """Blocking call with a deadline; returns `fallback` on timeout or backend error."""
+        return self.generate_many([(key, prompt)], fallback, timeout)[0]
+
+    def generate_many(self, requests, fallback, timeout=None):
+        """
+        Submits every (key, prompt) pair up front so they run concurrently, then
+        collects the answers against one shared deadline.
+        """
+        futures = [self.submit(key, prompt) for key, prompt in requests]
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeout:
+                results.append(fallback)
+            except Exception:
+                results.append(fallback)
+        return results
+
+    def invalidate(self):
+        """Drops every cached answer; in-flight calls are unaffected."""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": len(self._cache), "inflight": len(self._inflight),
+                "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "failures": self.failures,
+            }
@@ -0,0 +1,73 @@
+import sys
+import threading
+from multiprocessing import spawn
+from multiprocessing.context import SpawnContext, SpawnProcess
+
+import numpy as np
+
+if sys.platform == "win32":
+    from multiprocessing.popen_spawn_win32 import Popen as _SpawnPopen
+else:
+    from multiprocessing.popen_spawn_posix import Popen as _SpawnPopen
+
+# --- Monte Carlo Worker ---
+# Everything the process pool's workers import. It must stay free of
+# import-time side effects (numpy and the standard library only): a worker
+# that imported the app would build the Flask app, the DB engine and the
+# background threads once per process.
+
+
+def simulate_chunk(chol, mean, exposures, horizon_days, shock, df, n_paths, seed):
+    """
+    P&L of `n_paths` simulated horizons. Correlated daily log-returns come
+    from `chol`; with `df` set they are multivariate Student-t instead of
+    Gaussian, rescaled by sqrt((df - 2) / df) so the covariance stays the
+    estimated one and only the tails get fatter. Positions are revalued with
+    exp(), so the P&L is not just a rescaled normal.
+    """
+    rng = np.random.default_rng(seed)
+    draws = rng.standard_normal((n_paths, len(mean))) @ chol.T
+    if df:
+        draws *= np.sqrt((df - 2) / rng.chisquare(df, size=(n_paths, 1)))
+    log_returns = mean * horizon_days + draws * np.sqrt(horizon_days) + shock
+    return np.expm1(log_returns) @ exposures
+
+
+# --- Worker Processes ---
+# A spawned child normally re-runs the parent's __main__ first (as
+# __mp_main__), which for `python app.py` means all of app.py. The pool's
+# workers only need this module, so they are launched without that step.
+
+_launch_lock = threading.Lock()
+_preparation_data = spawn.get_preparation_data
+
+
+def _preparation_data_without_main(name):
+    data = _preparation_data(name)
+    data.pop("init_main_from_path", None)
+    data.pop("init_main_from_name", None)
+    return data
+
+
+class _Popen(_SpawnPopen):
+    def __init__(self, process_obj):
+        # The spawn launcher reads the preparation data through the module attribute
+        with _launch_lock:
+            spawn.get_preparation_data = _preparation_data_without_main
+            try:
+                super().__init__(process_obj)
+            finally:
+                spawn.get_preparation_data = _preparation_data
+
+
+class WorkerProcess(SpawnProcess):
+    _start_method = "spawn"
+
+    @staticmethod
+    def _Popen(process_obj):
+        return _Popen(process_obj)
+
+
+class WorkerContext(SpawnContext):
+    """Spawn context whose processes skip re-importing the parent's __main__."""
+    Process = WorkerProcess
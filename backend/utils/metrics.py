@@ -0,0 +1,268 @@
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+
+# --- Metrics ---
+# A small in-process registry rendered in the Prometheus text format by
+# /metrics (and by the bot's own listener, see `serve_metrics`). Everything is
+# plain counters and fixed-bucket histograms behind a lock, cheap enough to
+# stay on in production.
+PREFIX = "riskforecaster"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Opt-in profiling: PROFILE_SAMPLE_RATE=0.01 profiles ~1% of requests; with
+# PROFILE_ALLOW_HEADER=1 a request carrying `X-Profile: 1` is always profiled.
+# Profiles are written as .prof files (open with snakeviz or pstats).
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), '..', 'data', 'profiles'))
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [f'{n}="{v}"' for n, v in zip(labelnames, key)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels):
+        """{"count", "sum"} for one label set."""
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": sum(series[:-1]), "sum": series[-1]}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]:.6f}")
+        return lines
+
+
+# --- Registry ---
+
+_metrics = []
+_caches = {}    # name -> callable returning {"hits", "misses", ...}
+_registry_lock = threading.Lock()
+
+
+def counter(name, help, labelnames=()):
+    metric = Counter(name, help, labelnames)
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help, labelnames, buckets)
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def register_cache(name, stats):
+    """Exports hits/misses/hit ratio of a cache whose `stats()` returns hits and misses."""
+    with _registry_lock:
+        _caches[name] = stats
+
+
+def _render_caches():
+    with _registry_lock:
+        caches = dict(_caches)
+    samples = []
+    for name, stats in sorted(caches.items()):
+        try:
+            values = stats()
+        except Exception:
+            continue
+        total = values["hits"] + values["misses"]
+        samples.append((name, values["hits"], values["misses"], values["hits"] / total if total else 0.0))
+    lines = []
+    for metric, kind, column, help in (("cache_hits_total", "counter", 1, "Cache hits."),
+                                       ("cache_misses_total", "counter", 2, "Cache misses."),
+                                       ("cache_hit_ratio", "gauge", 3, "Lifetime cache hit ratio.")):
+        lines += [f"# HELP {PREFIX}_{metric} {help}", f"# TYPE {PREFIX}_{metric} {kind}"]
+        lines += [f'{PREFIX}_{metric}{{cache="{sample[0]}"}} {sample[column]}' for sample in samples]
+    return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    lines += _render_caches()
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Standard Metrics ---
+# Stages: fetch, features, predict, llm, db, serialize, plus bot_<stage> for bot runs.
+
+stage_seconds = histogram("stage_seconds", "Time spent per processing stage.", ["stage"])
+http_request_seconds = histogram(
+    "http_request_seconds", "Flask request latency.", ["endpoint", "method", "status"]
+)
+upstream_errors = counter("upstream_errors_total", "Failed calls to upstream providers.", ["source"])
+
+
+def timed(stage):
+    """Times a block or a function into stage_seconds{stage=...}: `with timed("fetch"):` or `@timed("fetch")`."""
+    class _Timed:
+        def __enter__(self):
+            self.started = time.perf_counter()
+            return self
+
+        def __exit__(self, *exc):
+            stage_seconds.observe(time.perf_counter() - self.started, stage=stage)
+            return False
+
+        def __call__(self, func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with timed(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+
+    return _Timed()
+
+
+def instrument_engine(engine):
+    """Times every SQL statement on `engine` into stage_seconds{stage="db"}."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        stage_seconds.observe(time.perf_counter() - started, stage="db")
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# --- Profiling ---
+
+def should_profile(header_value=None):
+    if PROFILE_ALLOW_HEADER and header_value == "1":
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def finish_profile(profiler, label):
+    """Stops `profiler` and writes it to PROFILE_DIR; returns the file path."""
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "request"
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe}-{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+# --- Standalone Exporter ---
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serves /metrics from a daemon thread, for processes without Flask (the bot)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Metrics available on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.mc_worker import WorkerContext, simulate_chunk
+from utils.portfolio_risk import price_matrix, returns_matrix
+
+# --- Configuration ---
+MAX_WORKERS = int(os.getenv("MC_WORKERS", str(os.cpu_count() or 1)))
+CHUNK_ELEMENTS = int(os.getenv("MC_CHUNK_ELEMENTS", "2000000"))   # paths x assets per chunk (~16 MB of draws)
+MAX_CHUNK_PATHS = 100_000
+MIN_ROUNDS = 2
+MAX_PATHS = 1_000_000
+
+# Shocks applied on top of the estimated mean/covariance.
+#   vol_multiplier: scales every asset's volatility
+#   correlation:    floor for every pairwise correlation
+#   shock:          instantaneous return added to every asset over the horizon
+STRESS_SCENARIOS = {
+    "baseline": {},
+    "volatility_spike": {"vol_multiplier": 2.0},
+    "correlation_breakdown": {"correlation": 0.9},
+    "market_crash": {"shock": -0.10, "vol_multiplier": 1.5, "correlation": 0.7},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """
+    Process pool shared across calls so each simulation does not pay process
+    start-up. Workers are spawned rather than forked: the web process runs
+    threads (quote hub, job workers) whose locks a fork would copy mid-flight.
+    They only import utils/mc_worker.py, never the app's __main__.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=WorkerContext())
+        return _executor
+
+
+def safe_cholesky(covariance):
+    """Cholesky factor, adding a growing diagonal jitter if the estimate is not positive definite."""
+    jitter = 0.0
+    scale = float(np.mean(np.diag(covariance))) or 1.0
+    for _ in range(8):
+        try:
+            return np.linalg.cholesky(covariance + jitter * np.eye(len(covariance)))
+        except np.linalg.LinAlgError:
+            jitter = scale * 1e-10 if jitter == 0.0 else jitter * 10
+    raise ValueError("Covariance matrix is not positive definite even after regularization.")
+
+
+def apply_scenario(mean, covariance, scenario):
+    """Returns the (mean, covariance, shock) triple for a stress scenario."""
+    vol = np.sqrt(np.diag(covariance))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = np.nan_to_num(covariance / np.outer(vol, vol))
+    if "correlation" in scenario:
+        correlation = np.maximum(correlation, scenario["correlation"])
+        np.fill_diagonal(correlation, 1.0)
+    vol = vol * scenario.get("vol_multiplier", 1.0)
+    return mean, correlation * np.outer(vol, vol), scenario.get("shock", 0.0)
+
+
+def simulate_var(exposures, mean, covariance, n_paths=100_000, horizon_days=1, confidence=0.99,
+                 workers=MAX_WORKERS, seed=None, tol=1e-3, df=None, scenario=None):
+    """
+    Monte Carlo VaR and expected shortfall for positions worth `exposures`.
+
+    Paths are generated in fixed-size chunks (bounded memory) on a process
+    pool. Chunk i is always seeded from the i-th child of `seed`'s
+    SeedSequence, so results do not depend on the worker count. Chunks are
+    dispatched one round (one per worker) at a time; once at least
+    MIN_ROUNDS have run and the VaR estimate moves by less than `tol`
+    (relative) between rounds, the remaining paths are skipped.
+    """
+    started = time.perf_counter()
+    exposures = np.asarray(exposures, dtype=float)
+    mean = np.asarray(mean, dtype=float)
+    covariance = np.atleast_2d(np.asarray(covariance, dtype=float))
+    mean, covariance, shock = apply_scenario(mean, covariance, scenario or {})
+    chol = safe_cholesky(covariance)
+
+    chunk_paths = int(max(1000, min(MAX_CHUNK_PATHS, CHUNK_ELEMENTS // max(len(mean), 1))))
+    n_chunks = -(-n_paths // chunk_paths)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(chunk_paths, n_paths - i * chunk_paths) for i in range(n_chunks)]
+    workers = max(1, min(workers, n_chunks))
+
+    pnl_chunks = []
+    previous_var = None
+    converged = False
+    next_chunk = 0
+    rounds = 0
+    while next_chunk < n_chunks:
+        batch = range(next_chunk, min(next_chunk + workers, n_chunks))
+        args = [(chol, mean, exposures, horizon_days, shock, df, sizes[i], seeds[i]) for i in batch]
+        if workers == 1:
+            pnl_chunks.extend(simulate_chunk(*a) for a in args)
+        else:
+            futures = [_get_executor(MAX_WORKERS).submit(simulate_chunk, *a) for a in args]
+            pnl_chunks.extend(f.result() for f in futures)
+        next_chunk = batch.stop
+        rounds += 1
+
+        current_var = -np.quantile(np.concatenate(pnl_chunks), 1 - confidence)
+        if (rounds >= MIN_ROUNDS and previous_var
+                and abs(current_var - previous_var) <= tol * abs(previous_var)):
+            converged = True
+            break
+        previous_var = current_var
+
+    pnl = np.concatenate(pnl_chunks)
+    cutoff = np.quantile(pnl, 1 - confidence)
+    tail = pnl[pnl <= cutoff]
+    return {
+        "var": round(float(max(-cutoff, 0.0)), 2),
+        "expectedShortfall": round(float(max(-tail.mean(), 0.0)), 2) if len(tail) else None,
+        "meanPnl": round(float(pnl.mean()), 2),
+        "confidence": confidence,
+        "horizonDays": horizon_days,
+        "paths": int(len(pnl)),
+        "chunks": len(pnl_chunks),
+        "converged": converged,
+        "elapsedSeconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_stress_tests(exposures, mean, covariance, scenarios=None, **kwargs):
+    """Runs `simulate_var` once per named scenario (defaults to every STRESS_SCENARIOS entry)."""
+    names = scenarios or list(STRESS_SCENARIOS)
+    unknown = [n for n in names if n not in STRESS_SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown stress scenario(s): {', '.join(unknown)}")
+    return {name: simulate_var(exposures, mean, covariance, scenario=STRESS_SCENARIOS[name], **kwargs)
+            for name in names}
+
+
+def parse_stress_request(data):
+    """Validates a /api/portfolio/stress body. Returns (simulate_portfolio kwargs, error message)."""
+    try:
+        paths = int(data.get('paths', 100_000))
+        horizon = int(data.get('horizon', 1))
+        confidence = float(data.get('confidence', 0.99))
+        df = None if data.get('df') is None else float(data['df'])
+        seed = None if data.get('seed') is None else int(data['seed'])
+    except (TypeError, ValueError):
+        return None, "paths, horizon, df and seed must be numbers"
+    if not 0 < paths <= MAX_PATHS:
+        return None, f"paths must be between 1 and {MAX_PATHS}"
+    if horizon < 1:
+        return None, "horizon must be at least 1 day"
+    if not 0 < confidence < 1:
+        return None, "confidence must be between 0 and 1"
+    if df is not None and not df > 2:
+        return None, "df must be greater than 2 (the Student-t variance is infinite otherwise)"
+    if seed is not None and seed < 0:
+        return None, "seed must be a non-negative integer"
+    scenarios = data.get('scenarios')
+    if scenarios is not None and (not isinstance(scenarios, list) or not all(isinstance(n, str) for n in scenarios)):
+        return None, "scenarios must be a list of scenario names"
+    return {"scenarios": scenarios, "n_paths": paths, "horizon_days": horizon,
+            "confidence": confidence, "df": df, "seed": seed}, None
+
+
+def simulate_portfolio(holdings, period="1y", scenarios=None, **kwargs):
+    """
+    Stress-tests a list of holdings (ticker, quantity) using the mean and
+    covariance of their daily log-returns over `period`.
+    """
+    prices = price_matrix([h['ticker'] for h in holdings], period=period)
+    priced = [h for h in holdings if h['ticker'] in prices.columns]
+    if not priced:
+        return {"error": "No price data available for any holding."}
+
+    tickers = [h['ticker'] for h in priced]
+    prices = prices[tickers]
+    log_returns = np.log1p(returns_matrix(prices).to_numpy())
+    if len(log_returns) < 2:
+        return {"error": "Not enough overlapping history to estimate risk."}
+
+    exposures = np.array([h['quantity'] for h in priced], dtype=float) * prices.iloc[-1].to_numpy()
+    mean = log_returns.mean(axis=0)
+    covariance = np.atleast_2d(np.cov(log_returns, rowvar=False))
+    return {
+        "marketValue": round(float(exposures.sum()), 2),
+        "scenarios": run_stress_tests(exposures, mean, covariance, scenarios=scenarios, **kwargs),
+        "missing": [h['ticker'] for h in holdings if h['ticker'] not in prices.columns],
+    }
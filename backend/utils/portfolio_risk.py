@@ -0,0 +1,131 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.price_history import get_histories
+
+TRADING_DAYS = 252
+CONFIDENCE_LEVELS = (0.95, 0.99)
+
+
+def daily_closes(hist):
+    """Close series re-indexed on naive calendar dates so NSE and US tickers line up."""
+    close = hist['Close']
+    index = close.index
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_localize(None)
+    close = pd.Series(close.to_numpy(dtype=float), index=pd.DatetimeIndex(index).normalize())
+    return close[~close.index.duplicated(keep='last')]
+
+
+def price_matrix(tickers, period="1y"):
+    """
+    One aligned (dates x tickers) close matrix for the given tickers, built
+    from a single bulk history fetch. Gaps from exchange holidays are
+    forward-filled; tickers without any data are left out.
+    """
+    histories = get_histories(tickers, period=period)
+    columns = {t: daily_closes(h) for t, h in histories.items() if h is not None and not h.empty}
+    if not columns:
+        return pd.DataFrame()
+    return pd.DataFrame(columns).sort_index().ffill()
+
+
+def returns_matrix(prices):
+    """Daily simple returns with rows dropped until every ticker has history."""
+    return prices.pct_change(fill_method=None).dropna(how='any')
+
+
+def parametric_var(mean, sigma, value, confidence):
+    """Gaussian VaR and CVaR (expected shortfall) of a position worth `value`, as positive losses."""
+    z = NormalDist().inv_cdf(confidence)
+    var = (z * sigma - mean) * value
+    cvar = (sigma * NormalDist().pdf(z) / (1 - confidence) - mean) * value
+    return max(var, 0.0), max(cvar, 0.0)
+
+
+def compute_portfolio_risk(holdings, horizon_days=1, period="1y", covariance=None):
+    """
+    Valuation and risk for a list of holdings (dicts with ticker, quantity
+    and avgBuyPrice). Everything after the price fetch is vectorized over
+    positions, so cost grows with the matrix size rather than per holding.
+    `covariance` (a daily-return covariance DataFrame, e.g. from the
+    covariance service) is used when it covers every priced holding;
+    otherwise the sample covariance over `period` is computed.
+    """
+    if not holdings:
+        return {"error": "Portfolio is empty."}
+
+    tickers = [h['ticker'] for h in holdings]
+    prices = price_matrix(tickers, period=period)
+    missing = [t for t in tickers if t not in prices.columns]
+    priced = [h for h in holdings if h['ticker'] in prices.columns]
+    if not priced:
+        return {"error": "No price data available for any holding.", "missing": missing}
+
+    tickers = [h['ticker'] for h in priced]
+    prices = prices[tickers]
+    quantity = np.array([h['quantity'] for h in priced], dtype=float)
+    avg_price = np.array([h['avgBuyPrice'] for h in priced], dtype=float)
+    last_price = prices.iloc[-1].to_numpy()
+
+    market_value = quantity * last_price
+    cost_basis = quantity * avg_price
+    pnl = market_value - cost_basis
+    total_value = market_value.sum()
+    weights = market_value / total_value if total_value else np.zeros_like(market_value)
+
+    returns = returns_matrix(prices).to_numpy()
+    if len(returns) < 2:
+        return {"error": "Not enough overlapping history to estimate risk.", "missing": missing}
+
+    mean = returns.mean(axis=0)
+    if covariance is not None and set(tickers) <= set(covariance.index):
+        covariance = covariance.loc[tickers, tickers].to_numpy()
+        covariance_source = "ewma"
+    else:
+        covariance = np.atleast_2d(np.cov(returns, rowvar=False))
+        covariance_source = "sample"
+    port_mean = float(weights @ mean) * horizon_days
+    port_sigma = float(np.sqrt(max(weights @ covariance @ weights, 0.0)))
+    horizon_sigma = port_sigma * np.sqrt(horizon_days)
+
+    # Euler decomposition: each position's share of portfolio volatility
+    marginal = covariance @ weights / port_sigma if port_sigma else np.zeros_like(weights)
+    contribution = weights * marginal
+    contribution_pct = contribution / port_sigma if port_sigma else np.zeros_like(weights)
+
+    var = {}
+    for confidence in CONFIDENCE_LEVELS:
+        value_at_risk, expected_shortfall = parametric_var(port_mean, horizon_sigma, total_value, confidence)
+        label = f"{int(confidence * 100)}"
+        var[label] = {"var": round(value_at_risk, 2), "cvar": round(expected_shortfall, 2)}
+
+    positions = [
+        {
+            "ticker": t,
+            "quantity": int(quantity[i]),
+            "lastPrice": round(float(last_price[i]), 2),
+            "marketValue": round(float(market_value[i]), 2),
+            "pnl": round(float(pnl[i]), 2),
+            "pnlPercent": round(float(pnl[i] / cost_basis[i] * 100), 2) if cost_basis[i] else None,
+            "weight": round(float(weights[i]), 4),
+            "volatility": round(float(np.sqrt(covariance[i, i] * TRADING_DAYS)), 3),
+            "riskContribution": round(float(contribution_pct[i]), 4),
+        }
+        for i, t in enumerate(tickers)
+    ]
+
+    return {
+        "marketValue": round(float(total_value), 2),
+        "costBasis": round(float(cost_basis.sum()), 2),
+        "pnl": round(float(pnl.sum()), 2),
+        "volatility": round(port_sigma * np.sqrt(TRADING_DAYS), 3),
+        "horizonDays": horizon_days,
+        "valueAtRisk": var,
+        "observations": len(returns),
+        "covarianceSource": covariance_source,
+        "positions": positions,
+        "missing": missing,
+    }
@@ -0,0 +1,279 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from utils.price_store import StoreFetcher, get_store
+from utils.upstream import get_scheduler
+
+# --- Configuration ---
+# Every OHLCV lookup in the backend goes through this module, so the same
+# (ticker, period, interval) frame is only pulled from Yahoo once per TTL.
+MAX_ENTRIES = int(os.getenv("PRICE_CACHE_MAX_ENTRIES", "512"))
+OPEN_TTL_DAILY = int(os.getenv("PRICE_CACHE_OPEN_TTL", "60"))            # seconds, market open, daily bars
+OPEN_TTL_INTRADAY = int(os.getenv("PRICE_CACHE_INTRADAY_TTL", "15"))     # seconds, market open, intraday bars
+CLOSED_TTL_MAX = int(os.getenv("PRICE_CACHE_CLOSED_TTL_MAX", "21600"))   # never hold a frame longer than 6h
+REPLAY_DIR = os.getenv("PRICE_HISTORY_REPLAY_DIR")
+USE_STORE = os.getenv("PRICE_STORE", "on") != "off"
+
+INTRADAY_INTERVALS = {"1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"}
+
+# Regular trading session per exchange: (timezone, open, close)
+MARKET_HOURS = {
+    "NSE": (ZoneInfo("Asia/Kolkata"), dtime(9, 15), dtime(15, 30)),
+    "US": (ZoneInfo("America/New_York"), dtime(9, 30), dtime(16, 0)),
+}
+NSE_INDICES = {"^NSEI", "^BSESN", "^NSEBANK", "^CNXIT"}
+
+
+def market_for(ticker):
+    """Maps a Yahoo symbol to the exchange whose hours drive its cache TTL."""
+    ticker = ticker.upper()
+    if ticker.endswith((".NS", ".BO")) or ticker in NSE_INDICES:
+        return "NSE"
+    return "US"
+
+
+def is_market_open(market, now=None):
+    tz, open_at, close_at = MARKET_HOURS[market]
+    local = (now or datetime.now(tz)).astimezone(tz)
+    return local.weekday() < 5 and open_at <= local.time() < close_at
+
+
+def seconds_until_open(market, now=None):
+    """Seconds until the next regular session opens (0 if it is open now)."""
+    tz, open_at, _ = MARKET_HOURS[market]
+    local = (now or datetime.now(tz)).astimezone(tz)
+    if is_market_open(market, local):
+        return 0
+    candidate = local.replace(hour=open_at.hour, minute=open_at.minute, second=0, microsecond=0)
+    if candidate <= local:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return (candidate - local).total_seconds()
+
+
+def last_closed_session(market, now=None):
+    """Date of the latest regular session that has closed (weekends skipped; holidays aren't known)."""
+    tz, _, close_at = MARKET_HOURS[market]
+    local = (now or datetime.now(tz)).astimezone(tz)
+    day = local.date() if local.time() >= close_at else local.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def store_is_current(ticker, interval, last_ts, now=None):
+    """
+    True when stored daily bars ending at `last_ts` (a session date in ns)
+    already hold the exchange's latest closed session and it hasn't opened
+    again, so an upstream pull can't add anything.
+    """
+    if interval != "1d":
+        return False
+    market = market_for(ticker)
+    if is_market_open(market, now):
+        return False
+    return pd.Timestamp(int(last_ts)).date() >= last_closed_session(market, now)
+
+
+def ttl_for(ticker, interval="1d", now=None):
+    """
+    How long a freshly fetched frame stays valid. While the exchange is open
+    the latest bar keeps moving, so frames expire quickly; once it closes
+    nothing changes until the next open.
+    """
+    market = market_for(ticker)
+    if is_market_open(market, now):
+        return OPEN_TTL_INTRADAY if interval in INTRADAY_INTERVALS else OPEN_TTL_DAILY
+    return max(OPEN_TTL_DAILY, min(CLOSED_TTL_MAX, seconds_until_open(market, now)))
+
+
+# --- Fetchers ---
+# A fetcher is any callable `fetcher(tickers, period, interval, start=None)`
+# returning a dict of ticker -> OHLCV DataFrame; `start` (a date string)
+# replaces `period` for incremental pulls. Swap one in with `set_fetcher` to
+# replay recorded data in tests or offline runs.
+
+class YFinanceFetcher:
+    """
+    Pulls history from Yahoo Finance through the process-wide upstream
+    scheduler (utils/upstream.py): rate-limited, retried, and batched with
+    concurrent requests from other callers.
+    """
+
+    def __call__(self, tickers, period, interval, start=None):
+        return get_scheduler()(tickers, period, interval, start=start)
+
+
+def _recording_path(directory, ticker, period, interval):
+    safe = ticker.replace("^", "_").replace("/", "_")
+    return os.path.join(directory, f"{safe}_{period}_{interval}.csv")
+
+
+class ReplayFetcher:
+    """
+    Serves history from CSV files previously written by `RecordingFetcher`
+    (or by hand). Looks for `<ticker>_<period>_<interval>.csv` first and
+    falls back to `<ticker>.csv`; unknown tickers come back empty.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _load(self, ticker, period, interval):
+        exact = _recording_path(self.directory, ticker, period, interval)
+        generic = os.path.join(self.directory, ticker.replace("^", "_").replace("/", "_") + ".csv")
+        for path in (exact, generic):
+            if os.path.exists(path):
+                return pd.read_csv(path, index_col=0, parse_dates=True)
+        return pd.DataFrame()
+
+    def __call__(self, tickers, period, interval, start=None):
+        return {ticker: self._load(ticker, period, interval) for ticker in tickers}
+
+
+class RecordingFetcher:
+    """Wraps another fetcher and writes every frame it returns to `directory` for later replay."""
+
+    def __init__(self, inner, directory):
+        self.inner = inner
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, tickers, period, interval, start=None):
+        frames = self.inner(tickers, period, interval, start=start)
+        for ticker, frame in frames.items():
+            if not frame.empty:
+                frame.to_csv(_recording_path(self.directory, ticker, period or f"since{start}", interval))
+        return frames
+
+
+# --- Cache ---
+
+class PriceHistoryCache:
+    """
+    Thread-safe, bounded LRU of OHLCV frames keyed by (ticker, period, interval).
+    Returned frames are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, fetcher=None, max_entries=MAX_ENTRIES, ttl=ttl_for):
+        self.fetcher = fetcher or YFinanceFetcher()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, frame)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, frame = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return frame
+
+    def _store(self, key, frame, now):
+        ticker, _, interval = key
+        self._entries[key] = (now + self.ttl(ticker, interval), frame)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, tickers, period="1y", interval="1d"):
+        """Returns {ticker: frame}, fetching every miss in a single fetcher call."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for ticker in dict.fromkeys(tickers):
+                frame = self._lookup((ticker, period, interval), now)
+                if frame is None:
+                    missing.append(ticker)
+                else:
+                    found[ticker] = frame
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            fetched = self.fetcher(missing, period, interval)
+            now = time.monotonic()
+            with self._lock:
+                for ticker in missing:
+                    frame = fetched.get(ticker)
+                    if frame is None:
+                        frame = pd.DataFrame()
+                    self._store((ticker, period, interval), frame, now)
+                    found[ticker] = frame
+        return found
+
+    def get(self, ticker, period="1y", interval="1d"):
+        return self.get_many([ticker], period, interval)[ticker]
+
+    def invalidate(self, ticker=None):
+        with self._lock:
+            if ticker is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == ticker]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def _default_fetcher():
+    if REPLAY_DIR:
+        return ReplayFetcher(REPLAY_DIR)
+    if USE_STORE:
+        # Serve from the on-disk store and only pull bars newer than what it holds
+        return StoreFetcher(get_store(), YFinanceFetcher(), is_current=store_is_current)
+    return YFinanceFetcher()
+
+
+_cache = PriceHistoryCache(fetcher=_default_fetcher())
+
+
+def get_history(ticker, period="1y", interval="1d"):
+    """Cached equivalent of `yf.Ticker(ticker).history(period=..., interval=...)`."""
+    return _cache.get(ticker, period, interval)
+
+
+def get_histories(tickers, period="1y", interval="1d"):
+    """Cached equivalent of a bulk `yf.download`, returned as {ticker: frame}."""
+    return _cache.get_many(tickers, period, interval)
+
+
+def fetch_histories(tickers, period="1y", interval="1d"):
+    """
+    Uncached bulk pull for batch jobs over large universes (e.g. the
+    screener): same fetcher as `get_histories`, so it still reads through
+    the price store, but it doesn't evict the shared LRU's hot entries.
+    """
+    fetched = _cache.fetcher(list(dict.fromkeys(tickers)), period, interval)
+    return {t: frame for t, frame in fetched.items() if frame is not None}
+
+
+def set_fetcher(fetcher):
+    """Replaces the upstream fetcher (e.g. with a ReplayFetcher) and drops cached frames."""
+    _cache.fetcher = fetcher
+    _cache.invalidate()
+
+
+def get_cache():
+    return _cache
@@ -0,0 +1,349 @@
+import json
+import os
+import re
+import shutil
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# --- Configuration ---
+# One directory per (interval, ticker) holding one raw little-endian file per
+# column. Files are only ever appended to (or have their last bars rewritten),
+# so reads are plain memory maps and a 15y history is a few page faults away.
+STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(os.path.dirname(__file__), '..', 'data', 'store'))
+INITIAL_PERIOD = os.getenv("PRICE_STORE_INITIAL_PERIOD", "max")
+# Yahoo only serves limited history for intraday bars
+INTRADAY_INITIAL_PERIODS = {"1m": "7d", "2m": "60d", "5m": "60d", "15m": "60d", "30m": "60d",
+                            "90m": "60d", "60m": "730d", "1h": "730d"}
+ADJUSTMENT_TOLERANCE = 1e-6
+# Bars of these intervals are keyed by session date (stored as UTC midnight of
+# that date) rather than by instant: Ticker.history stamps them at exchange
+# midnight, yf.download strips the timezone, and both must land on one key.
+SESSION_INTERVALS = {"1d", "5d", "1wk", "1mo", "3mo"}
+
+# file name -> (frame column, dtype)
+COLUMNS = {
+    "ts": (None, np.dtype("<i8")),          # bar timestamp, ns since epoch (UTC)
+    "open": ("Open", np.dtype("<f8")),
+    "high": ("High", np.dtype("<f8")),
+    "low": ("Low", np.dtype("<f8")),
+    "close": ("Close", np.dtype("<f8")),
+    "volume": ("Volume", np.dtype("<f8")),
+}
+
+
+def _to_ns(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    index = index.tz_convert("UTC")
+    if hasattr(index, "as_unit"):
+        index = index.as_unit("ns")
+    return index.asi8
+
+
+def _bar_ns(index, interval):
+    """Storage keys for bar timestamps: session dates for daily and longer bars, instants otherwise."""
+    if interval not in SESSION_INTERVALS:
+        return _to_ns(index)
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return _to_ns(index.normalize())
+
+
+def _period_filter(period, index):
+    """
+    Boolean mask selecting a yfinance-style period ("5d", "3mo", "1y", "ytd",
+    "max") from a tz-aware index. "Nd" means the last N trading sessions, as
+    it does upstream, so "2d" of daily bars is always two bars.
+    """
+    if period in (None, "max") or len(index) == 0:
+        return np.ones(len(index), dtype=bool)
+    now = pd.Timestamp.now(tz=index.tz)
+    if period == "ytd":
+        return index >= pd.Timestamp(year=now.year, month=1, day=1, tz=index.tz)
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not match:
+        raise ValueError(f"Unsupported period '{period}'")
+    n, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        dates = index.normalize()
+        sessions = dates.unique()
+        return dates >= sessions[-min(n, len(sessions))]
+    offset = {"wk": pd.DateOffset(weeks=n), "mo": pd.DateOffset(months=n), "y": pd.DateOffset(years=n)}[unit]
+    return index >= now - offset
+
+
+class PriceStore:
+    """On-disk, append-only columnar OHLCV store keyed by (ticker, interval)."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._thread_locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def _dir(self, ticker, interval):
+        safe = ticker.replace("^", "_").replace("/", "_")
+        return os.path.join(self.root, interval, safe)
+
+    @contextmanager
+    def _locked(self, ticker, interval, shared=False):
+        """Thread lock plus an flock on the ticker directory, so gunicorn workers and the bot can share a store."""
+        directory = self._dir(ticker, interval)
+        os.makedirs(directory, exist_ok=True)
+        with self._guard:
+            thread_lock = self._thread_locks[directory]
+        with thread_lock:
+            if fcntl is None:
+                yield directory
+                return
+            with open(os.path.join(directory, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield directory
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _rows(directory):
+        sizes = []
+        for name, (_, dtype) in COLUMNS.items():
+            path = os.path.join(directory, f"{name}.bin")
+            if not os.path.exists(path):
+                return 0
+            sizes.append(os.path.getsize(path) // dtype.itemsize)
+        # A crash mid-append can leave columns uneven; only whole rows count
+        return min(sizes)
+
+    @staticmethod
+    def _meta(directory):
+        path = os.path.join(directory, "meta.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _legacy(self, ticker, interval):
+        """True for daily bars written before they were keyed by session date; these need a rebuild."""
+        if interval not in SESSION_INTERVALS:
+            return False
+        directory = self._dir(ticker, interval)
+        return self._rows(directory) > 0 and self._meta(directory).get("keys") != "session"
+
+    # --- Reads ---
+
+    def read_arrays(self, ticker, interval="1d", start=None, end=None):
+        """
+        Zero-copy column views (numpy memmaps) for bars in [start, end].
+        Views stay valid until the ticker's trailing bars are next rewritten,
+        so copy anything that needs to be kept around.
+        """
+        directory = self._dir(ticker, interval)
+        rows = self._rows(directory)
+        if rows == 0:
+            return {}
+        arrays = {
+            name: np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+            for name, (_, dtype) in COLUMNS.items()
+        }
+        ts = arrays["ts"]
+        lo = int(np.searchsorted(ts, _bar_ns([pd.Timestamp(start)], interval)[0], "left")) if start is not None else 0
+        hi = int(np.searchsorted(ts, _bar_ns([pd.Timestamp(end)], interval)[0], "right")) if end is not None else rows
+        return {name: array[lo:hi] for name, array in arrays.items()}
+
+    def read(self, ticker, interval="1d", period=None, start=None, end=None, copy=True):
+        """Stored bars as a yfinance-shaped DataFrame in the ticker's exchange timezone."""
+        with self._locked(ticker, interval, shared=True) as directory:
+            arrays = self.read_arrays(ticker, interval, start, end)
+            if not arrays:
+                return pd.DataFrame()
+            tz = self._meta(directory).get("tz", "UTC")
+            if interval in SESSION_INTERVALS:
+                # Session dates come back at midnight in the exchange timezone, like Ticker.history
+                index = pd.to_datetime(np.asarray(arrays["ts"])).tz_localize(tz)
+            else:
+                index = pd.to_datetime(np.asarray(arrays["ts"]), utc=True).tz_convert(tz)
+            mask = _period_filter(period, index)
+            frame = pd.DataFrame(
+                {column: (np.array(arrays[name][mask]) if copy else arrays[name][mask])
+                 for name, (column, _) in COLUMNS.items() if column},
+                index=index[mask],
+            )
+        return frame
+
+    def last_timestamps(self, ticker, interval="1d", n=2):
+        arrays = self.read_arrays(ticker, interval)
+        return np.array(arrays["ts"][-n:]) if arrays else np.array([], dtype=np.int64)
+
+    # --- Writes ---
+
+    def write(self, ticker, interval, frame, replace=False):
+        """
+        Appends the bars in `frame` that are not already stored. Overlapping
+        bars replace the stored ones with the same timestamp (the last bar of
+        an open session keeps changing); stored bars the frame has no bar
+        for are kept, so a gap upstream never deletes history. Returns False without writing if an overlapping, already
+        complete bar changed price, i.e. Yahoo re-adjusted the history for a
+        split or dividend, or if the stored daily bars predate session-date
+        keys; either way the ticker needs a full rebuild.
+        """
+        frame = frame[frame["Close"].notna()] if not frame.empty else frame
+        if frame.empty and not replace:
+            return True
+        if not replace and self._legacy(ticker, interval):
+            return False
+        incoming_ts = _bar_ns(frame.index, interval)
+        # A session quoted twice (e.g. stamped on both sides of midnight UTC) keeps its latest bar
+        _, last = np.unique(incoming_ts[::-1], return_index=True)
+        frame = frame.iloc[len(frame) - 1 - last]
+        incoming_ts = incoming_ts[len(incoming_ts) - 1 - last]
+        order = np.argsort(incoming_ts, kind="stable")
+
+        with self._locked(ticker, interval) as directory:
+            if replace:
+                for name in COLUMNS:
+                    path = os.path.join(directory, f"{name}.bin")
+                    if os.path.exists(path):
+                        os.remove(path)
+            rows = self._rows(directory)
+            incoming = {"ts": incoming_ts[order]}
+            for name, (column, _) in COLUMNS.items():
+                if column:
+                    incoming[name] = (frame[column].to_numpy(dtype=float)[order] if column in frame
+                                      else np.full(len(order), np.nan))
+
+            keep = rows
+            merged = incoming
+            if rows:
+                stored = self.read_arrays(ticker, interval)
+                stored_ts = stored["ts"]
+                keep = int(np.searchsorted(stored_ts, incoming["ts"][0], "left"))
+                overlap_ts = np.array(stored_ts[keep:rows - 1])
+                if len(overlap_ts):
+                    positions = np.searchsorted(incoming["ts"], overlap_ts)
+                    positions = np.clip(positions, 0, len(order) - 1)
+                    matched = incoming["ts"][positions] == overlap_ts
+                    stored_close = np.array(stored["close"][keep:rows - 1])
+                    change = np.abs(incoming["close"][positions] - stored_close)
+                    drift = change > ADJUSTMENT_TOLERANCE * np.abs(stored_close)
+                    if np.any(matched & drift):
+                        return False
+                # Merge by timestamp: stored bars the incoming frame skips (an upstream gap) stay put
+                tail_ts = np.array(stored_ts[keep:rows])
+                kept = ~np.isin(tail_ts, incoming["ts"])
+                if kept.any():
+                    combined = {name: np.concatenate([np.array(stored[name][keep:rows])[kept], incoming[name]])
+                                for name in COLUMNS}
+                    merge_order = np.argsort(combined["ts"], kind="stable")
+                    merged = {name: values[merge_order] for name, values in combined.items()}
+                del stored, stored_ts
+
+            for name, (_, dtype) in COLUMNS.items():
+                path = os.path.join(directory, f"{name}.bin")
+                if keep < rows:
+                    os.truncate(path, keep * dtype.itemsize)
+                with open(path, "ab") as f:
+                    f.write(np.ascontiguousarray(merged[name], dtype=dtype).tobytes())
+
+            if replace or rows == 0:
+                tz = getattr(frame.index, "tz", None)
+                meta = {"tz": str(tz) if tz is not None else "UTC"}
+                if interval in SESSION_INTERVALS:
+                    meta["keys"] = "session"
+                with open(os.path.join(directory, "meta.json"), "w") as f:
+                    json.dump(meta, f)
+        return True
+
+    def initial_period(self, interval):
+        return INTRADAY_INITIAL_PERIODS.get(interval, INITIAL_PERIOD)
+
+    def update_many(self, tickers, interval, upstream):
+        """
+        Brings every ticker up to date with as few bulk upstream calls as
+        possible: a full backfill for tickers with nothing stored (or stored
+        under the old daily keys), one incremental pull per distinct start
+        date (the day before each ticker's second-to-last stored bar) for the
+        rest, and a rebuild for any ticker whose history was re-adjusted
+        upstream. Grouping by start keeps one stale ticker from dragging the
+        whole batch back to its date.
+        """
+        rebuild, by_start = [], defaultdict(list)
+        for ticker in tickers:
+            ts = self.last_timestamps(ticker, interval)
+            if len(ts) < 2 or self._legacy(ticker, interval):
+                rebuild.append(ticker)
+            else:
+                start = pd.Timestamp(ts[0], tz="UTC").normalize() - pd.Timedelta(days=1)
+                by_start[start.strftime("%Y-%m-%d")].append(ticker)
+
+        for start, group in sorted(by_start.items()):
+            frames = upstream(group, None, interval, start=start)
+            for ticker, frame in frames.items():
+                if frame is not None and not frame.empty and not self.write(ticker, interval, frame):
+                    print(f"♻️ {ticker} history was re-adjusted upstream; rebuilding.")
+                    rebuild.append(ticker)
+
+        if rebuild:
+            frames = upstream(rebuild, self.initial_period(interval), interval)
+            for ticker, frame in frames.items():
+                if frame is not None and not frame.empty:
+                    self.write(ticker, interval, frame, replace=True)
+
+    def delete(self, ticker, interval="1d"):
+        shutil.rmtree(self._dir(ticker, interval), ignore_errors=True)
+
+
+class StoreFetcher:
+    """
+    Price-history fetcher that answers from the local store, asking `upstream`
+    only for bars newer than what is stored. `is_current(ticker, interval,
+    last_ts)` says when the stored bars can't have anything newer yet (e.g.
+    the exchange's latest session is stored and it is closed); those tickers
+    skip the upstream pull. If the upstream is down or slow and errors out,
+    the stored bars are served as they are.
+    """
+
+    def __init__(self, store, upstream, is_current=None):
+        self.store = store
+        self.upstream = upstream
+        self.is_current = is_current
+
+    def _stale(self, tickers, interval):
+        if self.is_current is None:
+            return list(tickers)
+        stale = []
+        for ticker in tickers:
+            ts = self.store.last_timestamps(ticker, interval, n=1)
+            if not len(ts) or self.store._legacy(ticker, interval) or not self.is_current(ticker, interval, ts[-1]):
+                stale.append(ticker)
+        return stale
+
+    def __call__(self, tickers, period, interval, start=None):
+        try:
+            stale = self._stale(tickers, interval)
+            if stale:
+                self.store.update_many(stale, interval, self.upstream)
+        except Exception as e:
+            print(f"⚠️ Could not refresh price store from upstream, serving stored bars: {e}")
+        return {ticker: self.store.read(ticker, interval, period=period, start=start) for ticker in tickers}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore()
+        return _store
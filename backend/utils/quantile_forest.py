@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+# --- Quantile Regression Forest ---
+# Meinshausen (2006): a random forest's leaves already partition the training
+# targets, so the predictive distribution at x is the average over trees of
+# the empirical distribution of the training targets in x's leaf. Each leaf's
+# targets are summarized by LEAF_POINTS evenly spaced quantiles, kept in one
+# (total nodes x LEAF_POINTS) array indexed by the global node ids the compact
+# model uses (tree t's nodes start at the sum of the earlier trees' counts).
+LEAF_POINTS = 101
+LEAF_LEVELS = np.linspace(0, 1, LEAF_POINTS)
+
+
+def node_offsets(forest):
+    """First global node id of each tree of a fitted RandomForestRegressor."""
+    counts = np.array([estimator.tree_.node_count for estimator in forest.estimators_])
+    return np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+
+
+def forest_leaves(forest, scaled):
+    """Global leaf id of every sample in every tree, shape (n_samples, n_trees)."""
+    # sklearn trees compare float32 inputs, as RandomForestRegressor.predict does
+    scaled = np.asarray(scaled, dtype=np.float32)
+    local = np.column_stack([estimator.apply(scaled) for estimator in forest.estimators_])
+    return local + node_offsets(forest)
+
+
+def leaf_targets(forest, scaled, y):
+    """
+    The training targets that land in each leaf, as LEAF_POINTS quantiles per
+    node (NaN rows for split nodes). `scaled` is the training matrix the
+    forest was fitted on, after the pipeline's scaler.
+    """
+    leaves = forest_leaves(forest, scaled)
+    y = np.asarray(y, dtype=np.float64)
+    total = sum(estimator.tree_.node_count for estimator in forest.estimators_)
+    targets = np.full((total, LEAF_POINTS), np.nan)
+    for column in leaves.T:
+        order = np.argsort(column, kind='stable')
+        nodes, starts = np.unique(column[order], return_index=True)
+        for node, group in zip(nodes, np.split(y[order], starts[1:])):
+            targets[node] = np.quantile(group, LEAF_LEVELS)
+    return targets
+
+
+def leaf_targets_path(model_path):
+    """Where a pickled pipeline's leaf targets live: `<model>_leaf_targets.npy` next to it."""
+    return os.path.splitext(model_path)[0] + "_leaf_targets.npy"
+
+
+def load_leaf_targets(path):
+    """Memory-maps saved leaf targets, or None if the model was trained without them."""
+    try:
+        return np.load(path, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+
+
+def predictive_quantiles(targets, leaves, levels):
+    """
+    Quantiles of the forest's predictive distribution for each sample, shape
+    (n_samples, len(levels)). Every tree weighs equally and every stored point
+    equally within its leaf, so the mixture's quantiles are plain quantiles of
+    the pooled points.
+    """
+    pooled = np.asarray(targets[leaves.ravel()]).reshape(len(leaves), -1)
+    return np.quantile(pooled, levels, axis=1).T
@@ -0,0 +1,47 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# --- Query Counting ---
+# Counts SQL statements sent through an engine so N+1 regressions show up as
+# numbers: wrap a request or bot run in `assert_max_queries(engine, n)` in a
+# test or benchmark, or set DEBUG_QUERY_COUNT=1 to get an X-Query-Count header
+# on every API response.
+
+
+class QueryCounter:
+    """Counts statements executed on `engine` by the current thread while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
+        self._thread = threading.get_ident()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        return False
+
+
+class TooManyQueries(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    """Fails with the offending statements if the block runs more than `limit` queries."""
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(counter.statements))
+        raise TooManyQueries(f"Expected at most {limit} queries, got {counter.count}:\n{listing}")
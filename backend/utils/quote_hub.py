@@ -0,0 +1,228 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from utils.metrics import upstream_errors
+from utils.price_history import YFinanceFetcher
+
+# --- Configuration ---
+REFRESH_SECONDS = float(os.getenv("QUOTE_REFRESH_SECONDS", "15"))
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+# --- Feeds ---
+# A feed is a callable `feed(tickers) -> {ticker: quote}` where a quote is a
+# dict with price, previousClose, open, high, low, volume and day (the ISO
+# date of the session the price belongs to).
+
+class YFinanceQuoteFeed:
+    """Latest quotes for the whole universe from one bulk two-day download."""
+
+    def __init__(self):
+        self.fetcher = YFinanceFetcher()
+
+    def __call__(self, tickers):
+        quotes = {}
+        for ticker, hist in self.fetcher(list(tickers), "2d", "1d").items():
+            if hist is None or len(hist) < 2:
+                continue
+            latest = hist.iloc[-1]
+            quotes[ticker] = {
+                "price": round(float(latest['Close']), 2),
+                "previousClose": round(float(hist['Close'].iloc[-2]), 2),
+                "open": round(float(latest['Open']), 2),
+                "high": round(float(latest['High']), 2),
+                "low": round(float(latest['Low']), 2),
+                "volume": int(latest['Volume']),
+                "day": pd.Timestamp(hist.index[-1]).date().isoformat(),
+            }
+        return quotes
+
+
+class SimulatedQuoteFeed:
+    """Seeded random-walk quotes for tests and offline runs (QUOTE_FEED=simulated)."""
+
+    def __init__(self, seed=0, start_price=1000.0, step=0.002):
+        self.rng = random.Random(seed)
+        self.start_price = start_price
+        self.step = step
+        self.prices = {}
+        self.calls = 0
+
+    def __call__(self, tickers):
+        self.calls += 1
+        quotes = {}
+        for ticker in tickers:
+            previous = self.prices.get(ticker, self.start_price)
+            price = round(previous * (1 + self.rng.gauss(0, self.step)), 2)
+            self.prices[ticker] = price
+            quotes[ticker] = {
+                "price": price, "previousClose": round(self.start_price, 2),
+                "open": round(self.start_price, 2), "high": max(price, self.start_price),
+                "low": min(price, self.start_price), "volume": self.rng.randint(1_000, 1_000_000),
+                "day": date.today().isoformat(),
+            }
+        return quotes
+
+
+def format_ticker_item(ticker, quote):
+    """The /api/ticker-data row shape the StockTicker component renders."""
+    change = quote["price"] - quote["previousClose"]
+    change_percent = round(change / quote["previousClose"] * 100, 2) if quote["previousClose"] else 0.0
+    return {
+        "name": ticker,
+        "value": f"{quote['price']:,.2f}",
+        "change": f"{change_percent:+.2f}%",
+        "isNegative": bool(change < 0),
+    }
+
+
+# --- Subscribers ---
+
+class AsyncSubscriber(queue.Queue):
+    """
+    A subscriber queue for asyncio consumers. The hub fills it from its
+    refresh thread exactly like a plain queue (same bound, same slow-client
+    handling); every put wakes the event loop, so the consumer awaits the
+    next message without parking a thread.
+    """
+
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        super().__init__(maxsize)
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass   # the consumer's loop is gone; it unsubscribes on its way out
+
+    async def next(self, timeout):
+        """The next message, or raises asyncio.TimeoutError after `timeout` seconds without one."""
+        while True:
+            self._ready.clear()
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            await asyncio.wait_for(self._ready.wait(), timeout)
+
+
+# --- Hub ---
+
+class QuoteHub:
+    """
+    Owns the quoted ticker universe and refreshes it with one feed call per
+    cycle on a background thread. HTTP handlers read the in-memory snapshot
+    and stream subscribers receive only the quotes that changed, so upstream
+    traffic is independent of how many clients are connected.
+    """
+
+    def __init__(self, feed, universe=(), refresh_seconds=REFRESH_SECONDS):
+        self.feed = feed
+        self.refresh_seconds = refresh_seconds
+        self._universe = list(dict.fromkeys(universe))
+        self._snapshot = {}
+        self._version = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add_tickers(self, tickers):
+        with self._lock:
+            for ticker in tickers:
+                if ticker not in self._universe:
+                    self._universe.append(ticker)
+
+    def refresh(self):
+        """Runs one refresh cycle and returns the changed quotes."""
+        with self._lock:
+            universe = list(self._universe)
+        try:
+            quotes = self.feed(universe)
+        except Exception as e:
+            upstream_errors.inc(source="quotes")
+            print(f"❌ Quote refresh failed: {e}")
+            return {}
+
+        with self._lock:
+            diff = {t: q for t, q in quotes.items() if self._snapshot.get(t) != q}
+            if not diff:
+                return diff
+            self._snapshot.update(diff)
+            self._version += 1
+            message = {"version": self._version, "quotes": diff}
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.put_nowait(("quotes", message))
+                except queue.Full:
+                    # A slow client gets a full snapshot instead of an ever-growing backlog
+                    self._drain(subscriber)
+                    subscriber.put_nowait(("snapshot", {"version": self._version, "quotes": dict(self._snapshot)}))
+        return diff
+
+    @staticmethod
+    def _drain(subscriber):
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                return
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.refresh()
+            self._stop.wait(max(0.0, self.refresh_seconds - (time.monotonic() - started)))
+
+    def ensure_started(self):
+        """Starts the refresh thread once; the first cycle runs inline so the snapshot is never empty."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="quote-hub", daemon=True)
+        self.refresh()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        with self._lock:
+            return self._version, dict(self._snapshot)
+
+    def get(self, ticker):
+        with self._lock:
+            return self._snapshot.get(ticker)
+
+    def subscribe(self, subscriber=None):
+        """
+        A queue (`subscriber`, or a new bounded one) that first receives the
+        full snapshot, then ("quotes", diff) messages.
+        """
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            subscriber.put_nowait(("snapshot", {"version": self._version, "quotes": dict(self._snapshot)}))
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+def _default_feed():
+    return SimulatedQuoteFeed() if os.getenv("QUOTE_FEED") == "simulated" else YFinanceQuoteFeed()
+
+
+quote_hub = QuoteHub(_default_feed())
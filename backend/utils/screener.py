@@ -0,0 +1,401 @@
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.analyzer import aligned_closes, get_pipeline
+from utils.features import latest_features
+from utils.price_history import fetch_histories
+from utils.upstream import UpstreamError
+
+# --- Configuration ---
+# The universe is one ticker per line in SCREENER_UNIVERSE_FILE (blank lines
+# and # comments ignored); without one, the NSE large caps below are used.
+UNIVERSE_FILE = os.getenv("SCREENER_UNIVERSE_FILE")
+BENCHMARK = os.getenv("SCREENER_BENCHMARK", "^NSEI")
+CHUNK_SIZE = int(os.getenv("SCREENER_CHUNK_SIZE", "200"))               # tickers per bulk fetch
+REFRESH_SECONDS = int(os.getenv("SCREENER_REFRESH_SECONDS", "900"))
+# SCREENER_REFRESH=off makes this process a reader: it reloads the metrics file
+# written by another process (e.g. the bot) instead of computing them itself.
+REFRESH_ENABLED = os.getenv("SCREENER_REFRESH", "on") != "off"
+METRICS_PATH = os.getenv(
+    "SCREENER_METRICS_PATH", os.path.join(os.path.dirname(__file__), '..', 'data', 'screener', 'metrics.npz')
+)
+
+NSE_TICKERS = [
+    "RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS", "ICICIBANK.NS", "SBIN.NS",
+    "BHARTIARTL.NS", "HINDUNILVR.NS", "ITC.NS", "LT.NS", "ASIANPAINT.NS", "BAJFINANCE.NS",
+    "AXISBANK.NS", "HCLTECH.NS", "WIPRO.NS", "KOTAKBANK.NS", "MARUTI.NS", "SUNPHARMA.NS",
+    "TITAN.NS", "ULTRACEMCO.NS", "TECHM.NS", "ONGC.NS", "POWERGRID.NS", "TATASTEEL.NS",
+    "JSWSTEEL.NS", "ADANIENT.NS", "ADANIPORTS.NS", "COALINDIA.NS", "BPCL.NS", "NTPC.NS"
+]
+
+# Screenable metrics: query/column name -> response field
+FIELDS = {
+    "last_price": "lastPrice",
+    "open_price": "openPrice",
+    "change_pct": "changePct",
+    "hist_vol": "historicalVolatility",
+    "sharpe": "sharpeRatio",
+    "predicted_vol": "predictedVolatility",
+    "max_drawdown": "maxDrawdown",
+    "beta": "beta",
+}
+_ALIASES = {**{f: f for f in FIELDS}, **{v.lower(): k for k, v in FIELDS.items()}}
+
+
+def load_universe(path=UNIVERSE_FILE):
+    if not path:
+        return list(NSE_TICKERS)
+    with open(path) as f:
+        tickers = [line.split('#')[0].strip() for line in f]
+    return list(dict.fromkeys(t for t in tickers if t))
+
+
+# --- Metrics ---
+
+def _daily_close(hist, column='Close'):
+    close = hist[column].dropna()
+    if getattr(close.index, 'tz', None) is not None:
+        close.index = close.index.tz_localize(None)
+    close.index = close.index.normalize()
+    return close[~close.index.duplicated(keep='last')]
+
+
+def compute_metrics(histories, benchmark=None):
+    """
+    Screener metrics for every ticker in {ticker: 1y OHLCV frame}, computed
+    column-wise over one wide frame. Returns {field: array} aligned with the
+    returned ticker list; metrics that can't be computed are NaN.
+    """
+    tickers = [t for t, h in histories.items() if h is not None and not h.empty]
+    if not tickers:
+        return [], {}
+    closes = pd.concat({t: _daily_close(histories[t]) for t in tickers}, axis=1).sort_index()
+    returns = closes.pct_change(fill_method=None)
+
+    last = closes.ffill().iloc[-1].to_numpy()
+    # Open of each ticker's latest session (the one `last` closed)
+    opens = pd.concat({t: _daily_close(histories[t], 'Open') for t in tickers}, axis=1).reindex(closes.index)
+    latest = closes.notna()[::-1].idxmax()
+    open_price = np.array([opens.at[latest[t], t] for t in tickers], dtype=float)
+    previous = closes.apply(lambda c: c.dropna().iloc[-2] if c.count() > 1 else np.nan).to_numpy()
+    hist_vol = (returns.std() * np.sqrt(252)).to_numpy()
+    sharpe = (returns.mean() * 252).to_numpy() / hist_vol
+    drawdown = (closes / closes.cummax() - 1).min().to_numpy()
+
+    beta = np.full(len(tickers), np.nan)
+    if benchmark is not None and not benchmark.empty:
+        bench = _daily_close(benchmark).reindex(closes.index).pct_change(fill_method=None).to_numpy()
+        r = returns.to_numpy()
+        valid = ~np.isnan(r) & ~np.isnan(bench)[:, None]
+        count = valid.sum(axis=0)
+        rb = np.where(valid, bench[:, None], 0.0)
+        ri = np.where(valid, r, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b, mean_i = rb.sum(axis=0) / count, ri.sum(axis=0) / count
+            cov = ((ri - mean_i) * (rb - mean_b) * valid).sum(axis=0) / (count - 1)
+            var = (((rb - mean_b) ** 2) * valid).sum(axis=0) / (count - 1)
+            beta = np.where(count > 20, cov / var, np.nan)
+
+    predicted = np.full(len(tickers), np.nan)
+    pipeline = get_pipeline()
+    if pipeline is not None:
+        features = latest_features(aligned_closes(histories, tickers))
+        ready = features.notnull().all(axis=1).to_numpy()
+        if ready.any():
+            predicted[ready] = pipeline.predict(features[ready])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change_pct = (last / previous - 1) * 100
+    return tickers, {
+        "last_price": last, "open_price": open_price, "change_pct": change_pct, "hist_vol": hist_vol, "sharpe": sharpe,
+        "predicted_vol": predicted, "max_drawdown": drawdown, "beta": beta,
+    }
+
+
+# --- Query Parsing ---
+
+_CLAUSE = re.compile(r"^\s*([A-Za-z_]+)\s*(<=|>=|==|=|<|>)\s*(-?\d+(?:\.\d+)?)\s*(%?)\s*$")
+
+
+def parse_where(text):
+    """
+    Parses "predicted_vol < 20% and sharpe > 1" into [(field, op, value)].
+    Clauses are joined with "and" (or commas); "20%" means 0.2.
+    """
+    filters = []
+    if not text or not text.strip():
+        return filters
+    for clause in re.split(r"\s+and\s+|,", text.strip(), flags=re.IGNORECASE):
+        match = _CLAUSE.match(clause)
+        if not match:
+            raise ValueError(f"Could not parse filter '{clause.strip()}'")
+        name, op, value, percent = match.groups()
+        field = _ALIASES.get(name.lower())
+        if field is None:
+            raise ValueError(f"Unknown field '{name}'. Use one of: {', '.join(FIELDS)}")
+        value = float(value) / 100 if percent and field != "change_pct" else float(value)
+        filters.append((field, "==" if op == "=" else op, value))
+    return filters
+
+
+def parse_sort(text):
+    """"-sharpe" -> ("sharpe", True); "beta" -> ("beta", False)."""
+    if not text:
+        return None, False
+    descending = text.startswith('-')
+    field = _ALIASES.get(text.lstrip('-+').lower())
+    if field is None:
+        raise ValueError(f"Unknown sort field '{text}'. Use one of: {', '.join(FIELDS)}")
+    return field, descending
+
+
+# --- Table ---
+
+class ScreenerTable:
+    """
+    Immutable columnar snapshot: one float array per metric plus, per metric,
+    the row order sorted by value (NaNs last) and each row's rank in it.
+    Range filters become binary searches over the sorted values; sorting a
+    filtered set is a gather of precomputed ranks.
+    """
+
+    def __init__(self, tickers, columns, as_of):
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.as_of = np.asarray(as_of, dtype=float)
+        self.columns = {name: np.asarray(columns[name], dtype=float) for name in FIELDS}
+        self.order, self.sorted, self.rank, self.valid = {}, {}, {}, {}
+        for name, values in self.columns.items():
+            order = np.argsort(values, kind="stable")     # NaNs sort last
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self.order[name] = order
+            self.sorted[name] = values[order]
+            self.rank[name] = rank
+            self.valid[name] = int(np.count_nonzero(~np.isnan(values)))
+        self.index = {t: i for i, t in enumerate(self.tickers)}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def _matching(self, field, op, value):
+        """Row indices satisfying one filter, via binary search on the sorted column."""
+        values, order, n = self.sorted[field], self.order[field], self.valid[field]
+        head = values[:n]
+        if op == "<":
+            return order[:np.searchsorted(head, value, "left")]
+        if op == "<=":
+            return order[:np.searchsorted(head, value, "right")]
+        if op == ">":
+            return order[np.searchsorted(head, value, "right"):n]
+        if op == ">=":
+            return order[np.searchsorted(head, value, "left"):n]
+        return order[np.searchsorted(head, value, "left"):np.searchsorted(head, value, "right")]
+
+    def query(self, filters=(), sort=None, descending=False, limit=50):
+        """Returns (row indices, total matches) for the filters, sorted and cut to `limit`."""
+        if not filters:
+            selected = None
+        else:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[self._matching(*filters[0])] = True
+            for f in filters[1:]:
+                other = np.zeros(len(self), dtype=bool)
+                other[self._matching(*f)] = True
+                mask &= other
+            selected = np.flatnonzero(mask)
+        total = len(self) if selected is None else len(selected)
+
+        if sort is None:
+            rows = np.arange(len(self)) if selected is None else selected
+            return rows[:limit], total
+        if selected is None:
+            # Top-k straight off the precomputed order, NaNs still last
+            n, order = self.valid[sort], self.order[sort]
+            rows = np.concatenate([order[:n][::-1], order[n:]]) if descending else order
+            return rows[:limit], total
+        rank = self.rank[sort][selected]
+        if descending:
+            n = self.valid[sort]
+            rank = np.where(rank < n, n - 1 - rank, rank)
+        return selected[np.argsort(rank, kind="stable")[:limit]], total
+
+    def row(self, i):
+        item = {"ticker": self.tickers[i]}
+        for name, key in FIELDS.items():
+            value = self.columns[name][i]
+            item[key] = None if np.isnan(value) else round(float(value), 4)
+        item["asOf"] = float(self.as_of[i])
+        return item
+
+
+def _empty_table():
+    return ScreenerTable([], {name: [] for name in FIELDS}, [])
+
+
+# --- Screener ---
+
+class Screener:
+    """
+    Keeps the ScreenerTable for a universe fresh. `refresh` recomputes only
+    tickers older than `max_age` (new ones first), a chunk of CHUNK_SIZE per
+    bulk fetch, then swaps in a new snapshot and saves it to `path`. Queries
+    never compute anything: they read the current snapshot.
+    """
+
+    def __init__(self, universe, benchmark=BENCHMARK, path=METRICS_PATH,
+                 chunk_size=CHUNK_SIZE, refresh_seconds=REFRESH_SECONDS, refresh_enabled=REFRESH_ENABLED):
+        self.universe = list(dict.fromkeys(universe))
+        self.benchmark = benchmark
+        self.path = path
+        self.chunk_size = chunk_size
+        self.refresh_seconds = refresh_seconds
+        self.refresh_enabled = refresh_enabled
+        self._table = _empty_table()
+        self._loaded_mtime = None
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.load()
+
+    @property
+    def table(self):
+        return self._table
+
+    # --- Persistence ---
+
+    def load(self):
+        """Loads the saved snapshot if the file changed since the last load."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._loaded_mtime:
+            return False
+        with np.load(self.path, allow_pickle=False) as data:
+            # Fields added since the file was written load as NaN until the next refresh
+            columns = {n: data[n] if n in data.files else np.full(len(data["tickers"]), np.nan) for n in FIELDS}
+            self._table = ScreenerTable(data["tickers"].astype(str), columns, data["as_of"])
+        self._loaded_mtime = mtime
+        return True
+
+    def save(self):
+        table = self._table
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp.npz"
+        np.savez(tmp, tickers=table.tickers.astype(str), as_of=table.as_of, **table.columns)
+        os.replace(tmp, self.path)
+        self._loaded_mtime = os.path.getmtime(self.path)
+
+    # --- Refresh ---
+
+    def stale(self, max_age=None, now=None):
+        """Universe tickers due for recomputation: missing ones first, then oldest."""
+        max_age = self.refresh_seconds if max_age is None else max_age
+        now = time.time() if now is None else now
+        table = self._table
+        missing = [t for t in self.universe if t not in table.index]
+        aged = sorted((table.as_of[table.index[t]], t) for t in self.universe
+                      if t in table.index and now - table.as_of[table.index[t]] >= max_age)
+        return missing + [t for _, t in aged]
+
+    def refresh(self, max_age=None):
+        """Recomputes stale tickers chunk by chunk. Returns {"refreshed", "failed", "seconds"}."""
+        started = time.perf_counter()
+        refreshed, failed = 0, 0
+        with self._refresh_lock:
+            due = self.stale(max_age)
+            for i in range(0, len(due), self.chunk_size):
+                chunk = due[i:i + self.chunk_size]
+                try:
+                    histories = fetch_histories(chunk + [self.benchmark], period="1y")
+                except UpstreamError as e:
+                    print(f"⚠️ Screener chunk of {len(chunk)} failed: {e}")
+                    failed += len(chunk)
+                    continue
+                benchmark = histories.pop(self.benchmark, None)
+                tickers, columns = compute_metrics({t: histories.get(t) for t in chunk}, benchmark)
+                failed += len(chunk) - len(tickers)
+                if tickers:
+                    self._merge(tickers, columns, time.time())
+                    refreshed += len(tickers)
+            if refreshed:
+                self.save()
+        report = {"refreshed": refreshed, "failed": failed, "seconds": round(time.perf_counter() - started, 2)}
+        if due:
+            print(f"🔎 Screener refresh: {report}")
+        return report
+
+    def _merge(self, tickers, columns, as_of):
+        """Builds the next snapshot with `tickers` replaced or appended, then swaps it in."""
+        table = self._table
+        replaced = set(tickers)
+        keep = [i for i, t in enumerate(table.tickers) if t not in replaced]
+        merged_tickers = list(table.tickers[keep]) + list(tickers)
+        merged = {name: np.concatenate([table.columns[name][keep], columns[name]]) for name in FIELDS}
+        merged_as_of = np.concatenate([table.as_of[keep], np.full(len(tickers), as_of)])
+        self._table = ScreenerTable(merged_tickers, merged, merged_as_of)
+
+    def _run(self):
+        while True:
+            try:
+                if self.refresh_enabled:
+                    self.refresh()
+                else:
+                    self.load()
+            except Exception as e:
+                print(f"❌ Screener refresh failed: {e}")
+            # Checking four times per period keeps every ticker within 1.25x of its refresh interval
+            time.sleep(self.refresh_seconds / 4 if self.refresh_enabled else min(self.refresh_seconds, 60))
+
+    def ensure_started(self):
+        """Starts the background refresh (or reload) loop once."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="screener", daemon=True)
+                self._thread.start()
+
+    # --- Queries ---
+
+    def query(self, where=None, sort=None, limit=50):
+        """Filter/sort/top-k over the current snapshot. `where` and `sort` use the parse_* syntax."""
+        filters = parse_where(where)
+        sort_field, descending = parse_sort(sort)
+        table = self._table
+        rows, total = table.query(filters, sort_field, descending, limit)
+        return {"total": total, "universe": len(self.universe), "rows": [table.row(i) for i in rows]}
+
+
+# The NSE large caps are always included so get_all_nse_tickers_data can be served from the table
+screener = Screener(load_universe() + NSE_TICKERS)
+
+
+def get_all_nse_tickers_data():
+    """
+    NSE large-cap price snapshot, served from the screener's precomputed
+    table. The change is the latest session's move from its open (not the
+    screener's close-to-close change_pct), as this snapshot always reported.
+    """
+    screener.ensure_started()
+    table = screener.table
+    data = []
+    for symbol in NSE_TICKERS:
+        i = table.index.get(symbol)
+        if i is None:
+            continue
+        price, open_price = table.columns["last_price"][i], table.columns["open_price"][i]
+        if np.isnan(price) or np.isnan(open_price) or not open_price:
+            continue
+        last_price, open_price = round(float(price), 2), round(float(open_price), 2)
+        percent_change = round((last_price - open_price) / open_price * 100, 2)
+        data.append({
+            "name": symbol.replace(".NS", ""),
+            "value": f"{last_price:,}",
+            "change": f"{percent_change:+.2f}%",
+            "isNegative": percent_change < 0
+        })
+    return sorted(data, key=lambda x: x["name"])
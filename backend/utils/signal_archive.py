@@ -0,0 +1,126 @@
+import glob
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+# --- Archive Layout ---
+# Raw rows pruned from the database are written as one compressed, columnar
+# .npz file per table per day:
+#     <ARCHIVE_DIR>/<table>/<YYYY>/<MM>/<YYYY-MM-DD>[-n].npz
+# The directory tree is the partition index: a date-range read only opens
+# the files for those days.
+ARCHIVE_DIR = os.getenv("SIGNAL_ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), '..', 'data', 'archive'))
+
+
+def _day_dir(table, day, root):
+    return os.path.join(root, table, f"{day:%Y}", f"{day:%m}")
+
+
+def write_partition(table, day, columns, root=ARCHIVE_DIR):
+    """
+    Writes one day's rows (a dict of equal-length columns with an "id"
+    column) for `table`. Rows whose ids are already archived for that day
+    are skipped, so retrying a compaction that failed after writing its file
+    does not archive the rows twice; a later compaction of the same day with
+    new rows gets its own numbered file, so earlier archives are never
+    rewritten. Returns the path written, or None if every row was archived.
+    """
+    directory = _day_dir(table, day, root)
+    os.makedirs(directory, exist_ok=True)
+    existing = _day_files(directory, day)
+    columns = {name: np.asarray(values) for name, values in columns.items()}
+    if existing:
+        archived = np.concatenate([_load(path)["id"] for path in existing])
+        fresh = ~np.isin(columns["id"], archived)
+        if not fresh.any():
+            return None
+        columns = {name: values[fresh] for name, values in columns.items()}
+
+    path = os.path.join(directory, f"{day:%Y-%m-%d}.npz")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{day:%Y-%m-%d}-{n}.npz")
+        n += 1
+    # Written under a temporary name and renamed, so readers never see a half-written file
+    partial = path + ".partial"
+    with open(partial, "wb") as f:
+        np.savez_compressed(f, **columns)
+    os.replace(partial, path)
+    return path
+
+
+def _load(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _day_files(directory, day):
+    return sorted(glob.glob(os.path.join(directory, f"{day:%Y-%m-%d}*.npz")))
+
+
+def _partition_day(path):
+    return date.fromisoformat(os.path.basename(path)[:10])
+
+
+def _subdirs(path, reverse):
+    if not os.path.isdir(path):
+        return []
+    return sorted((d for d in os.listdir(path) if d.isdigit()), reverse=reverse)
+
+
+def partitions(table, start=None, end=None, root=ARCHIVE_DIR, newest_first=False):
+    """
+    Archive files for `table` whose day falls within [start, end] (dates or
+    datetimes), oldest first unless `newest_first`. Years and months outside
+    the range are skipped without being listed.
+    """
+    start = start.date() if isinstance(start, datetime) else start
+    end = end.date() if isinstance(end, datetime) else end
+    for year in _subdirs(os.path.join(root, table), newest_first):
+        if (start is not None and int(year) < start.year) or (end is not None and int(year) > end.year):
+            continue
+        for month in _subdirs(os.path.join(root, table, year), newest_first):
+            month_key = (int(year), int(month))
+            if ((start is not None and month_key < (start.year, start.month))
+                    or (end is not None and month_key > (end.year, end.month))):
+                continue
+            paths = sorted(glob.glob(os.path.join(root, table, year, month, "*.npz")), reverse=newest_first)
+            for path in paths:
+                if (start is None or _partition_day(path) >= start) and (end is None or _partition_day(path) <= end):
+                    yield path
+
+
+def read_partitions(table, start=None, end=None, root=ARCHIVE_DIR, limit=None, **equals):
+    """
+    Concatenated columns from every matching partition, filtered by
+    created_at within [start, end] and by exact matches on other columns
+    (e.g. user_id=3, ticker="TCS.NS"). Returns {} when nothing matches.
+
+    With `limit`, partitions are walked newest day first and the walk stops
+    after the day on which `limit` matching rows have been collected, so
+    the result holds at least the newest `limit` matches (not all of them).
+    """
+    chunks = []
+    matched = 0
+    current_day = None
+    for path in partitions(table, start, end, root, newest_first=limit is not None):
+        day = _partition_day(path)
+        if limit is not None and matched >= limit and day != current_day:
+            break
+        current_day = day
+        columns = _load(path)
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        for name, value in equals.items():
+            if value is not None:
+                mask &= columns[name] == value
+        if start is not None:
+            mask &= columns["created_at"] >= np.datetime64(start)
+        if end is not None:
+            mask &= columns["created_at"] <= np.datetime64(end)
+        if mask.any():
+            chunks.append({name: values[mask] for name, values in columns.items()})
+            matched += int(mask.sum())
+    if not chunks:
+        return {}
+    return {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.analyzer import get_pipeline
+from utils.features import FEATURE_COLUMNS, RollingFeatureState
+
+# --- Configuration ---
+# A ticker is re-evaluated only when its price has moved PRICE_THRESHOLD
+# (fraction) or its predicted volatility VOL_THRESHOLD (absolute, annualized)
+# since the last evaluation, and never more often than DEBOUNCE_SECONDS.
+PRICE_THRESHOLD = float(os.getenv("BOT_EVENT_PRICE_THRESHOLD", "0.01"))
+VOL_THRESHOLD = float(os.getenv("BOT_EVENT_VOL_THRESHOLD", "0.01"))
+DEBOUNCE_SECONDS = float(os.getenv("BOT_EVENT_DEBOUNCE_SECONDS", "300"))
+
+
+class WatcherIndex:
+    """Reverse index ticker -> ids of users watching or holding it."""
+
+    def __init__(self):
+        self._users = {}
+
+    def build(self, users):
+        """Indexes BotUser snapshots (see app.users_for_bot) by watched and held ticker."""
+        index = {}
+        for user in users:
+            for ticker in list(user.watchlist) + list(user.holdings):
+                index.setdefault(ticker, set()).add(user.id)
+        self._users = index
+
+    def tickers(self):
+        return list(self._users)
+
+    def users_for(self, tickers):
+        """Ids of every user affected by any of `tickers`."""
+        ids = set()
+        for ticker in tickers:
+            ids |= self._users.get(ticker, set())
+        return ids
+
+
+class FeatureBook:
+    """
+    Rolling feature state per ticker, seeded once from history and then
+    advanced (or revised) in O(1) per incoming bar. Predictions are made in
+    one batch for just the tickers whose features moved.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.days = {}
+
+    def seed(self, tickers, history):
+        """Seeds tickers not yet tracked from `history(tickers) -> {ticker: frame}`."""
+        missing = [t for t in tickers if t not in self.states]
+        if not missing:
+            return 0
+        for ticker, frame in history(missing).items():
+            if frame is None or frame.empty:
+                continue
+            self.states[ticker] = RollingFeatureState.from_closes(frame['Close'].to_numpy(dtype=float))
+            self.days[ticker] = pd.Timestamp(frame.index[-1]).date()
+        return len(missing)
+
+    def retain(self, tickers):
+        """Drops state for tickers nobody watches or holds any more."""
+        keep = set(tickers)
+        for ticker in [t for t in self.states if t not in keep]:
+            del self.states[ticker]
+            del self.days[ticker]
+
+    def apply(self, bars):
+        """Applies new bars and returns the set of tickers whose features changed."""
+        changed = set()
+        for bar in bars:
+            state = self.states.get(bar.ticker)
+            if state is None:
+                continue
+            last_day = self.days[bar.ticker]
+            if bar.day > last_day:
+                state.update(bar.close)
+                self.days[bar.ticker] = bar.day
+            elif bar.day == last_day:
+                if bar.close == state.last_close:
+                    continue
+                state.revise(bar.close)
+            else:
+                continue   # a late bar for a session we've already moved past
+            changed.add(bar.ticker)
+        return changed
+
+    def price(self, ticker):
+        return self.states[ticker].last_close
+
+    def predict(self, tickers):
+        """{ticker: predicted volatility} for the given tickers that have enough history."""
+        pipeline = get_pipeline()
+        rows = {t: self.states[t].as_row() for t in tickers if t in self.states}
+        rows = {t: row for t, row in rows.items() if row is not None and not np.isnan(row).any()}
+        if pipeline is None or not rows:
+            return {}
+        features = pd.DataFrame(list(rows.values()), index=list(rows), columns=FEATURE_COLUMNS)
+        return dict(zip(features.index, (float(v) for v in pipeline.predict(features))))
+
+
+class SignalGate:
+    """
+    Debounce and thresholds for re-evaluation, plus per-user de-duplication:
+    a user is only sent a signal for a ticker when it differs from the last
+    one they were sent.
+    """
+
+    def __init__(self, price_threshold=PRICE_THRESHOLD, vol_threshold=VOL_THRESHOLD, debounce=DEBOUNCE_SECONDS):
+        self.price_threshold = price_threshold
+        self.vol_threshold = vol_threshold
+        self.debounce = debounce
+        self._evaluated = {}   # ticker -> (at, price, predicted volatility)
+        self._sent = {}        # (user id, ticker) -> signal
+
+    def due(self, ticker, price, predicted, now):
+        last = self._evaluated.get(ticker)
+        if last is None:
+            return True
+        at, last_price, last_predicted = last
+        if now - at < self.debounce:
+            return False
+        return (abs(price / last_price - 1) >= self.price_threshold
+                or abs(predicted - last_predicted) >= self.vol_threshold)
+
+    def evaluated(self, ticker, price, predicted, now):
+        self._evaluated[ticker] = (now, price, predicted)
+
+    def changed(self, user_id, ticker, signal):
+        """Records `signal` for the user and returns whether it differs from the last one sent."""
+        if self._sent.get((user_id, ticker)) == signal:
+            return False
+        self._sent[(user_id, ticker)] = signal
+        return True
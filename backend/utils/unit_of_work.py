@@ -0,0 +1,98 @@
+import os
+
+from sqlalchemy import delete, insert
+
+BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))
+
+
+class BulkWriter:
+    """
+    Buffers inserts and deletes and writes them in batches: one executemany
+    per table and one DELETE ... WHERE id IN (...) per table, committed as a
+    single transaction per batch.
+
+    Operations are queued as units (`add_unit`), and a unit is never split
+    across batches, so rows that must land together (a SELL execution and
+    the deletion of the holding it closes) are committed or rolled back
+    together.
+
+    Partial failure: a batch that fails is rolled back as a whole and
+    recorded in `failures`; batches committed before it stay committed and
+    later batches are still attempted. With `isolate=True` a failed batch is
+    retried one unit per transaction, so only the offending units are lost.
+    """
+
+    def __init__(self, session, batch_size=BATCH_SIZE, isolate=False):
+        self.session = session
+        self.batch_size = batch_size
+        self.isolate = isolate
+        self.batches = 0
+        self.rows = 0
+        self.failures = []
+        self._pending = []
+        self._pending_rows = 0
+
+    def add(self, model, row):
+        """Queues a single insert of `row` (a column dict) into `model`'s table."""
+        self.add_unit(inserts=[(model, row)])
+
+    def add_unit(self, inserts=(), deletes=()):
+        """Queues (model, row) inserts and (model, primary key) deletes that must commit together."""
+        unit = (list(inserts), list(deletes))
+        size = len(unit[0]) + len(unit[1])
+        if self._pending and self._pending_rows + size > self.batch_size:
+            self.flush()
+        self._pending.append(unit)
+        self._pending_rows += size
+        if self._pending_rows >= self.batch_size:
+            self.flush()
+
+    def _execute(self, units):
+        inserts, deletes = {}, {}
+        for unit_inserts, unit_deletes in units:
+            for model, row in unit_inserts:
+                inserts.setdefault(model, []).append(row)
+            for model, key in unit_deletes:
+                deletes.setdefault(model, []).append(key)
+        for model, rows in inserts.items():
+            self.session.execute(insert(model.__table__), rows)
+        for model, keys in deletes.items():
+            table = model.__table__
+            self.session.execute(delete(table).where(table.c.id.in_(keys)))
+        self.session.commit()
+        return sum(len(r) for r in inserts.values()) + sum(len(k) for k in deletes.values())
+
+    def flush(self):
+        units, self._pending, self._pending_rows = self._pending, [], 0
+        if not units:
+            return
+        self.batches += 1
+        try:
+            self.rows += self._execute(units)
+            return
+        except Exception as e:
+            self.session.rollback()
+            if not self.isolate:
+                self.failures.append({"batch": self.batches, "units": len(units), "error": str(e)})
+                print(f"❌ Bulk write batch {self.batches} failed ({len(units)} units): {e}")
+                return
+        for unit in units:
+            try:
+                self.rows += self._execute([unit])
+            except Exception as e:
+                self.session.rollback()
+                self.failures.append({"batch": self.batches, "units": 1, "error": str(e)})
+                print(f"❌ Bulk write unit in batch {self.batches} failed: {e}")
+
+    def report(self):
+        return {"batches": self.batches, "rows": self.rows, "failures": self.failures}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._pending, self._pending_rows = [], 0
+        return False
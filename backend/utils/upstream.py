@@ -0,0 +1,286 @@
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from utils.metrics import counter, histogram, stage_seconds, upstream_errors
+
+# --- Configuration ---
+# Every Yahoo Finance request in the process goes through one scheduler: a
+# token bucket caps the request rate, concurrent requests for the same symbol
+# share one fetch, and single-symbol requests arriving within a short window
+# are merged into one batched download.
+RATE = float(os.getenv("UPSTREAM_RATE", "2"))                 # requests per second, sustained
+BURST = int(os.getenv("UPSTREAM_BURST", "5"))
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))   # seconds
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "30"))
+BATCH_WINDOW = float(os.getenv("UPSTREAM_BATCH_WINDOW_MS", "50")) / 1000
+MAX_BATCH = int(os.getenv("UPSTREAM_MAX_BATCH", "100"))
+FAILURE_HISTORY = 200
+
+upstream_requests = counter("upstream_requests_total", "Upstream provider calls by outcome.", ["outcome"])
+upstream_batch_size = histogram(
+    "upstream_batch_tickers", "Tickers per upstream provider call.", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+
+# --- Errors ---
+
+class RateLimited(Exception):
+    """Raised by providers when the upstream throttles us."""
+
+
+class UpstreamError(Exception):
+    """
+    A fetch that still failed after every retry. Carries the structured
+    failure record: tickers, kind (rate_limited | error), attempts, message.
+    """
+
+    def __init__(self, failure):
+        super().__init__(f"{failure['kind']} after {failure['attempts']} attempt(s): {failure['message']}")
+        self.failure = failure
+
+
+def _is_rate_limit(error):
+    # yfinance raises YFRateLimitError in recent versions and plain HTTP errors in older ones
+    text = f"{type(error).__name__} {error}".lower()
+    return isinstance(error, RateLimited) or "ratelimit" in text or "rate limit" in text or "too many requests" in text
+
+
+# --- Providers ---
+# A provider is `provider(tickers, period, interval, start=None) -> {ticker: frame}`
+# and makes exactly one upstream call per invocation.
+
+class YFinanceProvider:
+    """
+    One Yahoo Finance bulk download per call, whatever the number of symbols,
+    so every frame has the same shape, adjustment and (tz-naive daily) index.
+    """
+
+    def __call__(self, tickers, period, interval, start=None):
+        window = {"start": start} if start is not None else {"period": period}
+        raw = yf.download(
+            list(tickers), interval=interval, group_by="ticker",
+            auto_adjust=True, threads=True, progress=False, **window
+        )
+        frames = {}
+        for ticker in tickers:
+            try:
+                # Older yfinance versions return flat columns for a single symbol
+                frame = raw[ticker] if isinstance(raw.columns, pd.MultiIndex) else raw
+                frames[ticker] = frame.dropna(how="all")
+            except KeyError:
+                frames[ticker] = pd.DataFrame()
+        return frames
+
+
+class FakeProvider:
+    """
+    Local stand-in for Yahoo Finance (UPSTREAM_PROVIDER=fake). Returns seeded
+    random-walk daily bars after `latency` seconds, throttles like the real
+    service when called more than `limit_per_second` times in a second, and
+    fails a `fail_rate` fraction of calls. Records every call it receives.
+    """
+
+    def __init__(self, latency=0.05, limit_per_second=None, fail_rate=0.0, bars=300, seed=0):
+        self.latency = latency
+        self.limit_per_second = limit_per_second
+        self.fail_rate = fail_rate
+        self.bars = bars
+        self.rng = random.Random(seed)
+        self.calls = []
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _frame(self, ticker):
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.015, self.bars)))
+        index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=self.bars, name="Date")
+        return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                             "Volume": rng.integers(100_000, 1_000_000, self.bars)}, index=index)
+
+    def __call__(self, tickers, period, interval, start=None):
+        now = time.monotonic()
+        with self._lock:
+            self.calls.append(list(tickers))
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            self._recent.append(now)
+            throttled = self.limit_per_second is not None and len(self._recent) > self.limit_per_second
+            failed = self.rng.random() < self.fail_rate
+        time.sleep(self.latency)
+        if throttled:
+            raise RateLimited("Too Many Requests")
+        if failed:
+            raise ConnectionError("simulated upstream failure")
+        return {ticker: self._frame(ticker) for ticker in tickers}
+
+
+# --- Rate Limiting ---
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# --- Scheduler ---
+
+class UpstreamScheduler:
+    """
+    Fetcher (same call signature as a provider) that every caller shares.
+
+    - Coalescing: a (ticker, period, interval, start) already being fetched
+      is not requested again; the new caller waits on the same result.
+    - Batching: new requests with the same (period, interval, start) that
+      arrive within `window` seconds go out as one provider call (at most
+      `max_batch` tickers). The first caller of a batch waits out the window
+      and then performs the call, so no background thread is needed.
+    - Rate limiting: every provider call takes a token from the bucket.
+    - Retries: failed calls are retried with full-jitter exponential backoff
+      (doubled for throttling). A batch that still fails raises UpstreamError
+      to every caller waiting on it, and the failure is kept in `failures`.
+    """
+
+    def __init__(self, provider, rate=RATE, burst=BURST, max_retries=MAX_RETRIES,
+                 window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.window = window
+        self.max_batch = max_batch
+        self.failures = deque(maxlen=FAILURE_HISTORY)
+        self._inflight = {}   # (ticker, period, interval, start) -> Future
+        self._pending = {}    # (period, interval, start) -> {ticker: Future}
+        self._lock = threading.Lock()
+
+    def __call__(self, tickers, period, interval, start=None):
+        group = (period, interval, start)
+        futures, lead, flush_now = {}, None, None
+        with self._lock:
+            for ticker in dict.fromkeys(tickers):
+                key = (ticker, period, interval, start)
+                future = self._inflight.get(key)
+                if future is None:
+                    batch = self._pending.get(group)
+                    if batch is None:
+                        batch = self._pending[group] = {}
+                        lead = batch
+                    future = self._inflight[key] = Future()
+                    batch[ticker] = future
+                    if len(batch) >= self.max_batch:
+                        # Full: send it now and start a new batch for the rest
+                        del self._pending[group]
+                        flush_now = flush_now or []
+                        flush_now.append(batch)
+                        if lead is batch:
+                            lead = None
+                futures[ticker] = future
+
+        for batch in flush_now or ():
+            self._execute(group, batch)
+        if lead is not None:
+            time.sleep(self.window)
+            with self._lock:
+                if self._pending.get(group) is lead:
+                    del self._pending[group]
+                else:
+                    lead = None   # it filled up and another caller sent it
+            if lead is not None:
+                self._execute(group, lead)
+        return {ticker: future.result() for ticker, future in futures.items()}
+
+    def _execute(self, group, batch):
+        period, interval, start = group
+        tickers = list(batch)
+        try:
+            frames = self._call_with_retries(tickers, period, interval, start)
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for ticker, future in batch.items():
+                frame = frames.get(ticker)
+                future.set_result(frame if frame is not None else pd.DataFrame())
+        finally:
+            with self._lock:
+                for ticker in tickers:
+                    self._inflight.pop((ticker, period, interval, start), None)
+
+    def _call_with_retries(self, tickers, period, interval, start):
+        upstream_batch_size.observe(len(tickers))
+        attempt = 0
+        while True:
+            stage_seconds.observe(self.bucket.acquire(), stage="upstream_wait")
+            try:
+                frames = self.provider(tickers, period, interval, start=start)
+                upstream_requests.inc(outcome="ok")
+                return frames
+            except Exception as e:
+                kind = "rate_limited" if _is_rate_limit(e) else "error"
+                upstream_requests.inc(outcome=kind)
+                attempt += 1
+                if attempt > self.max_retries:
+                    failure = {
+                        "tickers": tickers, "period": period, "interval": interval, "start": start,
+                        "kind": kind, "attempts": attempt, "message": str(e), "at": time.time(),
+                    }
+                    self.failures.append(failure)
+                    upstream_errors.inc(source="yfinance")
+                    print(f"❌ Upstream fetch failed for {len(tickers)} ticker(s) ({kind}, {attempt} attempts): {e}")
+                    raise UpstreamError(failure) from e
+                delay = backoff_delay(attempt + (1 if kind == "rate_limited" else 0))
+                print(f"⏳ Upstream {kind} for {len(tickers)} ticker(s); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def recent_failures(self, limit=20):
+        return list(self.failures)[-limit:]
+
+
+def _default_provider():
+    return FakeProvider() if os.getenv("UPSTREAM_PROVIDER") == "fake" else YFinanceProvider()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UpstreamScheduler(_default_provider())
+        return _scheduler
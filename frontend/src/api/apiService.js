@@ -63,12 +63,29 @@ export const removeStockFromWatchlist = async (ticker) => {
 
 
 // --- Analysis & AI Functions ---
-// The stock analyzer is public
+// The stock analyzer is public. It returns the numbers right away; the AI summary
+// is produced in the background and fetched separately with its `summaryJobId`.
 export const analyzeStock = async (ticker) => {
     const response = await axios.post(`${API_URL}/analyze`, { ticker });
     return response.data;
 };
 
+export const getAnalysisSummary = async (jobId) => {
+    const response = await axios.get(`${API_URL}/analyze/jobs/${jobId}`);
+    return response.data.data;
+};
+
+// Polls the summary job until it finishes; resolves to the summary text (or null)
+export const waitForAnalysisSummary = async (jobId, { intervalMs = 1000, maxAttempts = 30 } = {}) => {
+    for (let attempt = 0; attempt < maxAttempts; attempt++) {
+        const job = await getAnalysisSummary(jobId);
+        if (job.status === 'done') return job.aiSummary;
+        if (job.status === 'failed') return null;
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    return null;
+};
+
 // The AI recommender is protected, so we must use the 'api' instance
 export const getRecommendation = async (query) => {
     const token = localStorage.getItem("accessToken");
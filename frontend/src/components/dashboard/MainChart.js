@@ -20,26 +20,26 @@ const MainChart = () => {
   const [labels, setLabels] = useState(['T-6', 'T-5', 'T-4', 'T-3', 'T-2', 'T-1', 'Now']);
 
   useEffect(() => {
-    const fetchNiftyPrice = async () => {
-      try {
-        const response = await fetch('http://localhost:5000/api/stock-data');
-        const data = await response.json();
-        if (data?.price) {
-          setChartData(prev => {
-            const newData = [...prev];
-            newData.shift();
-            newData.push(data.price);
-            return newData;
-          });
-        }
-      } catch (err) {
-        console.error('Error fetching Nifty 50 data:', err);
-      }
+    const pushPrice = (price) => {
+      setChartData(prev => {
+        const newData = [...prev];
+        newData.shift();
+        newData.push(price);
+        return newData;
+      });
     };
 
-    fetchNiftyPrice();
-    const interval = setInterval(fetchNiftyPrice, 5000);
-    return () => clearInterval(interval);
+    // Latest Nifty 50 quote now arrives over the quote hub's stream instead of polling
+    const source = new EventSource('http://localhost:5000/api/quotes/stream');
+    const onQuotes = (event) => {
+      const nifty = JSON.parse(event.data).quotes['^NSEI'];
+      if (nifty?.price) pushPrice(nifty.price);
+    };
+    source.addEventListener('snapshot', onQuotes);
+    source.addEventListener('quotes', onQuotes);
+    source.onerror = (err) => console.error('Error streaming Nifty 50 data:', err);
+
+    return () => source.close();
   }, []);
 
   const data = {
@@ -13,27 +13,37 @@ const StockTicker = () => {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchTickers = () => {
-      fetch('http://127.0.0.1:5000/api/ticker-data')
-        .then((res) => res.json())
-        .then((data) => {
-          if (data && Array.isArray(data.data)) {
-            setTickers(data.data);
-          } else {
-            setTickers([]);
-          }
-          setLoading(false);
-        })
-        .catch((err) => {
-          console.error('Error fetching tickers:', err);
-          setTickers([]);
-          setLoading(false);
-        });
+    // Initial render from the snapshot endpoint, then live diffs pushed by the quote hub.
+    // Both carry rows the server already formatted, so prices look the same either way.
+    fetch('http://127.0.0.1:5000/api/ticker-data')
+      .then((res) => res.json())
+      .then((data) => {
+        if (data && Array.isArray(data.data)) {
+          setTickers((current) => (current.length ? current : data.data));
+        }
+        setLoading(false);
+      })
+      .catch((err) => {
+        console.error('Error fetching tickers:', err);
+        setLoading(false);
+      });
+
+    const source = new EventSource('http://127.0.0.1:5000/api/quotes/stream');
+    const applyQuotes = (event, replace) => {
+      const { items } = JSON.parse(event.data);
+      setTickers((current) => {
+        const bySymbol = replace ? {} : Object.fromEntries(current.filter((t) => t.symbol).map((t) => [t.symbol, t]));
+        Object.assign(bySymbol, items);
+        const rows = Object.values(bySymbol);
+        return rows.length ? rows : current;
+      });
+      setLoading(false);
     };
+    source.addEventListener('snapshot', (event) => applyQuotes(event, true));
+    source.addEventListener('quotes', (event) => applyQuotes(event, false));
+    source.onerror = (err) => console.error('Ticker stream error:', err);
 
-    fetchTickers();
-    const interval = setInterval(fetchTickers, 30000); // Refresh every 30 seconds
-    return () => clearInterval(interval);
+    return () => source.close();
   }, []);
 
   if (loading) {
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Box, Typography, Paper, IconButton, TextField, Button, CircularProgress, Alert } from '@mui/material';
-import { getWatchlist, addStockToWatchlist, removeStockFromWatchlist, analyzeStock } from '../../api/apiService';
+import { getWatchlist, addStockToWatchlist, removeStockFromWatchlist, analyzeStock, waitForAnalysisSummary } from '../../api/apiService';
 import DeleteIcon from '@mui/icons-material/Delete';
 import AddIcon from '@mui/icons-material/Add';
 
@@ -51,6 +51,16 @@ const Watchlist = () => {
             );
             const detailedWatchlist = (await Promise.all(analysisPromises)).filter(stock => stock !== null); 
             setWatchlist(detailedWatchlist);
+
+            // Numbers render immediately; fill in each AI summary as its background job finishes
+            detailedWatchlist.filter(stock => stock.summaryJobId).forEach(stock => {
+                waitForAnalysisSummary(stock.summaryJobId).then(aiSummary => {
+                    if (!aiSummary) return;
+                    setWatchlist(current => current.map(item =>
+                        item.ticker === stock.ticker ? { ...item, aiSummary } : item
+                    ));
+                }).catch(err => console.error(`Could not load summary for ${stock.ticker}:`, err));
+            });
         } catch (err) {
             setError(`Failed to load watchlist: ${err.message}`);
         }